@@ -0,0 +1,124 @@
+"""Time to load an AvailabilityIndex and allocate tables from it.
+
+A restaurant of ``--tables`` tables, 2 to 8 seats, pushed together in rows of
+``--row`` adjacent tables, is booked through a day: every free quarter to
+hour of a table starts a booking with the chance ``--occupancy``, so each
+table is busy more than half the day. Then random parties of 1 to 12 are
+allocated at random slots: parties that fit one table, parties that need
+tables joined, and every allocation together.
+
+    python -m benchmarks.allocation --tables 100 300 1000 --iterations 500
+
+Tables and bookings are built in memory, so no database is needed, and the
+index load leaves out the query fetching the bookings.
+"""
+import argparse
+import datetime
+import random
+import time
+
+from benchmarks.common import print_table, setup, summarize
+
+CAPACITIES = [2, 2, 4, 4, 4, 6, 8]
+
+
+def build_tables(count, row):
+    from table_booker.config import TableConfig
+
+    tables = []
+    for number in range(count):
+        adjacent = []
+        if number % row:
+            adjacent.append(number - 1)
+        if (number + 1) % row and number + 1 < count:
+            adjacent.append(number + 1)
+        tables.append(
+            TableConfig(number, f"T{number}", CAPACITIES[number % 7], tuple(adjacent))
+        )
+    return tables
+
+
+def build_bookings(tables, day, occupancy, rng):
+    """Bookings of every table through ``day``, each two hours long."""
+    bookings = []
+    booking_id = 0
+    for table in tables:
+        at = day
+        while at < day + datetime.timedelta(hours=22):
+            if rng.random() < occupancy:
+                booking_id += 1
+                bookings.append((table.id, at, booking_id))
+                at += datetime.timedelta(hours=2)
+            else:
+                at += datetime.timedelta(minutes=rng.choice([15, 30, 45, 60]))
+    return bookings
+
+
+def benchmark(count, args):
+    from django.utils import timezone
+
+    from table_booker.allocation import allocate
+    from table_booker.availability import AvailabilityIndex
+
+    rng = random.Random(count)
+    day = timezone.make_aware(datetime.datetime(2030, 1, 7, 0))
+    tables = build_tables(count, args.row)
+    bookings = build_bookings(tables, day, args.occupancy, rng)
+
+    loads = []
+    for _ in range(10):
+        started = time.perf_counter()
+        index = AvailabilityIndex(tables, bookings)
+        loads.append(time.perf_counter() - started)
+
+    timings = {"single table": [], "joined tables": [], "all": []}
+    unseated = 0
+    for _ in range(args.iterations):
+        at = day + datetime.timedelta(minutes=15 * rng.randrange(88))
+        guests = rng.randint(1, 12)
+        started = time.perf_counter()
+        allocated = allocate(index, at, guests)
+        elapsed = time.perf_counter() - started
+
+        timings["all"].append(elapsed)
+        if allocated is None:
+            unseated += 1
+        elif len(allocated) == 1:
+            timings["single table"].append(elapsed)
+        else:
+            timings["joined tables"].append(elapsed)
+
+    results = {"index load": summarize(loads)}
+    results.update((name, summarize(values)) for name, values in timings.items())
+    return len(bookings), unseated, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--tables", type=int, nargs="+", default=[100, 300, 1000])
+    parser.add_argument("--row", type=int, default=4, help="tables per row")
+    parser.add_argument("--occupancy", type=float, default=0.3)
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+
+    setup()
+    rows = []
+    for count in args.tables:
+        bookings, unseated, results = benchmark(count, args)
+        rows += [
+            [
+                count,
+                bookings,
+                name,
+                result["count"],
+                f"{result['p50_ms']:.3f}",
+                f"{result['p95_ms']:.3f}",
+            ]
+            for name, result in results.items()
+        ]
+        print(f"{count} tables: {unseated} of {args.iterations} parties unseated")
+    print_table(["tables", "bookings", "timing", "count", "p50 ms", "p95 ms"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""Throughput and latency of the read heavy views under WSGI and ASGI.
+
+``--clients`` logged in users request home_page, availability and
+my_bookings back to back, while every query takes ``--db-latency`` extra
+milliseconds and every response ``--client-latency`` milliseconds to reach a
+slow client. Under WSGI the requests share ``--workers`` sync workers, each
+busy until its response is sent; under ASGI one process serves them all,
+with the async views on ``--threads`` executor threads.
+
+    python -m benchmarks.asgi --clients 50 --workers 4 --threads 10
+
+Each mode runs in its own process, on its own throwaway database filled by
+seed_data, since the views are routed when the URLconf is first imported.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from benchmarks.common import (
+    ASGIClient,
+    WSGIClient,
+    print_table,
+    setup,
+    summarize,
+    test_database,
+)
+
+PASSWORD = "top-secret"  # seed_data's password for every user
+
+
+def add_db_latency(seconds):
+    """Make every query on every connection take ``seconds`` longer."""
+    from django.db import connections
+    from django.db.backends.signals import connection_created
+
+    def slow_execute(execute, sql, params, many, context):
+        time.sleep(seconds)
+        return execute(sql, params, many, context)
+
+    def install(sender, connection, **kwargs):
+        connection.execute_wrappers.append(slow_execute)
+
+    connection_created.connect(install, weak=False)
+    for connection in connections.all():
+        install(None, connection)
+
+
+def paths(restaurant_ids):
+    """Request paths cycling through the benchmarked views."""
+    from django.utils import timezone
+
+    date = (timezone.localtime() + datetime.timedelta(days=7)).strftime(
+        "%Y-%m-%dT19:00"
+    )
+    while True:
+        for restaurant_id in restaurant_ids:
+            yield "/"
+            yield (
+                f"/book-restaurant/{restaurant_id}/availability"
+                f"?date={date}&total_guests=2"
+            )
+            yield "/my-bookings"
+
+
+def log_in(application, count):
+    """Cookies of ``count`` logged in seeded users."""
+    from django.contrib.auth.models import User
+
+    cookies = []
+    for username in User.objects.order_by("id").values_list("username", flat=True):
+        client = WSGIClient(application)
+        client.get("/login")
+        response = client.post("/login", {"username": username, "password": PASSWORD})
+        if response["status"] == 302:
+            cookies.append(client.cookies)
+        if len(cookies) == count:
+            return cookies
+    sys.exit(f"Could only log in {len(cookies)} users, seed more")
+
+
+def run_wsgi(args, cookies, requests):
+    from project.wsgi import application
+
+    workers = threading.Semaphore(args.workers)
+    timings, statuses = [], []
+
+    def client(cookie_jar):
+        browser = WSGIClient(application, cookie_jar)
+        for _ in range(args.requests):
+            started = time.perf_counter()
+            with workers:
+                response = browser.get(next(requests))
+                # a sync worker stays busy until the slow client has it all
+                time.sleep(args.client_latency / 1000)
+            timings.append(time.perf_counter() - started)
+            statuses.append(response["status"])
+
+    threads = [threading.Thread(target=client, args=(jar,)) for jar in cookies]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return timings, statuses, time.perf_counter() - started
+
+
+def run_asgi(args, cookies, requests):
+    from project.asgi import application
+
+    timings, statuses = [], []
+
+    async def client(cookie_jar):
+        browser = ASGIClient(application, cookie_jar)
+        browser.send_delay = args.client_latency / 1000
+        for _ in range(args.requests):
+            started = time.perf_counter()
+            response = await browser.get(next(requests))
+            timings.append(time.perf_counter() - started)
+            statuses.append(response["status"])
+
+    async def clients():
+        await asyncio.gather(*(client(jar) for jar in cookies))
+
+    started = time.perf_counter()
+    asyncio.run(clients())
+    return timings, statuses, time.perf_counter() - started
+
+
+def benchmark(args):
+    """Run one mode in this process and print its results as JSON."""
+    os.environ["ASYNC_VIEWS"] = "1" if args.mode == "asgi" else "0"
+    os.environ["ASYNC_VIEW_THREADS"] = str(args.threads)
+    setup()
+    from django.core.management import call_command
+
+    from project.wsgi import application
+    from table_booker.models import Restaurant
+
+    with test_database():
+        call_command(
+            "seed_data",
+            restaurants=20,
+            users=args.clients,
+            bookings=args.bookings,
+            days=30,
+            stdout=open(os.devnull, "w"),
+        )
+        cookies = log_in(application, args.clients)
+        requests = paths(list(Restaurant.objects.values_list("id", flat=True)))
+        add_db_latency(args.db_latency / 1000)
+
+        run = run_asgi if args.mode == "asgi" else run_wsgi
+        timings, statuses, elapsed = run(args, cookies, requests)
+
+    summary = summarize(timings)
+    summary["errors"] = sum(1 for status in statuses if status >= 400)
+    summary["requests_per_second"] = len(timings) / elapsed
+    print(json.dumps(summary))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=20, help="per client")
+    parser.add_argument("--workers", type=int, default=4, help="WSGI sync workers")
+    parser.add_argument("--threads", type=int, default=10, help="ASYNC_VIEW_THREADS")
+    parser.add_argument("--db-latency", type=float, default=5, help="ms per query")
+    parser.add_argument(
+        "--client-latency", type=float, default=50, help="ms to send a response"
+    )
+    parser.add_argument("--bookings", type=int, default=5000)
+    parser.add_argument("--mode", choices=["wsgi", "asgi"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        benchmark(args)
+        return
+
+    rows = []
+    for mode in ["wsgi", "asgi"]:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.asgi", *sys.argv[1:], "--mode", mode],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout
+        result = json.loads(output.splitlines()[-1])
+        rows.append(
+            [
+                mode,
+                result["count"],
+                result["errors"],
+                f"{result['requests_per_second']:.0f}",
+                f"{result['p50_ms']:.1f}",
+                f"{result['p95_ms']:.1f}",
+                f"{result['p99_ms']:.1f}",
+            ]
+        )
+    print_table(
+        ["mode", "requests", "errors", "req/s", "p50 ms", "p95 ms", "p99 ms"], rows
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""Helpers shared by the benchmark scripts.
+
+Benchmarks run from the app directory with the same environment as the web
+container, for example::
+
+    docker-compose exec web python -m benchmarks.contention
+
+They build a throwaway test database, exactly like ``manage.py test``, so
+they never touch real data.
+"""
+import asyncio
+import contextlib
+import http.cookies
+import io
+import os
+import statistics
+import sys
+
+
+def setup():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project.settings")
+
+    import django
+
+    django.setup()
+
+
+@contextlib.contextmanager
+def test_database():
+    from django.test.utils import (
+        setup_databases,
+        setup_test_environment,
+        teardown_databases,
+        teardown_test_environment,
+    )
+
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=0)
+        teardown_test_environment()
+
+
+def percentile(values, percent):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, round(percent / 100 * (len(values) - 1)))
+    return values[index]
+
+
+def summarize(timings):
+    """Latency summary in milliseconds for a list of durations in seconds."""
+    return {
+        "count": len(timings),
+        "mean_ms": statistics.mean(timings) * 1000 if timings else 0.0,
+        "p50_ms": percentile(timings, 50) * 1000,
+        "p95_ms": percentile(timings, 95) * 1000,
+        "p99_ms": percentile(timings, 99) * 1000,
+    }
+
+
+def print_table(headers, rows):
+    widths = [
+        max(len(str(value)) for value in column) for column in zip(headers, *rows)
+    ]
+    for row in [headers, *rows]:
+        print("  ".join(str(value).rjust(width) for value, width in zip(row, widths)))
+
+
+class Browser:
+    """Cookie handling shared by the WSGI and ASGI clients."""
+
+    def __init__(self, application, cookies=None):
+        self.application = application
+        self.cookies = http.cookies.SimpleCookie()
+        if cookies is not None:
+            self.cookies.update(cookies)
+
+    def cookie_header(self):
+        return "; ".join(
+            f"{name}={morsel.value}" for name, morsel in self.cookies.items()
+        )
+
+    def store_cookies(self, headers):
+        for header, value in headers:
+            if header.lower() != "set-cookie":
+                continue
+            for name, morsel in http.cookies.SimpleCookie(value).items():
+                if morsel["max-age"] == "0":
+                    self.cookies.pop(name, None)
+                else:
+                    self.cookies[name] = morsel
+
+
+class WSGIClient(Browser):
+    """Minimal browser for a WSGI application that keeps cookies.
+
+    Unlike ``django.test.Client`` it calls the real WSGI handler, with no
+    test-only signal receivers, and CSRF checks stay on: unsafe requests send
+    the ``csrftoken`` cookie back as the ``X-CSRFToken`` header.
+    """
+
+    def request(self, method, path, data=None):
+        from urllib.parse import urlencode, urlsplit
+
+        url = urlsplit(path)
+        body = urlencode(data or {}, doseq=True).encode()
+        environ = {
+            "REQUEST_METHOD": method,
+            "PATH_INFO": url.path,
+            "QUERY_STRING": url.query,
+            "SERVER_NAME": "testserver",
+            "SERVER_PORT": "80",
+            "HTTP_HOST": "testserver",
+            "SERVER_PROTOCOL": "HTTP/1.1",
+            "wsgi.url_scheme": "http",
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "CONTENT_TYPE": "application/x-www-form-urlencoded",
+            "CONTENT_LENGTH": str(len(body)),
+            "HTTP_COOKIE": self.cookie_header(),
+        }
+        if "csrftoken" in self.cookies:
+            environ["HTTP_X_CSRFTOKEN"] = self.cookies["csrftoken"].value
+
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response["status"] = int(status.split()[0])
+            response["headers"] = headers
+
+        result = self.application(environ, start_response)
+        try:
+            response["content"] = b"".join(result)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+
+        self.store_cookies(response["headers"])
+        return response
+
+    def get(self, path):
+        return self.request("GET", path)
+
+    def post(self, path, data=None):
+        return self.request("POST", path, data)
+
+
+class ASGIClient(Browser):
+    """The WSGIClient of an ASGI application, whose requests are awaited.
+
+    ``send_delay`` seconds pass before each chunk of the response is
+    received, like a client on a slow network.
+    """
+
+    send_delay = 0
+
+    async def request(self, method, path, data=None):
+        from urllib.parse import urlencode, urlsplit
+
+        url = urlsplit(path)
+        body = urlencode(data or {}, doseq=True).encode()
+        headers = [
+            (b"host", b"testserver"),
+            (b"content-type", b"application/x-www-form-urlencoded"),
+            (b"content-length", str(len(body)).encode()),
+            (b"cookie", self.cookie_header().encode()),
+        ]
+        if "csrftoken" in self.cookies:
+            headers.append((b"x-csrftoken", self.cookies["csrftoken"].value.encode()))
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": url.path,
+            "raw_path": url.path.encode(),
+            "query_string": url.query.encode(),
+            "root_path": "",
+            "headers": headers,
+            "client": ("127.0.0.1", 0),
+            "server": ("testserver", 80),
+        }
+
+        async def receive():
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        response = {"content": b""}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = [
+                    (name.decode("latin1"), value.decode("latin1"))
+                    for name, value in message["headers"]
+                ]
+            elif message["type"] == "http.response.body":
+                response["content"] += message.get("body", b"")
+                if self.send_delay:
+                    await asyncio.sleep(self.send_delay)
+
+        await self.application(scope, receive, send)
+        self.store_cookies(response["headers"])
+        return response
+
+    async def get(self, path):
+        return await self.request("GET", path)
@@ -0,0 +1,101 @@
+"""Latency saved per request by reusing database connections.
+
+Requests home_page and my_bookings through the full middleware stack, once
+closing the connection after every request (CONN_MAX_AGE=0) and once keeping
+it open. Run it a second time with SQL_POOL=1 to measure the pooled backend,
+which returns connections to its pool instead of closing them.
+
+    python -m benchmarks.connections --requests 500
+
+Meaningful against Postgres; an in-memory SQLite test database is never
+closed.
+"""
+import argparse
+import time
+
+from benchmarks.common import print_table, setup, summarize, test_database
+
+VIEWS = [("home_page", "/"), ("my_bookings", "/my-bookings")]
+
+
+def create_data():
+    import datetime
+
+    from django.contrib.auth.models import User
+    from django.utils import timezone
+
+    from table_booker.models import Booking, Restaurant, Table
+
+    user = User.objects.create(username="connections")
+    restaurants = [
+        Restaurant.objects.create(
+            name=f"Restaurant {number}",
+            address1=f"{number} High Street",
+            address2="London",
+            postcode="E17 8BL",
+        )
+        for number in range(50)
+    ]
+    for number, restaurant in enumerate(restaurants):
+        table = Table.objects.create(restaurant=restaurant, name="Corner", capacity=4)
+        Booking.objects.create(
+            user=user,
+            restaurant=restaurant,
+            table=table,
+            date=timezone.now() + datetime.timedelta(days=1, hours=number),
+            total_guests=2,
+        )
+    return user
+
+
+def measure(client, url, requests):
+    timings = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        client.get(url)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--requests", type=int, default=500, help="per view and mode")
+    args = parser.parse_args()
+
+    setup()
+    from django.db import connection
+    from django.test import Client
+
+    with test_database():
+        user = create_data()
+        client = Client()
+        client.force_login(user)
+
+        rows = []
+        for name, url in VIEWS:
+            means = {}
+            for mode, max_age in [("close", 0), ("reuse", 60)]:
+                connection.close()
+                connection.settings_dict["CONN_MAX_AGE"] = max_age
+                client.get(url)  # warm up caches and, when reusing, the connection
+                summary = summarize(measure(client, url, args.requests))
+                means[mode] = summary["mean_ms"]
+                rows.append(
+                    [
+                        name,
+                        mode,
+                        connection.vendor,
+                        f"{summary['mean_ms']:.2f}",
+                        f"{summary['p50_ms']:.2f}",
+                        f"{summary['p95_ms']:.2f}",
+                    ]
+                )
+            rows.append(
+                [name, "saved", "", f"{means['close'] - means['reuse']:.2f}", "", ""]
+            )
+
+    print_table(["view", "connection", "backend", "mean ms", "p50 ms", "p95 ms"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""Booking commit throughput with many concurrent writers.
+
+Each writer thread pushes bookings through ``BookingForm`` and
+``reservations.commit_booking``, the same path the views use. The ``hot``
+scenario points every writer at one restaurant, the ``spread`` scenario gives
+each writer its own restaurant. With per-slot locking the two should commit
+at similar rates; only writers that pick the same table and time wait on each
+other, and those show up as conflicts. Database errors such as lock
+timeouts are counted separately.
+
+    python -m benchmarks.contention --writers 16 --bookings 200
+
+Run it against Postgres; SQLite serializes every write regardless.
+"""
+import argparse
+import datetime
+import random
+import threading
+import time
+
+from benchmarks.common import print_table, setup, test_database
+
+
+def create_restaurants(count, tables):
+    from table_booker.models import Restaurant, Setting, Table
+
+    restaurants = Restaurant.objects.bulk_create(
+        Restaurant(
+            name=f"Restaurant {number}",
+            address1=f"{number} High Street",
+            address2="London",
+            postcode="E17 8BL",
+        )
+        for number in range(count)
+    )
+    # bulk_create only sets primary keys on Postgres
+    restaurants = list(Restaurant.objects.order_by("id"))
+    Setting.objects.bulk_create(
+        Setting(restaurant=restaurant, min_guest=1) for restaurant in restaurants
+    )
+    Table.objects.bulk_create(
+        Table(restaurant=restaurant, name=f"Table {number}", capacity=4)
+        for restaurant in restaurants
+        for number in range(tables)
+    )
+    return list(Restaurant.objects.prefetch_related("tables").order_by("id"))
+
+
+def create_users(count):
+    from django.contrib.auth.models import User
+
+    User.objects.bulk_create(
+        User(username=f"writer{number}") for number in range(count)
+    )
+    return list(User.objects.filter(username__startswith="writer").order_by("id"))
+
+
+def writer(user, restaurant, bookings, days, seed, barrier, results):
+    from django.db import DatabaseError, connections
+
+    from table_booker.forms import BookingForm
+    from table_booker.reservations import commit_booking
+
+    rng = random.Random(seed)
+    tables = list(restaurant.tables.all())
+    start = datetime.datetime.now(datetime.timezone.utc).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    ) + datetime.timedelta(days=1)
+    committed = conflicts = errors = 0
+
+    barrier.wait()
+    try:
+        for _ in range(bookings):
+            date = start + datetime.timedelta(
+                days=rng.randrange(days), minutes=15 * rng.randrange(96)
+            )
+            form = BookingForm(
+                restaurant,
+                {
+                    "table": rng.choice(tables).id,
+                    "date": date.strftime("%Y-%m-%dT%H:%M"),
+                    "total_guests": 2,
+                },
+            )
+            try:
+                if form.is_valid() and commit_booking(
+                    form, restaurant=restaurant, user=user
+                ):
+                    committed += 1
+                else:
+                    conflicts += 1
+            except DatabaseError:
+                errors += 1
+    finally:
+        connections.close_all()
+
+    results.append((committed, conflicts, errors))
+
+
+def run(name, users, restaurants, bookings, days):
+    from table_booker.models import Booking
+
+    barrier = threading.Barrier(len(users) + 1)
+    results = []
+    threads = [
+        threading.Thread(
+            target=writer,
+            args=(user, restaurant, bookings, days, number, barrier, results),
+        )
+        for number, (user, restaurant) in enumerate(zip(users, restaurants))
+    ]
+    for thread in threads:
+        thread.start()
+
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    Booking.objects.all().delete()
+    committed = sum(result[0] for result in results)
+    conflicts = sum(result[1] for result in results)
+    errors = sum(result[2] for result in results)
+    return [
+        name,
+        len(users),
+        committed,
+        conflicts,
+        errors,
+        f"{elapsed:.2f}",
+        f"{(committed + conflicts + errors) / elapsed:.0f}",
+        f"{committed / elapsed:.0f}",
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--writers", type=int, default=16)
+    parser.add_argument("--bookings", type=int, default=200, help="per writer")
+    parser.add_argument("--tables", type=int, default=20, help="per restaurant")
+    parser.add_argument("--days", type=int, default=7, help="booking horizon")
+    args = parser.parse_args()
+
+    setup()
+    with test_database():
+        users = create_users(args.writers)
+        restaurants = create_restaurants(args.writers, args.tables)
+
+        rows = [
+            run(
+                "hot", users, [restaurants[0]] * args.writers, args.bookings, args.days,
+            ),
+            run("spread", users, restaurants, args.bookings, args.days),
+        ]
+
+    print_table(
+        [
+            "scenario",
+            "writers",
+            "committed",
+            "conflicts",
+            "errors",
+            "seconds",
+            "attempts/s",
+            "commits/s",
+        ],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Postcode lookups and nearest restaurant queries, against the size of the data.
+
+A postcode index of ``--postcodes`` made up postcodes spread over Great
+Britain is written to a temporary file and mapped, then random postcodes are
+geocoded, and the nearest restaurants to them and those within
+SEARCH_RADIUS_KM are found among ``--restaurants`` placed at random
+postcodes.
+
+    python -m benchmarks.geo --postcodes 1700000 --restaurants 10000
+
+No database is needed; the grid is built from the points directly, as
+search.restaurant_grid builds it from the restaurant table.
+"""
+import argparse
+import os
+import pickle
+import random
+import string
+import tempfile
+import time
+
+from benchmarks.common import print_table, setup, summarize
+
+AREAS = ["B", "E", "G", "L", "M", "N", "S", "W", "BS", "CF", "EH", "LS", "NE", "SW"]
+
+
+def make_postcodes(count, rng):
+    """``(postcode, latitude, longitude)`` rows, clustered by district."""
+    rows = {}
+    centres = {}
+    while len(rows) < count:
+        district = f"{rng.choice(AREAS)}{rng.randint(1, 99)}"
+        if district not in centres:
+            centres[district] = (rng.uniform(50.2, 58.5), rng.uniform(-5.5, 1.7))
+        postcode = (
+            f"{district} {rng.randint(0, 9)}"
+            f"{rng.choice(string.ascii_uppercase)}{rng.choice(string.ascii_uppercase)}"
+        )
+        latitude, longitude = centres[district]
+        rows[postcode] = (
+            latitude + rng.gauss(0, 0.02),
+            longitude + rng.gauss(0, 0.03),
+        )
+    return [(postcode, *point) for postcode, point in rows.items()]
+
+
+def benchmark(args):
+    from django.conf import settings
+
+    from table_booker.geo import GridIndex, PostcodeIndex, write_postcode_index
+
+    rng = random.Random(0)
+    rows = make_postcodes(args.postcodes, rng)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "postcodes.bin")
+        started = time.perf_counter()
+        write_postcode_index(rows, path)
+        build = time.perf_counter() - started
+        size = os.path.getsize(path)
+        index = PostcodeIndex(path)
+
+        restaurants = [
+            (restaurant_id, *row[1:])
+            for restaurant_id, row in enumerate(rng.sample(rows, args.restaurants))
+        ]
+        started = time.perf_counter()
+        grid = GridIndex(restaurants)
+        grid_build = time.perf_counter() - started
+        grid_size = len(pickle.dumps(grid))
+
+        timings = {"geocode": [], "10 nearest": [], "within radius": []}
+        found = 0
+        for _ in range(args.iterations):
+            postcode = rng.choice(rows)[0]
+            started = time.perf_counter()
+            point = index.geocode(postcode)
+            timings["geocode"].append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            grid.nearest(*point, 10, max_km=settings.SEARCH_RADIUS_KM)
+            timings["10 nearest"].append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            found += len(grid.within(*point, settings.SEARCH_RADIUS_KM))
+            timings["within radius"].append(time.perf_counter() - started)
+
+    print(
+        f"postcode index: {len(rows)} postcodes, {size / 2 ** 20:.1f} MiB in {build:.1f}s"
+    )
+    print(
+        f"restaurant grid: {len(grid)} restaurants, {grid_size / 2 ** 10:.0f} KiB "
+        f"pickled in {grid_build * 1000:.0f}ms, {found / args.iterations:.1f} "
+        f"within {settings.SEARCH_RADIUS_KM:g} km on average"
+    )
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--postcodes", type=int, default=1000000)
+    parser.add_argument("--restaurants", type=int, default=10000)
+    parser.add_argument("--iterations", type=int, default=1000)
+    args = parser.parse_args()
+
+    setup()
+    timings = benchmark(args)
+    rows = []
+    for name, values in timings.items():
+        result = summarize(values)
+        rows.append(
+            [
+                name,
+                result["count"],
+                f"{result['p50_ms']:.3f}",
+                f"{result['p95_ms']:.3f}",
+                f"{result['p99_ms']:.3f}",
+            ]
+        )
+    print_table(["query", "count", "p50 ms", "p95 ms", "p99 ms"], rows)
+
+
+if __name__ == "__main__":
+    main()
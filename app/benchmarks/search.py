@@ -0,0 +1,96 @@
+"""Latency of the search across restaurants, and the cost of keeping it ready.
+
+seed_data fills a throwaway database with ``--restaurants`` restaurants and
+``--bookings`` bookings over the searchable days, refresh_slots computes
+their slots, then random searches for a party of 2 to 8 at an evening slot
+run with and without a postcode district, the way the search view runs them.
+
+    python -m benchmarks.search --restaurants 10000 --bookings 1000000
+
+The refresh time covers every restaurant; day to day, slots are refreshed
+a few at a time as bookings come in.
+"""
+import argparse
+import datetime
+import os
+import random
+import time
+
+from benchmarks.common import print_table, setup, summarize, test_database
+
+
+def benchmark(args):
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db import connection
+    from django.utils import timezone
+
+    from table_booker.models import Restaurant, SlotCapacity
+    from table_booker.search import available_restaurants
+    from table_booker.views import SEARCH_RESULTS
+
+    call_command(
+        "seed_data",
+        restaurants=args.restaurants,
+        bookings=args.bookings,
+        users=100,
+        days=settings.SEARCH_DAYS,
+        start=timezone.localdate(),
+        stdout=open(os.devnull, "w"),
+    )
+    started = time.perf_counter()
+    call_command("refresh_slots", stdout=open(os.devnull, "w"))
+    refresh = time.perf_counter() - started
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+    rng = random.Random(0)
+    districts = sorted(set(Restaurant.objects.values_list("district", flat=True)))
+    first = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+    timings = {"any postcode": [], "with a district": []}
+    for _ in range(args.iterations):
+        at = first + datetime.timedelta(
+            days=rng.randint(1, settings.SEARCH_DAYS - 1),
+            minutes=settings.BOOKING_SLOT_MINUTES * rng.randint(72, 88),
+        )
+        guests = rng.randint(2, 8)
+        for name, postcode in [
+            ("any postcode", ""),
+            ("with a district", rng.choice(districts)),
+        ]:
+            started = time.perf_counter()
+            list(available_restaurants(at, guests, postcode)[:SEARCH_RESULTS])
+            timings[name].append(time.perf_counter() - started)
+
+    return refresh, SlotCapacity.objects.count(), timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--restaurants", type=int, default=1000)
+    parser.add_argument("--bookings", type=int, default=100000)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    setup()
+    with test_database():
+        refresh, slots, timings = benchmark(args)
+
+    print(f"refresh_slots: {slots} slots in {refresh:.1f}s")
+    rows = []
+    for name, values in timings.items():
+        result = summarize(values)
+        rows.append(
+            [
+                name,
+                result["count"],
+                f"{result['p50_ms']:.2f}",
+                f"{result['p95_ms']:.2f}",
+                f"{result['p99_ms']:.2f}",
+            ]
+        )
+    print_table(["search", "count", "p50 ms", "p95 ms", "p99 ms"], rows)
+
+
+if __name__ == "__main__":
+    main()
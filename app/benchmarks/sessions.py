@@ -0,0 +1,123 @@
+"""Requests per second and session table traffic per session configuration.
+
+Each iteration updates a booking, which adds a flash message, and follows the
+redirect to my_bookings, which displays it. This is run once with Django's
+defaults (database sessions, fallback message storage) and once per
+configuration the project supports.
+
+    python -m benchmarks.sessions --iterations 500
+"""
+import argparse
+import datetime
+import time
+
+from benchmarks.common import print_table, setup, test_database
+
+CONFIGURATIONS = [
+    (
+        "db + fallback (before)",
+        "django.contrib.sessions.backends.db",
+        "django.contrib.messages.storage.fallback.FallbackStorage",
+    ),
+    (
+        "cached_db + cookie",
+        "django.contrib.sessions.backends.cached_db",
+        "django.contrib.messages.storage.cookie.CookieStorage",
+    ),
+    (
+        "signed_cookies + cookie",
+        "django.contrib.sessions.backends.signed_cookies",
+        "django.contrib.messages.storage.cookie.CookieStorage",
+    ),
+]
+
+
+def create_booking():
+    from django.contrib.auth.models import User
+    from django.utils import timezone
+
+    from table_booker.models import Booking, Restaurant, Setting, Table
+
+    user = User.objects.create(username="sessions")
+    restaurant = Restaurant.objects.create(
+        name="Golden Star Restaurant",
+        address1="20 Temple Road",
+        address2="London",
+        postcode="E17 8BL",
+    )
+    Setting.objects.create(restaurant=restaurant, min_guest=1)
+    table = Table.objects.create(restaurant=restaurant, name="Corner", capacity=4)
+    booking = Booking.objects.create(
+        user=user,
+        restaurant=restaurant,
+        table=table,
+        date=timezone.now() + datetime.timedelta(days=1),
+        total_guests=2,
+    )
+    return user, booking
+
+
+def run(name, session_engine, message_storage, user, booking, iterations):
+    from django.db import connection
+    from django.test import Client, override_settings
+    from django.test.utils import CaptureQueriesContext
+
+    data = {
+        "table": booking.table_id,
+        "date": booking.date.strftime("%Y-%m-%dT%H:%M"),
+        "total_guests": 2,
+    }
+    with override_settings(
+        SESSION_ENGINE=session_engine, MESSAGE_STORAGE=message_storage
+    ):
+        client = Client()
+        client.force_login(user)
+        client.post(f"/update-booking/{booking.id}", data, follow=True)
+
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            for _ in range(iterations):
+                client.post(f"/update-booking/{booking.id}", data, follow=True)
+            elapsed = time.perf_counter() - started
+
+    session_queries = [query for query in queries if "django_session" in query["sql"]]
+    writes = [
+        query for query in session_queries if not query["sql"].startswith("SELECT")
+    ]
+    requests = iterations * 2
+    return [
+        name,
+        requests,
+        f"{requests / elapsed:.0f}",
+        f"{len(session_queries) / requests:.2f}",
+        f"{len(writes) / requests:.2f}",
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+
+    setup()
+    with test_database():
+        user, booking = create_booking()
+        rows = [
+            run(name, engine, storage, user, booking, args.iterations)
+            for name, engine, storage in CONFIGURATIONS
+        ]
+
+    print_table(
+        [
+            "configuration",
+            "requests",
+            "requests/s",
+            "session queries/req",
+            "session writes/req",
+        ],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
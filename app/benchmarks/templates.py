@@ -0,0 +1,162 @@
+"""Render time of my_bookings.html against the number of bookings listed.
+
+Each list size is rendered with the template loaders Django uses by default
+with DEBUG, which read and compile every template on every render, with the
+cached loaders used in production, and with the cached loaders plus row
+fragments, both cold (every row rendered and stored) and warm (every row
+read back with one get_many).
+
+    python -m benchmarks.templates --sizes 10 50 100 500 --iterations 50
+
+Bookings are built in memory, so no database is needed, and fragments go to
+a local memory cache large enough for every row, so the numbers leave out
+the round trip to a shared cache.
+"""
+import argparse
+import datetime
+import time
+
+from benchmarks.common import print_table, setup, summarize
+
+LOADERS = [
+    "django.template.loaders.filesystem.Loader",
+    "django.template.loaders.app_directories.Loader",
+]
+
+
+def build_bookings(count):
+    from django.contrib.auth.models import User
+    from django.utils import timezone
+
+    from table_booker.models import Booking, Restaurant, Table
+
+    now = timezone.now()
+    user = User(id=1, username="templates")
+    restaurants = [
+        Restaurant(id=number, name=f"Golden Star {number}", modified_at=now)
+        for number in range(1, 21)
+    ]
+    return [
+        Booking(
+            id=number,
+            user=user,
+            restaurant=restaurants[number % len(restaurants)],
+            table=Table(
+                id=number,
+                restaurant=restaurants[number % len(restaurants)],
+                name=f"Corner {number}",
+                capacity=4,
+                modified_at=now,
+            ),
+            date=now + datetime.timedelta(hours=number),
+            total_guests=2,
+            modified_at=now,
+        )
+        for number in range(1, count + 1)
+    ]
+
+
+def engine(cached):
+    from django.conf import settings
+    from django.template import Engine
+
+    loaders = LOADERS
+    if cached:
+        loaders = [("django.template.loaders.cached.Loader", LOADERS)]
+    return Engine(dirs=settings.TEMPLATES[0]["DIRS"], loaders=loaders)
+
+
+def render_page(engine, context, rows):
+    from django.template import Context
+
+    template = engine.get_template("my_bookings.html")
+    return template.render(Context({**context, "booking_rows": rows}))
+
+
+def plain_rows(engine, bookings):
+    from django.template import Context
+
+    template = engine.get_template("includes/booking_row.html")
+    return [
+        (booking, template.render(Context({"booking": booking})))
+        for booking in bookings
+    ]
+
+
+def fragment_rows(bookings, cold):
+    from django.core.cache import caches
+
+    from table_booker.fragments import booking_versions, render_rows
+
+    if cold:
+        caches["fragments"].clear()
+    return render_rows(
+        "includes/booking_row.html", bookings, "booking", booking_versions
+    )
+
+
+def time_renders(render, iterations):
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        render()
+        timings.append(time.perf_counter() - started)
+    return summarize(timings)
+
+
+def benchmark(size, iterations):
+    from django.test import RequestFactory
+
+    bookings = build_bookings(size)
+    request = RequestFactory().get("/my-bookings")
+    request.user = bookings[0].user
+    context = {"bookings": bookings, "when": "upcoming", "request": request}
+    uncached, cached = engine(cached=False), engine(cached=True)
+
+    fragment_rows(bookings, cold=True)  # compile the row template
+    renders = {
+        "uncached loaders": lambda: render_page(
+            uncached, context, plain_rows(uncached, bookings)
+        ),
+        "cached loaders": lambda: render_page(
+            cached, context, plain_rows(cached, bookings)
+        ),
+        "fragments, cold": lambda: render_page(
+            cached, context, fragment_rows(bookings, cold=True)
+        ),
+        "fragments, warm": lambda: render_page(
+            cached, context, fragment_rows(bookings, cold=False)
+        ),
+    }
+    return {name: time_renders(render, iterations) for name, render in renders.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 100, 500])
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    setup()
+    from django.conf import settings
+    from django.test.utils import override_settings
+
+    fragments = {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "benchmarks.templates",
+        "OPTIONS": {"MAX_ENTRIES": max(args.sizes) * 2},
+    }
+    rows = []
+    with override_settings(
+        CACHES={**settings.CACHES, "fragments": fragments}, FRAGMENT_CACHE="fragments"
+    ):
+        for size in args.sizes:
+            rows += [
+                [size, name, f"{result['p50_ms']:.2f}", f"{result['p95_ms']:.2f}"]
+                for name, result in benchmark(size, args.iterations).items()
+            ]
+    print_table(["bookings", "rendering", "p50 ms", "p95 ms"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""Latency, throughput and query counts of the table_booker views.
+
+Every scenario is driven through the project's WSGI application by
+``--concurrency`` threads, each logged in as a different seeded user, and
+reports p50/p95/p99 latency, requests per second and queries per request.
+
+    python -m benchmarks.views --concurrency 8 --requests 200 --output before.json
+    python -m benchmarks.views --compare before.json --output after.json
+
+By default the views run against a throwaway database filled by seed_data
+(``--restaurants``, ``--bookings``); ``--existing`` uses the configured
+database instead, which must already be seeded and will receive bookings.
+With ``--compare``, views whose p95 latency grew by more than ``--threshold``
+percent, or that run more queries per request, are flagged as regressions
+and the script exits with status 1.
+"""
+import argparse
+import contextlib
+import datetime
+import json
+import random
+import subprocess
+import sys
+import threading
+import time
+
+from benchmarks.common import WSGIClient, print_table, setup, summarize, test_database
+
+PASSWORD = "top-secret"  # seed_data's password for every user
+DATE_FORMAT = "%Y-%m-%dT%H:%M"
+
+
+def home_page(worker):
+    return "GET", "/", None
+
+
+def book_restaurant_get(worker):
+    restaurant_id, _ = worker.rng.choice(worker.tables)
+    return "GET", f"/book-restaurant/{restaurant_id}", None
+
+
+def book_restaurant_post(worker):
+    restaurant_id, table_id = worker.rng.choice(worker.tables)
+    date = worker.now + datetime.timedelta(
+        days=worker.rng.randint(30, 60), minutes=15 * worker.rng.randint(0, 48)
+    )
+    data = {"table": table_id, "date": date.strftime(DATE_FORMAT), "total_guests": 2}
+    return "POST", f"/book-restaurant/{restaurant_id}", data
+
+
+def my_bookings(worker):
+    return "GET", "/my-bookings", None
+
+
+def update_booking(worker):
+    booking = worker.booking
+    data = {
+        "table": booking.table_id,
+        "date": booking.date.strftime(DATE_FORMAT),
+        "total_guests": booking.total_guests,
+    }
+    return "POST", f"/update-booking/{booking.id}", data
+
+
+def login_page_get(worker):
+    return "GET", "/login", None
+
+
+def login_page_post(worker):
+    data = {"username": worker.booking.user.username, "password": PASSWORD}
+    return "POST", "/login", data
+
+
+SCENARIOS = {
+    "home_page GET": home_page,
+    "book_restaurant GET": book_restaurant_get,
+    "book_restaurant POST": book_restaurant_post,
+    "my_bookings GET": my_bookings,
+    "update_booking POST": update_booking,
+    "login_page GET": login_page_get,
+    "login_page POST": login_page_post,
+}
+
+
+class Worker:
+    """A logged in client with its own user, booking and random stream."""
+
+    def __init__(self, application, booking, tables, seed):
+        from django.utils import timezone
+
+        self.client = WSGIClient(application)
+        self.booking = booking
+        self.tables = tables
+        self.rng = random.Random(seed)
+        self.now = timezone.now().replace(second=0, microsecond=0)
+
+    def login(self):
+        self.client.get("/login")
+        _, path, data = login_page_post(self)
+        response = self.client.post(path, data)
+        if response["status"] != 302:
+            raise RuntimeError(f"Could not log in {data['username']}")
+
+    def run(self, scenario, requests, barrier, results):
+        from django.db import connection
+
+        queries = []
+
+        def count_queries(execute, sql, params, many, context):
+            queries[-1] += 1
+            return execute(sql, params, many, context)
+
+        barrier.wait()
+        with connection.execute_wrapper(count_queries):
+            for _ in range(requests):
+                method, path, data = scenario(self)
+                queries.append(0)
+                started = time.perf_counter()
+                response = self.client.request(method, path, data)
+                results.append(
+                    (time.perf_counter() - started, queries[-1], response["status"])
+                )
+        connection.close()
+
+
+def prepare_workers(application, count):
+    """One worker per seeded user with an upcoming booking."""
+    from django.utils import timezone
+
+    from table_booker.models import Booking, Table
+
+    bookings = {}
+    upcoming = (
+        Booking.objects.filter(date__gt=timezone.now() + datetime.timedelta(days=1))
+        .select_related("user")
+        .order_by("id")
+    )
+    for booking in upcoming.iterator():
+        bookings.setdefault(booking.user_id, booking)
+        if len(bookings) == count:
+            break
+    if len(bookings) < count:
+        sys.exit(f"Only {len(bookings)} users have upcoming bookings, seed more data")
+
+    tables = list(
+        Table.objects.order_by("id").values_list("restaurant_id", "id")[:1000]
+    )
+    return [
+        Worker(application, booking, tables, seed)
+        for seed, booking in enumerate(bookings.values())
+    ]
+
+
+def run_scenario(workers, scenario, requests):
+    barrier = threading.Barrier(len(workers) + 1)
+    results = []
+    threads = [
+        threading.Thread(target=worker.run, args=(scenario, requests, barrier, results))
+        for worker in workers
+    ]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    summary = summarize([duration for duration, _, _ in results])
+    summary["errors"] = sum(1 for _, _, status in results if status >= 400)
+    summary["requests_per_second"] = len(results) / elapsed
+    summary["queries_per_request"] = sum(count for _, count, _ in results) / len(
+        results
+    )
+    return summary
+
+
+def revision():
+    with contextlib.suppress(OSError, subprocess.CalledProcessError):
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    return None
+
+
+def compare(views, baseline, threshold):
+    """Regression notes per view compared with a previous run's results."""
+    notes = {}
+    for name, result in views.items():
+        before = baseline["views"].get(name)
+        if before is None:
+            notes[name] = ("", "new")
+            continue
+
+        change = (
+            (result["p95_ms"] / before["p95_ms"] - 1) * 100 if before["p95_ms"] else 0
+        )
+        regressions = []
+        if change > threshold:
+            regressions.append("p95")
+        if result["queries_per_request"] > before["queries_per_request"] + 0.01:
+            regressions.append("queries")
+        notes[name] = (
+            f"{change:+.0f}%",
+            "REGRESSION " + "+".join(regressions) if regressions else "ok",
+        )
+    return notes
+
+
+def benchmark(args):
+    from django.db import connection
+
+    from project.wsgi import application
+
+    workers = prepare_workers(application, args.concurrency)
+    for worker in workers:
+        worker.login()
+
+    views = {}
+    for name, scenario in SCENARIOS.items():
+        if args.views and name.split()[0] not in args.views:
+            continue
+        # one untimed round warms caches and connections
+        run_scenario(workers, scenario, 1)
+        views[name] = run_scenario(workers, scenario, args.requests)
+
+    return {
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "revision": revision(),
+        "vendor": connection.vendor,
+        "options": vars(args),
+        "views": views,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=100, help="per thread")
+    parser.add_argument(
+        "--views", nargs="*", help="only these views, e.g. home_page my_bookings"
+    )
+    parser.add_argument("--restaurants", type=int, default=100)
+    parser.add_argument("--bookings", type=int, default=50000)
+    parser.add_argument("--existing", action="store_true")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="results JSON of a previous run")
+    parser.add_argument(
+        "--threshold", type=float, default=10, help="p95 regression, in percent"
+    )
+    args = parser.parse_args()
+
+    setup()
+    from django.core.management import call_command
+
+    if args.existing:
+        results = benchmark(args)
+    else:
+        with test_database():
+            call_command(
+                "seed_data",
+                restaurants=args.restaurants,
+                users=max(args.concurrency, 100),
+                bookings=args.bookings,
+                days=60,
+            )
+            results = benchmark(args)
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+    headers = ["view", "requests", "errors", "req/s", "p50 ms", "p95 ms", "p99 ms"]
+    headers.append("queries/req")
+    notes = {}
+    if args.compare:
+        with open(args.compare) as baseline:
+            notes = compare(results["views"], json.load(baseline), args.threshold)
+        headers += ["p95 change", "status"]
+
+    rows = [
+        [
+            name,
+            result["count"],
+            result["errors"],
+            f"{result['requests_per_second']:.0f}",
+            f"{result['p50_ms']:.1f}",
+            f"{result['p95_ms']:.1f}",
+            f"{result['p99_ms']:.1f}",
+            f"{result['queries_per_request']:.1f}",
+            *notes.get(name, ()),
+        ]
+        for name, result in results["views"].items()
+    ]
+    print_table(headers, rows)
+
+    if any(note[1].startswith("REGRESSION") for note in notes.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,4 +11,11 @@ then
     echo "PostgreSQL started"
 fi
 
+if [ -n "$METRICS_DIR" ]
+then
+    # metrics files of the previous run's workers
+    mkdir -p "$METRICS_DIR"
+    rm -f "$METRICS_DIR"/*.json
+fi
+
 exec "$@"
@@ -2,6 +2,7 @@
 ASGI config for project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Run it with uvicorn workers under gunicorn, see docker-compose.asgi.yml.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
@@ -12,5 +13,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
+# serve the read heavy views async, see table_booker.executor
+os.environ.setdefault('ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
@@ -11,8 +11,11 @@ https://docs.djangoproject.com/en/3.1/ref/settings/
 """
 
 import os
+import sys
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -42,6 +45,10 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "table_booker.middleware.ProfilingMiddleware",
+    "table_booker.middleware.MetricsMiddleware",
+    "table_booker.middleware.QueryInstrumentationMiddleware",
+    "table_booker.middleware.ReplicaPinningMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -52,12 +59,21 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = "project.urls"
 
+# Templates are compiled once per worker and kept in memory, except with
+# DEBUG where edits show up without a restart
+TEMPLATE_LOADERS = [
+    "django.template.loaders.filesystem.Loader",
+    "django.template.loaders.app_directories.Loader",
+]
+if not DEBUG:
+    TEMPLATE_LOADERS = [("django.template.loaders.cached.Loader", TEMPLATE_LOADERS)]
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
         "DIRS": [os.path.join(BASE_DIR, "table_booker/template/table_booker")],
-        "APP_DIRS": True,
         "OPTIONS": {
+            "loaders": TEMPLATE_LOADERS,
             "context_processors": [
                 "django.template.context_processors.debug",
                 "django.template.context_processors.request",
@@ -82,9 +98,140 @@ DATABASES = {
         "PASSWORD": os.environ.get("SQL_PASSWORD", "password"),
         "HOST": os.environ.get("SQL_HOST", "localhost"),
         "PORT": os.environ.get("SQL_PORT", "5432"),
+        # seconds a connection is reused across requests, 0 closes it each time
+        "CONN_MAX_AGE": int(os.environ.get("SQL_CONN_MAX_AGE", default=60)),
+        # ping reused connections before each request, see table_booker.db
+        "CONN_HEALTH_CHECKS": bool(int(os.environ.get("SQL_HEALTH_CHECKS", default=1))),
     }
 }
 
+# Pool connections per process, for threaded or async workers. Django then
+# returns connections to the pool at the end of every request.
+if int(os.environ.get("SQL_POOL", default=0)):
+    DATABASES["default"].update(
+        {
+            "ENGINE": "table_booker.backends.postgresql_pool",
+            "CONN_MAX_AGE": 0,
+            "POOL": {
+                "MIN_SIZE": int(os.environ.get("SQL_POOL_MIN_SIZE", default=1)),
+                "MAX_SIZE": int(os.environ.get("SQL_POOL_MAX_SIZE", default=10)),
+                "TIMEOUT": int(os.environ.get("SQL_POOL_TIMEOUT", default=10)),
+            },
+        }
+    )
+
+# Read replicas, e.g. SQL_REPLICA_HOSTS="replica1 replica2:5433". Each entry
+# becomes a copy of the default database on that host; with SQLite it names
+# the replica's database file instead. See table_booker.routers.
+REPLICA_DATABASES = []
+for number, replica in enumerate(os.environ.get("SQL_REPLICA_HOSTS", "").split()):
+    replica_settings = dict(DATABASES["default"], TEST={"MIRROR": "default"})
+    if replica_settings["ENGINE"] == "django.db.backends.sqlite3":
+        replica_settings["NAME"] = replica
+    else:
+        host, _, port = replica.partition(":")
+        replica_settings.update(HOST=host, PORT=port or replica_settings["PORT"])
+    DATABASES[f"replica{number + 1}"] = replica_settings
+    REPLICA_DATABASES.append(f"replica{number + 1}")
+
+DATABASE_ROUTERS = ["table_booker.routers.PrimaryReplicaRouter"]
+# Seconds a user's reads stay on the primary after they write
+REPLICA_PIN_SECONDS = int(os.environ.get("REPLICA_PIN_SECONDS", default=5))
+
+# Cache
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+
+# The default cache is shared by every gunicorn worker in production, e.g.
+# CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache with
+# CACHE_LOCATION=/home/app/web/cache, or a memcached/redis backend.
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.environ.get("CACHE_LOCATION", "table-booker"),
+        "TIMEOUT": int(os.environ.get("CACHE_TIMEOUT", default=300)),
+        "KEY_PREFIX": os.environ.get("CACHE_KEY_PREFIX", "table_booker"),
+    }
+}
+
+# Backends that keep a separate cache in every process
+PROCESS_CACHES = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+# Worker processes per server, read by gunicorn too; with more than one, a
+# per process cache cannot carry invalidations between them
+WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", default=1))
+
+# In-process tier in front of the shared cache, see table_booker.cache
+LOCAL_CACHE_SIZE = int(os.environ.get("LOCAL_CACHE_SIZE", default=1024))
+# Upper bound, in seconds, on how stale a worker's local copy can get
+LOCAL_CACHE_TTL = int(os.environ.get("LOCAL_CACHE_TTL", default=5))
+
+# Send query counts and SQL time in a Server-Timing header, see
+# table_booker.middleware.QueryInstrumentationMiddleware
+SERVER_TIMING = bool(int(os.environ.get("SERVER_TIMING", default=1)))
+
+# Directory where every worker process writes its metrics, see
+# table_booker.metrics; empty it when the web service starts
+METRICS_DIR = os.environ.get("METRICS_DIR")
+METRICS_FLUSH_SECONDS = int(os.environ.get("METRICS_FLUSH_SECONDS", default=5))
+
+# Sampling profiler, see table_booker.profiling. Profiles a random share of
+# requests, plus requests sent with a token from `manage.py profile_token`.
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", default=0))
+PROFILE_INTERVAL_MS = int(os.environ.get("PROFILE_INTERVAL_MS", default=5))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", BASE_DIR / "profiles")
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", default=500))
+PROFILE_TOKEN_MAX_AGE = int(os.environ.get("PROFILE_TOKEN_MAX_AGE", default=3600))
+
+# Log statements slower than SLOW_QUERY_MS milliseconds (0 turns it off) in
+# the SlowQuery table, EXPLAINing a sample of them, see table_booker.db
+# the test suite leaves it off, timing based logging would make budgets flaky
+SLOW_QUERY_MS = int(
+    os.environ.get("SLOW_QUERY_MS", default=0 if sys.argv[1:2] == ["test"] else 200)
+)
+SLOW_QUERY_EXPLAIN_RATE = float(
+    os.environ.get("SLOW_QUERY_EXPLAIN_RATE", default=0.1)
+)
+SLOW_QUERY_KEEP = int(os.environ.get("SLOW_QUERY_KEEP", default=1000))
+
+# Serve home_page, availability and my_bookings as async views, on by default
+# in project.asgi, with their blocking work on ASYNC_VIEW_THREADS threads per
+# process, see table_booker.executor
+ASYNC_VIEWS = int(os.environ.get("ASYNC_VIEWS", default=0))
+ASYNC_VIEW_THREADS = int(os.environ.get("ASYNC_VIEW_THREADS", default=10))
+
+# Rendered rows of the home page and my_bookings, see table_booker.fragments
+FRAGMENT_CACHE = os.environ.get("FRAGMENT_CACHE", default="default")
+FRAGMENT_CACHE_TIMEOUT = int(os.environ.get("FRAGMENT_CACHE_TIMEOUT", default=3600))
+
+# Part of every page ETag and fragment cache key, change it when a deploy
+# changes what unchanged data renders to
+PAGE_CACHE_VERSION = os.environ.get("PAGE_CACHE_VERSION", default="1")
+
+# Sessions and messages
+# https://docs.djangoproject.com/en/3.1/topics/http/sessions/
+
+# db by default; signed_cookies keeps sessions client side with no server
+# storage at all. cached_db serves them from the cache and only reads the
+# database on a miss, so it needs a cache every worker shares: with a per
+# process cache a worker would keep serving a session another logged out.
+SESSION_ENGINE = "django.contrib.sessions.backends." + os.environ.get(
+    "SESSION_BACKEND", "db"
+)
+if (
+    SESSION_ENGINE == "django.contrib.sessions.backends.cached_db"
+    and CACHES["default"]["BACKEND"] in PROCESS_CACHES
+):
+    raise ImproperlyConfigured(
+        "SESSION_BACKEND=cached_db needs a CACHE_BACKEND shared by every worker"
+    )
+# Flash messages travel in a cookie, so messages.info() does not rewrite the
+# session on every booking
+MESSAGE_STORAGE = "django.contrib.messages.storage.cookie.CookieStorage"
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 
@@ -128,3 +275,18 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "mediafiles"
+
+# Bookings
+
+# How long a table stays occupied after the booked time
+BOOKING_DURATION_MINUTES = int(os.environ.get("BOOKING_DURATION_MINUTES", default=120))
+# Granularity of the start times offered to users
+BOOKING_SLOT_MINUTES = int(os.environ.get("BOOKING_SLOT_MINUTES", default=15))
+# Most adjacent tables pushed together for one party
+MAX_JOINED_TABLES = int(os.environ.get("MAX_JOINED_TABLES", default=3))
+# Days ahead searchable across restaurants, see table_booker.slots
+SEARCH_DAYS = int(os.environ.get("SEARCH_DAYS", default=7))
+# Postcode index built by build_postcode_index, see table_booker.geo
+POSTCODE_INDEX = os.environ.get("POSTCODE_INDEX", BASE_DIR / "postcodes.bin")
+# Furthest a restaurant is searched from the postcode searched near
+SEARCH_RADIUS_KM = float(os.environ.get("SEARCH_RADIUS_KM", default=10))
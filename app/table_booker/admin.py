@@ -1,6 +1,19 @@
 from django.contrib import admin
+from django.http import StreamingHttpResponse
+from django.utils.html import format_html
 
-from .models import Booking, BusinessHour, Restaurant, Setting, Table
+from .bulk import export_csv
+from .models import (
+    Booking,
+    BusinessHour,
+    Holiday,
+    Profile,
+    Restaurant,
+    Setting,
+    SlowQuery,
+    Table,
+)
+from .profiling import read_stacks
 
 
 class BookingHourInline(admin.TabularInline):
@@ -9,11 +22,24 @@ class BookingHourInline(admin.TabularInline):
     show_change_link = True
 
 
+class HolidayInline(admin.TabularInline):
+    model = Holiday
+    extra = 1
+
+
 class TableInline(admin.TabularInline):
     model = Table
     extra = 1
     show_change_link = True
 
+    def formfield_for_manytomany(self, db_field, request, **kwargs):
+        # only tables of the restaurant being edited can be pushed together
+        if db_field.name == "adjacent":
+            kwargs["queryset"] = Table.objects.filter(
+                restaurant_id=request.resolver_match.kwargs.get("object_id")
+            )
+        return super().formfield_for_manytomany(db_field, request, **kwargs)
+
 
 class SettingInline(admin.TabularInline):
     model = Setting
@@ -33,6 +59,7 @@ class RestaurantAdmin(admin.ModelAdmin):
     )
     inlines = (
         BookingHourInline,
+        HolidayInline,
         TableInline,
         SettingInline,
     )
@@ -48,3 +75,71 @@ class BookingAdmin(admin.ModelAdmin):
         "created_at",
         "modified_at",
     )
+    list_select_related = ("user", "restaurant", "table")
+    date_hierarchy = "date"
+    actions = ("export_csv",)
+
+    @admin.action(description="Export selected bookings as CSV")
+    def export_csv(self, request, queryset):
+        response = StreamingHttpResponse(export_csv(queryset), content_type="text/csv")
+        response["Content-Disposition"] = 'attachment; filename="bookings.csv"'
+        return response
+
+
+@admin.register(Profile)
+class ProfileAdmin(admin.ModelAdmin):
+    list_display = (
+        "created_at",
+        "view",
+        "method",
+        "path",
+        "status",
+        "duration_ms",
+        "samples",
+    )
+    list_filter = ("view", "method")
+    fields = list_display + ("stacks_file", "stacks")
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description="Collapsed stacks, most sampled first")
+    def stacks(self, profile):
+        return format_html(
+            '<pre style="white-space: pre-wrap">{}</pre>', read_stacks(profile)
+        )
+
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    list_display = ("created_at", "duration_ms", "view", "database", "fingerprint")
+    list_filter = ("view", "database")
+    search_fields = ("fingerprint", "call_site")
+    fields = (
+        "created_at",
+        "duration_ms",
+        "view",
+        "database",
+        "call_site",
+        "fingerprint",
+        "sql",
+        "params",
+        "query_plan",
+    )
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description="Plan")
+    def query_plan(self, slow_query):
+        return format_html(
+            '<pre style="white-space: pre-wrap">{}</pre>', slow_query.plan
+        )
@@ -0,0 +1,232 @@
+"""Best-fit table allocation, joining adjacent tables for large parties.
+
+A party gets the free table wasting the fewest seats, so a couple never takes
+a six-top while a two-top is free. A party too large for any free table gets
+a group of free tables that are adjacent to each other, again wasting the
+fewest seats and then joining the fewest tables. Everything runs on an
+AvailabilityIndex, so allocating needs no queries once it is loaded.
+"""
+import collections
+import datetime
+
+from django.conf import settings
+from django.db import router
+from django.utils import timezone
+
+from .availability import AvailabilityIndex, booking_duration, booking_rows
+from .config import get_restaurant_config
+from .models import Booking
+from .reservations import locked_slots, slot_keys
+
+Move = collections.namedtuple("Move", ["booking", "old_tables", "new_tables"])
+
+
+def allocate(index, at, guests, exclude=None):
+    """The free tables of ``index`` seating ``guests`` at ``at``, or ``None``.
+
+    The first table of the tuple is the booking's table and the rest are
+    joined to it. Tables must carry ``adjacent`` ids, like TableConfig.
+    """
+    free = index.free_tables(at, guests, exclude)
+    if free:
+        return (free[0],)
+    return join_tables(index.free_tables(at, 1, exclude), guests)
+
+
+def adjacent_groups(tables, grow):
+    """Groups of 2 to MAX_JOINED_TABLES adjacent ``tables``, as id tuples.
+
+    ``tables`` maps ids to tables. Only groups for which ``grow(seats)`` is
+    true get more tables added to them.
+    """
+    seen = set()
+    groups = [(table_id,) for table_id in tables]
+    for _ in range(settings.MAX_JOINED_TABLES - 1):
+        grown = []
+        for group in groups:
+            for table_id in group:
+                for neighbour in tables[table_id].adjacent:
+                    if neighbour not in tables or neighbour in group:
+                        continue
+                    key = frozenset(group + (neighbour,))
+                    if key in seen:
+                        continue
+                    seen.add(key)
+
+                    members = group + (neighbour,)
+                    seats = sum(tables[member].capacity for member in members)
+                    yield members, seats
+                    if grow(seats):
+                        grown.append(members)
+        groups = grown
+
+
+def join_tables(free, guests):
+    """The group of adjacent ``free`` tables best seating ``guests``."""
+    tables = {table.id: table for table in free}
+    best, best_rank = None, None
+    # once a group seats everyone more tables would only waste more seats
+    for members, seats in adjacent_groups(tables, lambda seats: seats < guests):
+        if seats >= guests:
+            rank = (seats - guests, len(members), sorted(members))
+            if best_rank is None or rank < best_rank:
+                best, best_rank = members, rank
+
+    if best is None:
+        return None
+    # the largest table holds the booking, the others are joined to it
+    return tuple(
+        sorted(
+            (tables[table_id] for table_id in best),
+            key=lambda table: (-table.capacity, table.id),
+        )
+    )
+
+
+def largest_party(free):
+    """The most guests ``free`` tables can seat as one party, 0 for none."""
+    tables = {table.id: table for table in free}
+    parties = [table.capacity for table in free]
+    parties += [seats for _, seats in adjacent_groups(tables, lambda seats: True)]
+    return max(parties, default=0)
+
+
+def wasted_seats(tables, guests):
+    return sum(table.capacity for table in tables) - guests
+
+
+def plan_day(restaurant_id, date, using=None):
+    """Moves re-seating the future bookings of ``date`` best-fit first.
+
+    Bookings are placed largest party first around the bookings that stay
+    put, those already started or without a party size. Returns ``None``
+    when some party would no longer find a seat, and no moves when they
+    would not waste fewer seats overall.
+    """
+    config = get_restaurant_config(restaurant_id)
+    if config is None or not config.tables:
+        return None
+
+    start, end = future_of(date)
+    bookings = list(
+        Booking.objects.db_manager(using)
+        .filter(
+            restaurant_id=restaurant_id,
+            date__gte=start,
+            date__lt=end,
+            total_guests__isnull=False,
+        )
+        .prefetch_related("joined_tables")
+        .order_by("-total_guests", "date", "id")
+    )
+    moving = {booking.id for booking in bookings}
+    duration = booking_duration()
+    rows = booking_rows(
+        [table.id for table in config.tables], start - duration, end + duration, using,
+    )
+    index = AvailabilityIndex(
+        config.tables, [row for row in rows if row[2] not in moving], duration
+    )
+
+    moves, waste_before, waste_after = [], 0, 0
+    for booking in bookings:
+        old_ids = [booking.table_id] + sorted(
+            table.id for table in booking.joined_tables.all()
+        )
+        old_tables = [config.get_table(table_id) for table_id in old_ids]
+        new_tables = allocate(index, booking.date, booking.total_guests)
+        if new_tables is None or None in old_tables:
+            return None
+        for table in new_tables:
+            index.add(table.id, booking.date, booking.id)
+
+        waste_before += wasted_seats(old_tables, booking.total_guests)
+        waste_after += wasted_seats(new_tables, booking.total_guests)
+        new_ids = [new_tables[0].id] + sorted(table.id for table in new_tables[1:])
+        if new_ids != old_ids:
+            moves.append(Move(booking, tuple(old_tables), new_tables))
+
+    if waste_after >= waste_before:
+        return []
+    return moves
+
+
+def apply_moves(moves, using=None):
+    """Save ``moves`` from plan_day, unless a booking got in their way.
+
+    The slots the moves leave and take are locked and checked again, so a
+    booking made since the plan was drawn up is never double booked. Returns
+    whether the moves were saved.
+    """
+    using = using or router.db_for_write(Booking)
+    keys = []
+    for move in moves:
+        for table in move.old_tables + move.new_tables:
+            keys += slot_keys(table.id, move.booking.date)
+
+    moving = {move.booking.id: move for move in moves}
+    duration = booking_duration()
+    with locked_slots(keys, using):
+        current = (
+            Booking.objects.using(using)
+            .filter(id__in=moving)
+            .values_list("id", "date", "total_guests")
+        )
+        if {row[0]: row[1:] for row in current} != {
+            move.booking.id: (move.booking.date, move.booking.total_guests)
+            for move in moves
+        }:
+            return False
+
+        dates = [move.booking.date for move in moves]
+        tables = {table.id: table for move in moves for table in move.new_tables}
+        rows = booking_rows(
+            list(tables), min(dates) - duration, max(dates) + duration, using
+        )
+        index = AvailabilityIndex(
+            tables.values(), [row for row in rows if row[2] not in moving], duration
+        )
+        for move in moves:
+            for table in move.new_tables:
+                if not index.is_free(table.id, move.booking.date):
+                    return False
+                index.add(table.id, move.booking.date, move.booking.id)
+
+        now = timezone.now()
+        for move in moves:
+            move.booking.table_id = move.new_tables[0].id
+            move.booking.modified_at = now
+        Booking.objects.using(using).bulk_update(
+            [move.booking for move in moves], ["table", "modified_at"]
+        )
+        through = Booking.joined_tables.through
+        through.objects.using(using).filter(booking_id__in=moving).delete()
+        through.objects.using(using).bulk_create(
+            [
+                through(booking_id=move.booking.id, table_id=table.id)
+                for move in moves
+                for table in move.new_tables[1:]
+            ]
+        )
+    return True
+
+
+def future_of(date):
+    """``(start, end)`` of what is still to come of ``date``."""
+    midnight = timezone.make_aware(datetime.datetime.combine(date, datetime.time()))
+    end = timezone.make_aware(
+        datetime.datetime.combine(date + datetime.timedelta(days=1), datetime.time())
+    )
+    return max(timezone.now(), midnight), end
+
+
+def restaurant_ids_booked_on(date, using=None):
+    """Restaurants with bookings still to come on ``date``."""
+    start, end = future_of(date)
+    return list(
+        Booking.objects.db_manager(using)
+        .filter(date__gte=start, date__lt=end)
+        .order_by("restaurant_id")
+        .values_list("restaurant_id", flat=True)
+        .distinct()
+    )
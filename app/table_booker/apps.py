@@ -1,5 +1,24 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.signals import request_started
+from django.db.backends.signals import connection_created
 
 
 class TableBookerConfig(AppConfig):
     name = 'table_booker'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .db import close_unusable_connections, install_slow_query_log
+        from .geo import postcode_index
+        from .queries import install_query_log
+        from .routers import install_write_tracking
+
+        request_started.connect(close_unusable_connections)
+        # first, so the slow query log wraps it and is not timed by it
+        connection_created.connect(install_query_log)
+        connection_created.connect(install_write_tracking)
+        if settings.SLOW_QUERY_MS:
+            connection_created.connect(install_slow_query_log)
+        # map the postcode index before gunicorn forks, so workers share it
+        postcode_index()
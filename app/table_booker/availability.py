@@ -0,0 +1,137 @@
+import bisect
+import datetime
+
+from django.conf import settings
+
+from .config import get_restaurant_config
+from .models import Booking
+
+
+def booking_duration():
+    return datetime.timedelta(minutes=settings.BOOKING_DURATION_MINUTES)
+
+
+class AvailabilityIndex:
+    """Interval index over the bookings of a single restaurant.
+
+    Every booking occupies ``[date, date + duration)``. Bookings are kept as a
+    sorted array of start timestamps per table, so asking whether a table is
+    free at ``T`` is two binary searches over ``(T - duration, T + duration)``.
+    Tables are kept sorted by capacity, so tables too small for a party are
+    skipped with a single bisect and free tables come back best-fit first.
+    """
+
+    def __init__(self, tables, bookings, duration=None):
+        self.duration = (duration or booking_duration()).total_seconds()
+        self.tables = sorted(tables, key=lambda table: (table.capacity, table.id))
+        self._capacities = [table.capacity for table in self.tables]
+        self._starts = {table.id: [] for table in self.tables}
+        self._booking_ids = {table.id: [] for table in self.tables}
+
+        for table_id, date, booking_id in sorted(bookings, key=lambda row: row[1]):
+            if table_id in self._starts:
+                self._starts[table_id].append(date.timestamp())
+                self._booking_ids[table_id].append(booking_id)
+
+    @classmethod
+    def for_restaurant(cls, restaurant_id, start, end=None, tables=None, using=None):
+        """Load the bookings of a restaurant that can overlap ``[start, end]``.
+
+        Pass ``using`` to read from a specific database rather than a replica.
+        """
+        duration = booking_duration()
+        end = end or start
+        if tables is None:
+            config = get_restaurant_config(restaurant_id)
+            tables = config.tables if config is not None else []
+        tables = list(tables)
+        bookings = booking_rows(
+            [table.id for table in tables], start - duration, end + duration, using
+        )
+        return cls(tables, bookings, duration)
+
+    def add(self, table_id, at, booking_id):
+        """Record a booking of ``table_id`` at ``at`` made after loading."""
+        timestamp = at.timestamp()
+        starts = self._starts[table_id]
+        position = bisect.bisect_right(starts, timestamp)
+        starts.insert(position, timestamp)
+        self._booking_ids[table_id].insert(position, booking_id)
+
+    def is_free(self, table_id, at, exclude=None):
+        starts = self._starts.get(table_id)
+        if not starts:
+            return True
+
+        timestamp = at.timestamp()
+        low = bisect.bisect_right(starts, timestamp - self.duration)
+        high = bisect.bisect_left(starts, timestamp + self.duration)
+        if exclude is None:
+            return low == high
+        return all(
+            booking_id == exclude
+            for booking_id in self._booking_ids[table_id][low:high]
+        )
+
+    def free_tables(self, at, guests, exclude=None):
+        """Tables seating at least ``guests`` that are free at ``at``."""
+        first = bisect.bisect_left(self._capacities, guests)
+        return [
+            table
+            for table in self.tables[first:]
+            if self.is_free(table.id, at, exclude)
+        ]
+
+    def next_free_slots(self, guests, after, until, step=None, count=5, schedule=None):
+        """The first ``count`` start times in ``[after, until]`` with a free table.
+
+        Candidate times are aligned to ``step`` (15 minutes by default) and
+        returned as ``(datetime, tables)`` pairs. With a ``schedule`` only its
+        open slots are candidates, so closed hours cost nothing.
+        """
+        if schedule is not None:
+            candidates = schedule.open_slots(after, until)
+        else:
+            candidates = aligned_times(after, until, step)
+
+        slots = []
+        for at in candidates:
+            tables = self.free_tables(at, guests)
+            if tables:
+                slots.append((at, tables))
+                if len(slots) == count:
+                    break
+        return slots
+
+
+def booking_rows(table_ids, after, before, using=None):
+    """``(table_id, date, booking_id)`` of bookings starting in ``(after, before)``.
+
+    A booking occupies its own table and every table joined to it, so the
+    joined tables come back as rows of their own, in the same query.
+    """
+    bookings = (
+        Booking.objects.db_manager(using)
+        .filter(table_id__in=table_ids, date__gt=after, date__lt=before)
+        .values_list("table_id", "date", "id")
+    )
+    joined = (
+        Booking.joined_tables.through.objects.db_manager(using)
+        .filter(
+            table_id__in=table_ids, booking__date__gt=after, booking__date__lt=before
+        )
+        .values_list("table_id", "booking__date", "booking_id")
+    )
+    return bookings.union(joined, all=True)
+
+
+def aligned_times(after, until, step=None):
+    """Times in ``[after, until]`` that are a multiple of ``step``."""
+    step = step or datetime.timedelta(minutes=settings.BOOKING_SLOT_MINUTES)
+    seconds = step.total_seconds()
+    remainder = after.timestamp() % seconds
+    at = after + datetime.timedelta(seconds=seconds - remainder if remainder else 0)
+    at = at.replace(microsecond=0)
+    while at <= until:
+        yield at
+        at += step
@@ -0,0 +1,85 @@
+"""PostgreSQL backend that borrows connections from a process-wide pool.
+
+Django opens one connection per thread, so threaded or async workers can
+open far more server connections than they ever use at once. With this
+backend closing a connection hands it back to a pool shared by every thread
+of the process instead of disconnecting, and at most ``POOL["MAX_SIZE"]``
+connections exist per database. Enabled with ``SQL_POOL=1``, see settings.
+"""
+import threading
+
+import psycopg2.extras
+import psycopg2.pool
+from django.db.backends.postgresql import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    _pools = {}
+    _pools_lock = threading.Lock()
+
+    def pool_options(self):
+        options = self.settings_dict.get("POOL", {})
+        return (
+            options.get("MIN_SIZE", 1),
+            options.get("MAX_SIZE", 10),
+            options.get("TIMEOUT", 10),
+        )
+
+    def get_pool(self, conn_params):
+        """The pool and free-slot semaphore for ``conn_params``.
+
+        Pools are keyed by connection parameters rather than alias, because the
+        test runner reconnects the same alias to other databases.
+        """
+        key = tuple(sorted(conn_params.items()))
+        with self._pools_lock:
+            if key not in self._pools:
+                min_size, max_size, _ = self.pool_options()
+                self._pools[key] = (
+                    psycopg2.pool.ThreadedConnectionPool(
+                        min_size, max_size, **conn_params
+                    ),
+                    threading.BoundedSemaphore(max_size),
+                )
+            return self._pools[key]
+
+    def get_new_connection(self, conn_params):
+        pool, slots = self.get_pool(conn_params)
+        _, _, timeout = self.pool_options()
+        if not slots.acquire(timeout=timeout):
+            raise base.Database.OperationalError(
+                f"No pooled connection became free within {timeout} seconds"
+            )
+        try:
+            connection = pool.getconn()
+        except Exception:
+            slots.release()
+            raise
+
+        self._pool = (pool, slots)
+        # the same setup as base.DatabaseWrapper.get_new_connection
+        options = self.settings_dict["OPTIONS"]
+        try:
+            self.isolation_level = options["isolation_level"]
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        psycopg2.extras.register_default_jsonb(
+            conn_or_curs=connection, loads=lambda x: x
+        )
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+
+        pool, slots = self._pool
+        try:
+            with self.wrap_database_errors:
+                # the pool rolls back unfinished transactions and discards
+                # connections that were closed or broken
+                pool.putconn(self.connection, close=bool(self.connection.closed))
+        finally:
+            slots.release()
@@ -0,0 +1,232 @@
+import collections
+import csv
+import io
+import itertools
+import json
+
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, router, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Booking, Setting, Table
+
+IMPORT_FIELDS = ["user_id", "restaurant_id", "table_id", "date", "total_guests"]
+EXPORT_FIELDS = ["id"] + IMPORT_FIELDS + ["created_at", "modified_at"]
+
+Reject = collections.namedtuple("Reject", ["line", "row", "reason"])
+ImportResult = collections.namedtuple("ImportResult", ["imported", "rejected"])
+
+
+def read_rows(stream, format="csv"):
+    """Yield ``(line, row)`` pairs from a CSV file with a header or NDJSON."""
+    if format == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for line, text in enumerate(stream, start=1):
+        if text.strip():
+            try:
+                yield line, json.loads(text)
+            except ValueError:
+                yield line, text.rstrip("\n")
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def parse_row(row):
+    """Typed booking values of an input row, or ``ValueError`` with the reason."""
+    if not isinstance(row, dict):
+        raise ValueError("Not a JSON object")
+
+    # restaurant_id defaults to the table's restaurant, total_guests is nullable
+    missing = [
+        field
+        for field in ("user_id", "table_id", "date")
+        if row.get(field) in (None, "")
+    ]
+    if missing:
+        raise ValueError(f"Missing {', '.join(missing)}")
+
+    try:
+        values = {
+            "user_id": int(row["user_id"]),
+            "table_id": int(row["table_id"]),
+            "restaurant_id": (
+                int(row["restaurant_id"]) if row.get("restaurant_id") else None
+            ),
+            "total_guests": (
+                int(row["total_guests"])
+                if row.get("total_guests") not in (None, "")
+                else None
+            ),
+        }
+    except (TypeError, ValueError):
+        raise ValueError("Ids and total_guests must be integers")
+
+    date = parse_datetime(str(row["date"]))
+    if date is None:
+        raise ValueError(f"Invalid date {row['date']}")
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    values["date"] = date
+    return values
+
+
+def validate_batch(batch, using=None):
+    """Split ``(line, row)`` pairs into booking values and rejects.
+
+    Every table, setting and user the batch refers to is fetched with one
+    query per model, instead of the per-row lookups BookingForm does. Rows are
+    checked against the same capacity and minimum guest rules as the form.
+    """
+    parsed, rejects = [], []
+    for line, row in batch:
+        try:
+            parsed.append((line, row, parse_row(row)))
+        except ValueError as error:
+            rejects.append(Reject(line, row, str(error)))
+
+    tables = {
+        table_id: (restaurant_id, capacity)
+        for table_id, restaurant_id, capacity in Table.objects.using(using)
+        .filter(id__in={values["table_id"] for _, _, values in parsed})
+        .values_list("id", "restaurant_id", "capacity")
+    }
+    min_guests = dict(
+        Setting.objects.using(using)
+        .filter(restaurant_id__in={restaurant for restaurant, _ in tables.values()})
+        .values_list("restaurant_id", "min_guest")
+    )
+    users = set(
+        User.objects.using(using)
+        .filter(id__in={values["user_id"] for _, _, values in parsed})
+        .values_list("id", flat=True)
+    )
+
+    valid = []
+    for line, row, values in parsed:
+        reason = None
+        total_guests = values["total_guests"]
+        if values["table_id"] not in tables:
+            reason = f"Unknown table {values['table_id']}"
+        else:
+            restaurant_id, capacity = tables[values["table_id"]]
+            min_guest = min_guests.get(restaurant_id)
+            if values["restaurant_id"] is None:
+                values["restaurant_id"] = restaurant_id
+
+            if values["restaurant_id"] != restaurant_id:
+                reason = f"Table {values['table_id']} is not in this restaurant"
+            elif values["user_id"] not in users:
+                reason = f"Unknown user {values['user_id']}"
+            elif total_guests is not None and total_guests > capacity:
+                reason = f"Maximum table capacity is {capacity}"
+            elif total_guests is not None and total_guests < 1:
+                reason = "Cannot book 0 or less guests"
+            elif (
+                total_guests is not None
+                and min_guest is not None
+                and total_guests < min_guest
+            ):
+                reason = f"Minimum guest bookable is: {min_guest}"
+
+        if reason is None:
+            valid.append(values)
+        else:
+            rejects.append(Reject(line, row, reason))
+
+    return valid, rejects
+
+
+def copy_bookings(values, using):
+    """Insert booking values with a single Postgres ``COPY``."""
+    now = timezone.now()
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in values:
+        writer.writerow([row[field] for field in IMPORT_FIELDS] + [now, now])
+    buffer.seek(0)
+
+    meta = Booking._meta
+    columns = ", ".join(
+        meta.get_field(field).column
+        for field in ["user", "restaurant", "table", "date", "total_guests"]
+    )
+    with connections[using].cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {meta.db_table} ({columns}, created_at, modified_at) "
+            "FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+
+
+def write_bookings(values, using, batch_size=None):
+    if not values:
+        return
+    if connections[using].vendor == "postgresql":
+        copy_bookings(values, using)
+    else:
+        Booking.objects.using(using).bulk_create(
+            [Booking(**row) for row in values], batch_size=batch_size
+        )
+
+
+def import_bookings(stream, format="csv", batch_size=5000, on_reject=None):
+    """Stream bookings from ``stream`` into the database.
+
+    Rows are read, validated and written one batch at a time, each batch in
+    its own transaction, so memory stays flat however large the input is.
+    Rejected rows are passed to ``on_reject`` as they are found. Bookings are
+    not checked for overlaps, imports are expected to be consistent already.
+    """
+    using = router.db_for_write(Booking)
+    imported = rejected = 0
+    for batch in batched(read_rows(stream, format), batch_size):
+        valid, rejects = validate_batch(batch, using)
+        with transaction.atomic(using=using):
+            write_bookings(valid, using, batch_size)
+        imported += len(valid)
+        rejected += len(rejects)
+        if on_reject is not None:
+            for reject in sorted(rejects, key=lambda reject: reject.line):
+                on_reject(reject)
+    return ImportResult(imported, rejected)
+
+
+class Echo:
+    """File-like object that hands back what is written to it."""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(queryset, chunk_size=2000):
+    """Booking rows of ``queryset``, fetched in chunks rather than all at once."""
+    return queryset.order_by("id").values_list(*EXPORT_FIELDS).iterator(chunk_size)
+
+
+def export_csv(queryset):
+    """Yield the CSV lines of ``queryset``, starting with a header."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in export_rows(queryset):
+        yield writer.writerow(row)
+
+
+def export_ndjson(queryset):
+    for row in export_rows(queryset):
+        yield json.dumps(dict(zip(EXPORT_FIELDS, row)), cls=DjangoJSONEncoder) + "\n"
+
+
+EXPORTERS = {"csv": export_csv, "ndjson": export_ndjson}
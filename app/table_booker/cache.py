@@ -0,0 +1,187 @@
+import collections
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+_missing = object()
+
+
+class LRUCache:
+    """Thread-safe in-process cache that evicts the least recently used key.
+
+    Entries older than ``ttl`` seconds are treated as missing, which bounds how
+    stale a value can get in workers that never see its invalidation.
+    """
+
+    def __init__(self, maxsize=128, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _missing)
+            if entry is _missing:
+                return default
+
+            value, expires = entry
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                return default
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_set(self, key, default):
+        """Return the cached value, storing ``default()`` on a miss."""
+        value = self.get(key, _missing)
+        if value is _missing:
+            value = default()
+            self.set(key, value)
+        return value
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class TieredCache:
+    """Small per-process LRU in front of the cache shared by all workers.
+
+    Keys live in namespaces whose version is stored in the shared tier.
+    ``invalidate`` replaces the version, which orphans every key of the
+    namespace in every worker at once; workers re-read versions at most every
+    ``local_ttl`` seconds, which bounds how long they serve stale entries.
+
+    Recomputing a missing value is single-flight. Within a process callers
+    wait on a per-key lock; across processes the first worker takes a lock key
+    in the shared tier and the others poll for its result.
+    """
+
+    LOCK_STRIPES = 64
+
+    def __init__(self, alias="default", local_size=1024, local_ttl=5, lock_timeout=10):
+        self.alias = alias
+        self.local = LRUCache(maxsize=local_size, ttl=local_ttl)
+        self.lock_timeout = lock_timeout
+        self.stats = collections.Counter()
+        self._locks = [threading.Lock() for _ in range(self.LOCK_STRIPES)]
+        if not self.shared_by_workers():
+            logger.warning(
+                "The %r cache is per process while %d workers are expected, so "
+                "invalidations will not reach the other workers",
+                alias,
+                settings.WEB_CONCURRENCY,
+            )
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def shared_by_workers(self):
+        """Whether an invalidation reaches every worker.
+
+        Versions live in the shared tier, so with a per process cache and
+        several workers the others keep the old version until it expires,
+        which for versions is never.
+        """
+        backend = settings.CACHES[self.alias]["BACKEND"]
+        return backend not in settings.PROCESS_CACHES or settings.WEB_CONCURRENCY == 1
+
+    def version(self, namespace):
+        version_key = f"version:{namespace}"
+        version = self.local.get(version_key)
+        if version is None:
+            self.shared.add(version_key, time.time_ns(), timeout=None)
+            version = self.shared.get(version_key, 0)
+            self.local.set(version_key, version)
+        return version
+
+    def make_key(self, namespace, key):
+        return f"{namespace}:{self.version(namespace)}:{key}"
+
+    def invalidate(self, namespace):
+        version_key = f"version:{namespace}"
+        self.shared.set(version_key, time.time_ns(), timeout=None)
+        self.local.delete(version_key)
+
+    def get_or_set(self, namespace, key, compute, timeout=DEFAULT_TIMEOUT):
+        """Cached value of ``key``, calling ``compute()`` once on a miss."""
+        full_key = self.make_key(namespace, key)
+        value = self.local.get(full_key, _missing)
+        if value is not _missing:
+            self.stats["local_hits"] += 1
+            return value
+
+        with self._locks[hash(full_key) % self.LOCK_STRIPES]:
+            value = self.local.get(full_key, _missing)
+            if value is not _missing:
+                self.stats["local_hits"] += 1
+                return value
+
+            value = self.shared.get(full_key, _missing)
+            if value is not _missing:
+                self.stats["shared_hits"] += 1
+            else:
+                self.stats["misses"] += 1
+                value = self._compute(full_key, compute, timeout)
+
+            self.local.set(full_key, value)
+            return value
+
+    def _compute(self, full_key, compute, timeout):
+        lock_key = f"lock:{full_key}"
+        locked = self.shared.add(lock_key, 1, timeout=self.lock_timeout)
+        if not locked:
+            # another worker is computing the value, wait for its result
+            deadline = time.monotonic() + self.lock_timeout
+            while time.monotonic() < deadline:
+                time.sleep(0.01)
+                value = self.shared.get(full_key, _missing)
+                if value is not _missing:
+                    self.stats["waits"] += 1
+                    return value
+                if self.shared.get(lock_key) is None:
+                    break
+            else:
+                self.stats["lock_timeouts"] += 1
+
+        try:
+            value = compute()
+            self.shared.set(full_key, value, timeout=timeout)
+        finally:
+            if locked:
+                self.shared.delete(lock_key)
+        return value
+
+    def hit_ratio(self):
+        hits = self.stats["local_hits"] + self.stats["shared_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+
+tiered_cache = TieredCache(
+    local_size=settings.LOCAL_CACHE_SIZE, local_ttl=settings.LOCAL_CACHE_TTL
+)
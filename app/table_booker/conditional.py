@@ -0,0 +1,109 @@
+"""ETag and Last-Modified validators for per-user pages.
+
+The validators come from a single aggregate query, the newest ``modified_at``
+and a row count of what the page shows, so a page that did not change is
+answered with 304 Not Modified before its queryset or template is touched.
+The count catches deletions, which leave no ``modified_at`` behind; browsers
+send If-None-Match along with If-Modified-Since and the ETag wins.
+
+The home page lists every restaurant, which such a query would scan, so its
+validators come from a version kept in ``tiered_cache`` instead, replaced
+once a restaurant save or delete commits. Workers see the new version within
+``LOCAL_CACHE_TTL`` seconds, if they share the cache; otherwise the home page
+falls back to the aggregate query, see ``TieredCache.shared_by_workers``.
+"""
+import datetime
+import hashlib
+
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+
+from .cache import tiered_cache
+from .models import Booking, Restaurant
+
+RESTAURANTS_NAMESPACE = "restaurants"
+
+
+def restaurants_state(request):
+    if not tiered_cache.shared_by_workers():
+        state = Restaurant.objects.aggregate(
+            modified_at=Max("modified_at"), total=Count("id")
+        )
+        return state["modified_at"], [state["total"]]
+    # the version is the time of the last change, in nanoseconds
+    version = tiered_cache.version(RESTAURANTS_NAMESPACE)
+    modified_at = datetime.datetime.fromtimestamp(version / 1e9, datetime.timezone.utc)
+    return modified_at, [version]
+
+
+def invalidate_restaurants_state():
+    tiered_cache.invalidate(RESTAURANTS_NAMESPACE)
+
+
+def bookings_state(request):
+    # bookings move from upcoming to past without being modified, so the
+    # number still upcoming is part of the state
+    state = Booking.objects.filter(user=request.user).aggregate(
+        modified_at=Max("modified_at"),
+        restaurant_modified_at=Max("restaurant__modified_at"),
+        table_modified_at=Max("table__modified_at"),
+        total=Count("id"),
+        upcoming=Count("id", filter=Q(date__gte=timezone.now())),
+    )
+    modified_at = max(
+        (
+            state[key]
+            for key in ["modified_at", "restaurant_modified_at", "table_modified_at"]
+            if state[key] is not None
+        ),
+        default=None,
+    )
+    return modified_at, [state["total"], state["upcoming"]]
+
+
+def conditional_page(page_state):
+    """Serve a logged in user's page conditionally and cache it privately.
+
+    ``page_state(request)`` returns ``(last_modified, values)`` describing
+    everything the page renders besides the URL and the user. Anonymous
+    requests and requests with flash messages waiting to be shown are always
+    rendered in full.
+    """
+
+    def validators(request):
+        if not hasattr(request, "_page_validators"):
+            request._page_validators = None
+            if (
+                request.method in ("GET", "HEAD")
+                and request.user.is_authenticated
+                and CookieStorage.cookie_name not in request.COOKIES
+            ):
+                last_modified, values = page_state(request)
+                key = [
+                    settings.PAGE_CACHE_VERSION,
+                    request.user.pk,
+                    request.get_full_path(),
+                    last_modified and last_modified.isoformat(),
+                    *values,
+                ]
+                etag = hashlib.md5(repr(key).encode()).hexdigest()
+                request._page_validators = (etag, last_modified)
+        return request._page_validators
+
+    def etag(request, *args, **kwargs):
+        page_validators = validators(request)
+        return page_validators and page_validators[0]
+
+    def last_modified(request, *args, **kwargs):
+        page_validators = validators(request)
+        return page_validators and page_validators[1]
+
+    def decorator(view):
+        view = condition(etag_func=etag, last_modified_func=last_modified)(view)
+        return cache_control(private=True, no_cache=True)(view)
+
+    return decorator
@@ -0,0 +1,152 @@
+import collections
+import datetime
+import itertools
+
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from .cache import tiered_cache
+from .models import BusinessHour, Holiday, Restaurant, Table
+from .schedule import WeeklySchedule
+
+# part of the cache key, change it when RestaurantConfig changes shape so
+# workers never unpickle a config cached by an older release
+CONFIG_FORMAT = 3
+
+TableConfig = collections.namedtuple(
+    "TableConfig", ["id", "name", "capacity", "adjacent"]
+)
+HourConfig = collections.namedtuple(
+    "HourConfig", ["day", "start_time", "finish_time", "closed"]
+)
+HolidayConfig = collections.namedtuple(
+    "HolidayConfig", ["date", "start_time", "finish_time", "closed"]
+)
+
+
+class RestaurantConfig(
+    collections.namedtuple(
+        "RestaurantConfig",
+        [
+            "id",
+            "name",
+            "address1",
+            "address2",
+            "postcode",
+            "modified_at",
+            "min_guest",
+            "tables",
+            "hours",
+            "schedule",
+        ],
+    )
+):
+    """Immutable snapshot of everything needed to take a booking."""
+
+    __slots__ = ()
+
+    def as_restaurant(self):
+        return Restaurant(
+            id=self.id,
+            name=self.name,
+            address1=self.address1,
+            address2=self.address2,
+            postcode=self.postcode,
+            modified_at=self.modified_at,
+        )
+
+    def as_table(self, table):
+        return Table(
+            id=table.id,
+            restaurant_id=self.id,
+            name=table.name,
+            capacity=table.capacity,
+        )
+
+    def get_table(self, table_id):
+        for table in self.tables:
+            if table.id == table_id:
+                return table
+        return None
+
+
+def load_restaurant_config(restaurant_id):
+    # Read from the primary: a lagging replica could put a config that was
+    # just invalidated straight back into the cache.
+    restaurant = (
+        Restaurant.objects.using(DEFAULT_DB_ALIAS)
+        .select_related("setting")
+        .filter(pk=restaurant_id)
+        .first()
+    )
+    if restaurant is None:
+        return None
+
+    # one row per adjacent table, or one with None for a table on its own
+    rows = (
+        Table.objects.using(DEFAULT_DB_ALIAS)
+        .filter(restaurant_id=restaurant_id)
+        .order_by("id")
+        .values_list("id", "name", "capacity", "adjacent")
+    )
+    tables = [
+        (table, [row[3] for row in group])
+        for table, group in itertools.groupby(rows, key=lambda row: row[:3])
+    ]
+    hours = (
+        BusinessHour.objects.using(DEFAULT_DB_ALIAS)
+        .filter(restaurant_id=restaurant_id)
+        .order_by("day", "start_time")
+    )
+    # holidays already over cannot affect a booking, except the spill over
+    # midnight of yesterday's
+    holidays = (
+        Holiday.objects.using(DEFAULT_DB_ALIAS)
+        .filter(
+            restaurant_id=restaurant_id,
+            date__gte=timezone.localdate() - datetime.timedelta(days=1),
+        )
+        .order_by("date")
+    )
+    hours = tuple(
+        HourConfig(*row)
+        for row in hours.values_list("day", "start_time", "finish_time", "closed")
+    )
+    holidays = tuple(
+        HolidayConfig(*row)
+        for row in holidays.values_list("date", "start_time", "finish_time", "closed")
+    )
+    return RestaurantConfig(
+        id=restaurant.id,
+        name=restaurant.name,
+        address1=restaurant.address1,
+        address2=restaurant.address2,
+        postcode=restaurant.postcode,
+        modified_at=restaurant.modified_at,
+        min_guest=(
+            restaurant.setting.min_guest if hasattr(restaurant, "setting") else None
+        ),
+        tables=tuple(
+            TableConfig(*table, tuple(sorted(filter(None, adjacent))))
+            for table, adjacent in tables
+        ),
+        hours=hours,
+        schedule=WeeklySchedule(hours, holidays),
+    )
+
+
+def config_namespace(restaurant_id):
+    return f"restaurant-config:{restaurant_id}"
+
+
+def get_restaurant_config(restaurant_id):
+    """Cached config of a restaurant, or ``None`` if it does not exist."""
+    return tiered_cache.get_or_set(
+        config_namespace(restaurant_id),
+        f"config:{CONFIG_FORMAT}",
+        lambda: load_restaurant_config(restaurant_id),
+    )
+
+
+def invalidate_restaurant_config(restaurant_id):
+    tiered_cache.invalidate(config_namespace(restaurant_id))
@@ -0,0 +1,149 @@
+import contextlib
+import contextvars
+import logging
+import os
+import random
+import re
+import time
+import traceback
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from .queries import current_view, fingerprint
+
+logger = logging.getLogger(__name__)
+
+# set while a slow query is being recorded, whose own queries are not logged
+_recording = contextvars.ContextVar("recording_slow_query", default=False)
+_data_statement = re.compile(r"\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b", re.I)
+SLOW_QUERY_TABLE = "table_booker_slowquery"
+
+
+def close_unusable_connections(**kwargs):
+    """Drop persistent connections that broke while idle between requests.
+
+    Django 3.2 only re-checks a reused connection after it raised an error,
+    so a connection killed by a database restart or an idle timeout fails the
+    next request that uses it. Connected to ``request_started`` for databases
+    with ``CONN_HEALTH_CHECKS``, the setting Django 4.1 adopts natively.
+    """
+    for connection in connections.all():
+        if (
+            connection.connection is not None
+            and connection.settings_dict.get("CONN_HEALTH_CHECKS")
+            and not connection.in_atomic_block
+            and not connection.is_usable()
+        ):
+            connection.close()
+
+
+def log_slow_queries(execute, sql, params, many, context):
+    """Execute wrapper recording statements slower than SLOW_QUERY_MS.
+
+    Only data statements are recorded: writing the log while Django is still
+    running a BEGIN or SAVEPOINT would start a transaction inside another.
+    The row is written on the same connection, or the primary's for a
+    replica, so a slow query whose transaction rolls back is not kept either.
+    It is written in a savepoint, so failing to record it never breaks the
+    transaction it ran in, and without the connection's other wrappers, so
+    request query logs and budgets do not count it.
+    """
+    if _recording.get() or not _data_statement.match(sql) or SLOW_QUERY_TABLE in sql:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    result = execute(sql, params, many, context)
+    duration = time.perf_counter() - started
+    if duration * 1000 >= settings.SLOW_QUERY_MS:
+        connection = context["connection"]
+        # replicas are read only, so their slow queries are kept on the primary
+        using = connection.alias
+        if using in settings.REPLICA_DATABASES:
+            using = DEFAULT_DB_ALIAS
+        token = _recording.set(True)
+        try:
+            with unwrapped(connection), unwrapped(connections[using]):
+                with transaction.atomic(using=using):
+                    record_slow_query(connection, sql, params, many, duration, using)
+        except Exception:
+            logger.exception("Could not record a slow query")
+        finally:
+            _recording.reset(token)
+    return result
+
+
+@contextlib.contextmanager
+def unwrapped(connection):
+    """Run queries on ``connection`` without its execute wrappers."""
+    wrappers = connection.execute_wrappers
+    connection.execute_wrappers = []
+    try:
+        yield
+    finally:
+        connection.execute_wrappers = wrappers
+
+
+def install_slow_query_log(sender, connection, **kwargs):
+    """Wrap every new connection with log_slow_queries.
+
+    Connected to ``connection_created`` when SLOW_QUERY_MS is set. The wrapper
+    goes first in the list, under any ``execute_wrapper()`` already active,
+    which removes its own wrapper from the end of the list when it exits.
+    """
+    if log_slow_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, log_slow_queries)
+
+
+def call_site():
+    """``file:line in function`` of the innermost project frame on the stack."""
+    base_dir = str(settings.BASE_DIR) + os.sep
+    for frame in reversed(traceback.extract_stack()):
+        if (
+            frame.filename.startswith(base_dir)
+            and "site-packages" not in frame.filename
+            and frame.filename != __file__
+        ):
+            filename = frame.filename[len(base_dir) :]
+            return f"{filename}:{frame.lineno} in {frame.name}"
+    return ""
+
+
+def explain(connection, sql, params):
+    """The plan of a SELECT, executed for real on Postgres to get timings."""
+    if connection.vendor == "postgresql":
+        prefix = "EXPLAIN (ANALYZE, BUFFERS) "
+    elif connection.vendor == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN "
+    else:
+        return ""
+    with connection.cursor() as cursor:
+        cursor.execute(prefix + sql, params)
+        return "\n".join(" ".join(str(value) for value in row) for row in cursor)
+
+
+def record_slow_query(connection, sql, params, many, duration, using):
+    from .models import SlowQuery
+
+    plan = ""
+    # EXPLAIN ANALYZE runs the statement again, so only for a sample of reads
+    if (
+        not many
+        and sql.lstrip()[:6].upper() == "SELECT"
+        and random.random() < settings.SLOW_QUERY_EXPLAIN_RATE
+    ):
+        plan = explain(connection, sql, params)
+
+    slow_queries = SlowQuery.objects.using(using)
+    slow_query = slow_queries.create(
+        database=connection.alias,
+        fingerprint=fingerprint(sql),
+        sql=sql,
+        params=repr(params)[:2000],
+        duration_ms=duration * 1000,
+        view=current_view.get(),
+        call_site=call_site(),
+        plan=plan,
+    )
+    # keep the table a fixed size ring buffer
+    slow_queries.filter(id__lte=slow_query.id - settings.SLOW_QUERY_KEEP).delete()
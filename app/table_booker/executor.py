@@ -0,0 +1,52 @@
+"""A bounded thread pool for the blocking work of async views.
+
+Django 3.2 has no async ORM, so an async view still has to query the
+database from a thread. Left to ``sync_to_async``, that thread is the single
+one Django shares for thread sensitive code, and requests queue behind each
+other. Here blocking work runs on one of ``ASYNC_VIEW_THREADS`` threads
+instead, which also caps the database connections a process opens, while the
+event loop keeps accepting and serving slow clients.
+"""
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.ASYNC_VIEW_THREADS, thread_name_prefix="table_booker"
+)
+
+
+def _run(func, args, kwargs):
+    # what request_started and request_finished do for a sync request, for
+    # the connections of this thread
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Await ``func(*args, **kwargs)`` run on the pool, in this context."""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(executor, context.run, _run, func, args, kwargs)
+
+
+def async_view(view):
+    """Async version of the sync ``view``, which runs whole on the pool.
+
+    Loading the session and user, querying and rendering all block, so the
+    view runs as one job. Its queries go to ``request.query_log`` as usual,
+    the context it runs in being a copy of the request's.
+    """
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        return await run_blocking(view, request, *args, **kwargs)
+
+    return wrapper
@@ -2,6 +2,7 @@ import datetime
 
 import factory
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 from . import models
 
@@ -10,8 +11,8 @@ class UserFactory(factory.django.DjangoModelFactory):
     class Meta:
         model = User
 
-    username = "jacob"
-    email = "jacob@email.com"
+    username = factory.Sequence(lambda n: f"jacob{n}")
+    email = factory.LazyAttribute(lambda user: f"{user.username}@email.com")
     password = factory.PostGenerationMethodCall("set_password", "top-secret")
 
 
@@ -40,8 +41,14 @@ class BookingFactory(factory.django.DjangoModelFactory):
 
     user = factory.SubFactory(UserFactory)
     restaurant = factory.SubFactory(RestaurantFactory)
-    table = factory.SubFactory(TableFactory)
-    date = datetime.date.today() + datetime.timedelta(days=1)  # tomorrow
+    table = factory.SubFactory(
+        TableFactory, restaurant=factory.SelfAttribute("..restaurant")
+    )
+    date = timezone.make_aware(  # tomorrow
+        datetime.datetime.combine(
+            datetime.date.today() + datetime.timedelta(days=1), datetime.time()
+        )
+    )
     total_guests = 3
 
 
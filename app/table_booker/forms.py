@@ -1,10 +1,18 @@
+import datetime
+
 from django import forms
+from django.conf import settings
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 
+from . import metrics
+from .allocation import allocate
+from .availability import AvailabilityIndex
+from .config import get_restaurant_config
 from .models import Booking, Table
+from .postcodes import postcode_district
 
 
 class UserForm(UserCreationForm):
@@ -31,7 +39,51 @@ class UserForm(UserCreationForm):
         return user
 
 
+class TableChoiceField(forms.ModelChoiceField):
+    """Table choices served from a RestaurantConfig instead of the database.
+
+    ``queryset`` is still set so the field behaves like a ModelChoiceField,
+    but it is never evaluated: choices and cleaned values are built from the
+    cached config.
+    """
+
+    config = None
+
+    def _get_choices(self):
+        choices = [("", self.empty_label)] if self.empty_label is not None else []
+        if self.config is not None:
+            choices += [
+                (table.id, self.label_from_instance(self.config.as_table(table)))
+                for table in self.config.tables
+            ]
+        return choices
+
+    choices = property(_get_choices, forms.ChoiceField._set_choices)
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        if isinstance(value, Table):
+            value = value.pk
+        try:
+            table = self.config.get_table(int(value))
+        except (TypeError, ValueError):
+            table = None
+        if table is None:
+            raise ValidationError(
+                self.error_messages["invalid_choice"],
+                code="invalid_choice",
+                params={"value": value},
+            )
+        return self.config.as_table(table)
+
+
 class BookingForm(forms.ModelForm):
+    table = TableChoiceField(
+        queryset=Table.objects.none(),
+        required=False,
+        empty_label="Best available table",
+    )
     date = forms.DateTimeField(
         input_formats=["%Y-%m-%dT%H:%M"],
         widget=forms.DateTimeInput(
@@ -42,38 +94,122 @@ class BookingForm(forms.ModelForm):
 
     def __init__(self, restaurant, *args, **kwargs):
         super(BookingForm, self).__init__(*args, **kwargs)
+        self.config = get_restaurant_config(restaurant.id)
+        self.fields["table"].config = self.config
         self.fields["table"].queryset = Table.objects.filter(
             restaurant_id=restaurant.id
         )
         self.restaurant = restaurant
+        # tables pushed together with the allocated table for a large party
+        self.joined_tables = ()
 
     class Meta:
         model = Booking
         fields = ("table", "date", "total_guests")
 
+    def rejection(self, reason, field, message):
+        """ValidationError for ``field``, counted in the rejection metrics."""
+        metrics.booking_rejections.inc(reason)
+        return ValidationError({field: [message]})
+
     def clean(self):
         cleaned_data = super().clean()
         date = cleaned_data.get("date")
         total_guests = cleaned_data.get("total_guests")
         table = cleaned_data.get("table")
-        min_guest = self.restaurant.setting.min_guest
+        min_guest = self.config.min_guest
 
         if total_guests is not None:
-            if total_guests > table.capacity:
-                raise ValidationError(
-                    {"total_guests": [f"Maximum table capacity is {table.capacity}"]}
+            if table is not None and total_guests > table.capacity:
+                raise self.rejection(
+                    "over_capacity",
+                    "total_guests",
+                    f"Maximum table capacity is {table.capacity}",
                 )
 
             if total_guests < 1:
-                raise ValidationError(
-                    {"total_guests": ["Cannot book 0 or less guests"]}
+                raise self.rejection(
+                    "no_guests", "total_guests", "Cannot book 0 or less guests"
                 )
 
-            if total_guests < min_guest:
-                raise ValidationError(
-                    {"total_guests": [f"Minimum guest bookable is: {min_guest}"]}
+            if min_guest is not None and total_guests < min_guest:
+                raise self.rejection(
+                    "under_min_guest",
+                    "total_guests",
+                    f"Minimum guest bookable is: {min_guest}",
                 )
 
         if date:
             if date < timezone.now():
-                raise ValidationError({"date": ["Date cannot be in the past"]})
+                raise self.rejection("past_date", "date", "Date cannot be in the past")
+
+            if not self.config.schedule.is_open(date):
+                raise self.rejection(
+                    "closed", "date", "The restaurant is closed at this time"
+                )
+
+            if table is not None:
+                index = AvailabilityIndex.for_restaurant(
+                    self.restaurant.id, date, tables=[table]
+                )
+                if not index.is_free(table.id, date, exclude=self.instance.pk):
+                    raise self.rejection(
+                        "already_booked",
+                        "date",
+                        f"{table.name} is already booked at this time",
+                    )
+
+            elif total_guests is not None:
+                self.allocate_tables(date, total_guests)
+
+    def allocate_tables(self, date, total_guests):
+        """Seat the party at the best free table, or adjacent tables joined."""
+        index = AvailabilityIndex.for_restaurant(
+            self.restaurant.id, date, tables=self.config.tables
+        )
+        tables = allocate(index, date, total_guests, exclude=self.instance.pk)
+        if tables is None:
+            raise self.rejection(
+                "no_table",
+                "date",
+                f"No table for {total_guests} guests is free at this time",
+            )
+        self.cleaned_data["table"] = self.config.as_table(tables[0])
+        self.joined_tables = tuple(self.config.as_table(table) for table in tables[1:])
+
+
+class AvailabilityForm(forms.Form):
+    date = forms.DateTimeField(
+        input_formats=["%Y-%m-%dT%H:%M"],
+        widget=forms.DateTimeInput(
+            attrs={"type": "datetime-local", "class": "form-cotrol"},
+            format="%Y-%m-%dT%H:%M",
+        ),
+    )
+    total_guests = forms.IntegerField(min_value=1)
+
+
+class SearchForm(forms.Form):
+    date = forms.DateTimeField(
+        input_formats=["%Y-%m-%dT%H:%M"],
+        widget=forms.DateTimeInput(
+            attrs={"type": "datetime-local", "class": "form-cotrol"},
+            format="%Y-%m-%dT%H:%M",
+        ),
+    )
+    total_guests = forms.IntegerField(min_value=1)
+    postcode = forms.CharField(max_length=12, required=False)
+
+    def clean_date(self):
+        date = self.cleaned_data["date"]
+        if date < timezone.now():
+            raise ValidationError("Date cannot be in the past")
+        if date > timezone.now() + datetime.timedelta(days=settings.SEARCH_DAYS):
+            raise ValidationError(f"Search at most {settings.SEARCH_DAYS} days ahead")
+        return date
+
+    def clean_postcode(self):
+        postcode = self.cleaned_data["postcode"]
+        if postcode and not postcode_district(postcode):
+            raise ValidationError("Enter a postcode or district, such as E17")
+        return postcode
@@ -0,0 +1,66 @@
+"""Cached HTML fragments for the rows of long lists.
+
+Each row is cached under the object's id and the ``modified_at`` of every
+row it displays, so an edit gives the row a new key instead of having to
+invalidate the old one, which simply expires. A page fetches all its rows
+with one ``get_many`` and stores the ones it had to render with one
+``set_many``.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.template.loader import get_template
+from django.utils import timezone, translation
+from django.utils.safestring import mark_safe
+
+
+def booking_versions(booking):
+    return [
+        booking.modified_at,
+        booking.restaurant.modified_at,
+        booking.table.modified_at,
+    ]
+
+
+def restaurant_versions(restaurant):
+    return [restaurant.modified_at]
+
+
+def fragment_key(prefix, obj, versions):
+    stamp = ":".join(version.isoformat() for version in versions)
+    return f"{prefix}:{obj.pk}:{hashlib.md5(stamp.encode()).hexdigest()}"
+
+
+def render_rows(template_name, objects, name, versions):
+    """``(object, html)`` for each of ``objects`` rendered with ``template_name``.
+
+    The template sees the object as ``name`` and nothing else, so rows must
+    not depend on the user or the request.
+    """
+    cache = caches[settings.FRAGMENT_CACHE]
+    # what rows render to also depends on the deploy, language and time zone
+    prefix = ":".join(
+        [
+            "fragment",
+            template_name,
+            settings.PAGE_CACHE_VERSION,
+            translation.get_language() or "",
+            timezone.get_current_timezone_name(),
+        ]
+    )
+    keys = [fragment_key(prefix, obj, versions(obj)) for obj in objects]
+    cached = cache.get_many(keys)
+
+    missing, rows = {}, []
+    template = None
+    for obj, key in zip(objects, keys):
+        html = cached.get(key)
+        if html is None:
+            template = template or get_template(template_name)
+            html = missing[key] = template.render({name: obj})
+        rows.append((obj, mark_safe(html)))
+
+    if missing:
+        cache.set_many(missing, timeout=settings.FRAGMENT_CACHE_TIMEOUT)
+    return rows
@@ -0,0 +1,120 @@
+"""Full-text search over restaurant names, addresses and postcodes.
+
+On Postgres the ``search_vector`` column of the restaurant table holds a
+weighted tsvector of the four fields, kept current by a trigger and served
+by a GIN index. On SQLite the ``restaurant_fts`` FTS5 table holds a copy of
+them, kept current by triggers. Both are created by migration 0014, outside
+of Django's schema, and ``rebuild_search_index`` refills them in batches.
+
+Every word of a search must match the start of a word of the restaurant,
+so "golden star temple rd" finds the Golden Star on Temple Road. Matches in
+the name rank above matches in the address, which rank above the postcode.
+A search matching nothing that way falls back to search.restaurant_filter,
+which on Postgres matches names and postcodes anywhere with the trigram
+indexes of migration 0007.
+"""
+import re
+
+from django.db import connections, router, transaction
+from django.db.models import BooleanField, FloatField, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Restaurant
+from .search import restaurant_filter
+
+POSTGRES_RANK = (
+    "ts_rank(table_booker_restaurant.search_vector, to_tsquery('simple', %s))"
+)
+POSTGRES_MATCH = "table_booker_restaurant.search_vector @@ to_tsquery('simple', %s)"
+POSTGRES_REBUILD = (
+    "UPDATE table_booker_restaurant SET search_vector = "
+    "restaurant_search_vector(name, address1, address2, postcode) "
+    "WHERE id > %s AND id <= %s"
+)
+
+# bm25 is lower for better matches, weighted by column like the tsvector
+SQLITE_RANK = (
+    "(SELECT -bm25(restaurant_fts, 8.0, 4.0, 2.0, 1.0) FROM restaurant_fts "
+    "WHERE restaurant_fts MATCH %s AND rowid = table_booker_restaurant.id)"
+)
+SQLITE_MATCH = "SELECT rowid FROM restaurant_fts WHERE restaurant_fts MATCH %s"
+SQLITE_REBUILD = [
+    "DELETE FROM restaurant_fts WHERE rowid > %s AND rowid <= %s",
+    "INSERT INTO restaurant_fts (rowid, name, address1, address2, postcode) "
+    "SELECT id, name, address1, address2, postcode FROM table_booker_restaurant "
+    "WHERE id > %s AND id <= %s",
+]
+# rows of restaurants deleted after the last one indexed
+SQLITE_PRUNE = "DELETE FROM restaurant_fts WHERE rowid > %s"
+
+
+def search_words(text):
+    return re.findall(r"\w+", text.lower())
+
+
+def full_text_search(queryset, text):
+    """Restaurants of ``queryset`` matching ``text``, annotated with ``rank``.
+
+    Order by ``-rank`` for the best matches first. When no restaurant
+    matches, or the database has no full-text search, restaurants are
+    matched by restaurant_filter instead and all rank the same.
+    """
+    words = search_words(text)
+    if not words:
+        return queryset.annotate(rank=Value(0.0, output_field=FloatField())).none()
+
+    vendor = connections[queryset.db].vendor
+    matches = None
+    if vendor == "postgresql":
+        query = " & ".join(f"{word}:*" for word in words)
+        matches = queryset.annotate(
+            rank=RawSQL(POSTGRES_RANK, [query], output_field=FloatField())
+        ).filter(RawSQL(POSTGRES_MATCH, [query], output_field=BooleanField()))
+    elif vendor == "sqlite":
+        query = " ".join(f'"{word}"*' for word in words)
+        matches = queryset.annotate(
+            rank=RawSQL(SQLITE_RANK, [query], output_field=FloatField())
+        ).filter(id__in=RawSQL(SQLITE_MATCH, [query]))
+    if matches is not None and matches.exists():
+        return matches
+
+    return queryset.filter(restaurant_filter(text)).annotate(
+        rank=Value(0.0, output_field=FloatField())
+    )
+
+
+def rebuild_search_index(batch_size=5000, using=None, progress=None):
+    """Recompute the search index of every restaurant, ``batch_size`` at a time.
+
+    Each batch commits on its own, so rebuilding a large table never holds
+    long locks. ``progress(done)`` is called after each batch. Returns the
+    number of restaurants indexed.
+    """
+    using = using or router.db_for_write(Restaurant)
+    connection = connections[using]
+    if connection.vendor == "postgresql":
+        statements = [POSTGRES_REBUILD]
+    elif connection.vendor == "sqlite":
+        statements = SQLITE_REBUILD
+    else:
+        return 0
+
+    done = 0
+    last = 0
+    ids = Restaurant.objects.using(using).order_by("id").values_list("id", flat=True)
+    while True:
+        batch = list(ids.filter(id__gt=last)[:batch_size])
+        if not batch:
+            break
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement, [last, batch[-1]])
+        done += len(batch)
+        last = batch[-1]
+        if progress is not None:
+            progress(done)
+
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute(SQLITE_PRUNE, [last])
+    return done
@@ -0,0 +1,258 @@
+"""Postcode geocoding and nearest point queries, with no external service.
+
+``build_postcode_index`` turns a postcode CSV, such as the ONS Postcode
+Directory, into the ``POSTCODE_INDEX`` file: fixed width records sorted by
+postcode, then one record per district at the centre of its postcodes. The
+file is memory mapped rather than read, so every worker shares the one copy
+in the page cache and a lookup is a binary search touching a few pages.
+
+GridIndex buckets points into cells of ``GRID_DEGREES`` and keeps them in
+flat arrays, so nearest and within-radius queries only look at the cells
+around a point.
+"""
+import array
+import heapq
+import math
+import mmap
+import os
+import statistics
+import struct
+import threading
+
+from django.conf import settings
+
+from .postcodes import postcode_district
+
+MAGIC = b"TBPC"
+VERSION = 1
+HEADER = struct.Struct("<4sHII")
+# postcode without spaces, then latitude and longitude in microdegrees
+RECORD = struct.Struct("<8sii")
+KEY_SIZE = 8
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = EARTH_RADIUS_KM * math.pi / 180
+GRID_DEGREES = 0.05
+
+
+def postcode_key(postcode):
+    return "".join(postcode.upper().split())[:KEY_SIZE].ljust(KEY_SIZE).encode()
+
+
+def distance_km(latitude1, longitude1, latitude2, longitude2):
+    """Great circle distance between two points, in kilometres."""
+    phi1, phi2 = math.radians(latitude1), math.radians(latitude2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(longitude2 - longitude1)
+    a = (
+        math.sin(d_phi / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class PostcodeIndex:
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, postcodes, districts = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a postcode index")
+        self._postcodes = (HEADER.size, postcodes)
+        self._districts = (HEADER.size + postcodes * RECORD.size, districts)
+
+    def __len__(self):
+        return self._postcodes[1]
+
+    def _find(self, section, key):
+        offset, count = section
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            start = offset + middle * RECORD.size
+            if self._map[start : start + KEY_SIZE] < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low == count:
+            return None
+        found, latitude, longitude = RECORD.unpack_from(
+            self._map, offset + low * RECORD.size
+        )
+        if found != key:
+            return None
+        return latitude / 1e6, longitude / 1e6
+
+    def geocode(self, postcode):
+        """``(latitude, longitude)`` of ``postcode``, or ``None``.
+
+        A postcode missing from the index, or a bare district such as
+        "E17", gets the centre of its district.
+        """
+        point = self._find(self._postcodes, postcode_key(postcode))
+        if point is None:
+            district = postcode_district(postcode)
+            if district:
+                point = self._find(self._districts, postcode_key(district))
+        return point
+
+
+def write_postcode_index(rows, path):
+    """Write ``(postcode, latitude, longitude)`` rows as a postcode index.
+
+    The file is written aside and moved into place, so running workers keep
+    reading the index they mapped. Returns the number of postcodes.
+    """
+    records = {}
+    districts = {}
+    for postcode, latitude, longitude in rows:
+        key = postcode_key(postcode)
+        point = (round(latitude * 1e6), round(longitude * 1e6))
+        records[key] = point
+        district = postcode_district(postcode)
+        if district:
+            districts.setdefault(postcode_key(district), []).append(point)
+
+    centres = {
+        key: (
+            round(statistics.mean(latitude for latitude, _ in points)),
+            round(statistics.mean(longitude for _, longitude in points)),
+        )
+        for key, points in districts.items()
+    }
+    partial = f"{path}.partial"
+    with open(partial, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, len(records), len(centres)))
+        for section in (records, centres):
+            for key in sorted(section):
+                file.write(RECORD.pack(key, *section[key]))
+    os.replace(partial, path)
+    return len(records)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def postcode_index():
+    """The PostcodeIndex at ``POSTCODE_INDEX``, or ``None`` without one.
+
+    Each process maps the file once, on first use. Restart the workers after
+    rebuilding it.
+    """
+    path = settings.POSTCODE_INDEX
+    if not path:
+        return None
+    with _indexes_lock:
+        if path not in _indexes:
+            if not os.path.exists(path):
+                return None
+            _indexes[path] = PostcodeIndex(path)
+        return _indexes[path]
+
+
+def geocode(postcode):
+    index = postcode_index()
+    return index.geocode(postcode) if index is not None else None
+
+
+class GridIndex:
+    """Points bucketed in a grid of ``cell`` degree squares.
+
+    Points are stored cell by cell in flat arrays, with the slice of each
+    cell in a dict, so a grid of ten thousand points takes a few hundred
+    kilobytes and pickles quickly into a shared cache.
+    """
+
+    def __init__(self, points, cell=GRID_DEGREES):
+        self.cell = cell
+        points = sorted(points, key=lambda point: self.cell_of(point[1], point[2]))
+        self.ids = array.array("q", (point[0] for point in points))
+        self.latitudes = array.array("d", (point[1] for point in points))
+        self.longitudes = array.array("d", (point[2] for point in points))
+
+        self.cells = {}
+        for position, point in enumerate(points):
+            key = self.cell_of(point[1], point[2])
+            start, _ = self.cells.get(key, (position, position))
+            self.cells[key] = (start, position + 1)
+        rows = [row for row, _ in self.cells] or [0]
+        columns = [column for _, column in self.cells] or [0]
+        self.bounds = (min(rows), max(rows), min(columns), max(columns))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def cell_of(self, latitude, longitude):
+        return math.floor(latitude / self.cell), math.floor(longitude / self.cell)
+
+    def _ring(self, row, column, radius):
+        """The cells ``radius`` cells away from ``(row, column)``."""
+        if radius == 0:
+            yield row, column
+            return
+        for offset in range(-radius, radius + 1):
+            yield row - radius, column + offset
+            yield row + radius, column + offset
+        for offset in range(-radius + 1, radius):
+            yield row + offset, column - radius
+            yield row + offset, column + radius
+
+    def _min_distance(self, latitude, radius):
+        """Fewest km to any cell more than ``radius`` cells away."""
+        # a degree of longitude is shortest at the latitude furthest from the
+        # equator the next ring reaches
+        furthest = min(90.0, abs(latitude) + (radius + 1) * self.cell)
+        return radius * self.cell * KM_PER_DEGREE * math.cos(math.radians(furthest))
+
+    def nearest(self, latitude, longitude, k, max_km=None, accept=None):
+        """Up to ``k`` ``(km, id)`` pairs closest to the point, nearest first.
+
+        Only points within ``max_km`` and whose id passes ``accept`` count.
+        """
+        if not self.cells or k <= 0:
+            return []
+
+        row, column = self.cell_of(latitude, longitude)
+        min_row, max_row, min_column, max_column = self.bounds
+        last_ring = max(
+            abs(row - min_row),
+            abs(row - max_row),
+            abs(column - min_column),
+            abs(column - max_column),
+        )
+
+        best = []  # max-heap of (-km, id)
+        for radius in range(last_ring + 1):
+            for key in self._ring(row, column, radius):
+                found = self.cells.get(key)
+                if found is None:
+                    continue
+                for position in range(*found):
+                    point_id = self.ids[position]
+                    if accept is not None and not accept(point_id):
+                        continue
+                    km = distance_km(
+                        latitude,
+                        longitude,
+                        self.latitudes[position],
+                        self.longitudes[position],
+                    )
+                    if max_km is not None and km > max_km:
+                        continue
+                    if len(best) < k:
+                        heapq.heappush(best, (-km, point_id))
+                    elif km < -best[0][0]:
+                        heapq.heapreplace(best, (-km, point_id))
+
+            bound = self._min_distance(latitude, radius)
+            if max_km is not None and bound > max_km:
+                break
+            if len(best) == k and bound > -best[0][0]:
+                break
+
+        return sorted((-km, point_id) for km, point_id in best)
+
+    def within(self, latitude, longitude, radius_km):
+        """Every ``(km, id)`` pair within ``radius_km``, nearest first."""
+        return self.nearest(latitude, longitude, len(self.ids), max_km=radius_km)
@@ -0,0 +1,83 @@
+import csv
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from table_booker.geo import PostcodeIndex, write_postcode_index
+from table_booker.models import Restaurant
+from table_booker.search import invalidate_restaurant_grid
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the POSTCODE_INDEX file from a CSV of postcodes and coordinates, "
+        "such as the ONS Postcode Directory, then locate every restaurant in "
+        "it. Restart the workers afterwards to load the new index."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV file with a header row")
+        parser.add_argument(
+            "--output", help="where to write the index, defaults to POSTCODE_INDEX"
+        )
+        parser.add_argument("--postcode-column", default="pcds")
+        parser.add_argument("--latitude-column", default="lat")
+        parser.add_argument("--longitude-column", default="long")
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        output = options["output"] or settings.POSTCODE_INDEX
+        columns = (
+            options["postcode_column"],
+            options["latitude_column"],
+            options["longitude_column"],
+        )
+
+        with open(options["path"], newline="") as file:
+            reader = csv.DictReader(file)
+            missing = [
+                column for column in columns if column not in (reader.fieldnames or [])
+            ]
+            if missing:
+                raise CommandError(f"Missing columns: {', '.join(missing)}")
+            count = write_postcode_index(self.rows(reader, *columns), output)
+
+        located = self.locate_restaurants(PostcodeIndex(output), options["batch_size"])
+        self.stdout.write(
+            f"Indexed {count} postcodes and located {located} restaurants in "
+            f"{time.perf_counter() - started:.1f}s"
+        )
+
+    def rows(self, reader, postcode_column, latitude_column, longitude_column):
+        for row in reader:
+            try:
+                latitude = float(row[latitude_column])
+                longitude = float(row[longitude_column])
+            except ValueError:
+                continue
+            # the ONS directory puts postcodes without a location at 99.999999
+            if row[postcode_column].strip() and abs(latitude) <= 90:
+                yield row[postcode_column], latitude, longitude
+
+    def locate_restaurants(self, index, batch_size):
+        """Set the coordinates of every restaurant from ``index``.
+
+        The rows are updated in bulk, so save() does not run and the grid
+        of restaurant locations is invalidated here instead.
+        """
+        located = 0
+        batch = []
+        restaurants = Restaurant.objects.only("id", "postcode").order_by("id")
+        for restaurant in restaurants.iterator():
+            point = index.geocode(restaurant.postcode)
+            restaurant.latitude, restaurant.longitude = point or (None, None)
+            located += point is not None
+            batch.append(restaurant)
+            if len(batch) == batch_size:
+                Restaurant.objects.bulk_update(batch, ["latitude", "longitude"])
+                batch = []
+        Restaurant.objects.bulk_update(batch, ["latitude", "longitude"])
+        invalidate_restaurant_grid()
+        return located
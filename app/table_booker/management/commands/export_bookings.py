@@ -0,0 +1,36 @@
+import contextlib
+import functools
+
+from django.core.management.base import BaseCommand
+
+from table_booker.bulk import EXPORTERS
+from table_booker.models import Booking
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream bookings to a CSV or NDJSON file, reading them in chunks so the "
+        "export never holds the whole table in memory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=sorted(EXPORTERS), default="csv")
+        parser.add_argument("--output", default="-", help="file to write, - for stdout")
+        parser.add_argument(
+            "--restaurant", type=int, action="append", help="only these restaurants"
+        )
+
+    def handle(self, *args, **options):
+        bookings = Booking.objects.all()
+        if options["restaurant"]:
+            bookings = bookings.filter(restaurant_id__in=options["restaurant"])
+
+        with contextlib.ExitStack() as stack:
+            if options["output"] == "-":
+                write = functools.partial(self.stdout.write, ending="")
+            else:
+                write = stack.enter_context(
+                    open(options["output"], "w", newline="")
+                ).write
+            for line in EXPORTERS[options["format"]](bookings):
+                write(line)
@@ -0,0 +1,60 @@
+import contextlib
+import csv
+import sys
+
+from django.core.management.base import BaseCommand
+
+from table_booker.bulk import import_bookings
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream bookings from a CSV or NDJSON file into the database in batches, "
+        "using COPY on Postgres. Rows failing validation are reported, not loaded."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="file to import, - for stdin")
+        parser.add_argument(
+            "--format",
+            choices=["csv", "ndjson"],
+            help="defaults to the file extension, or csv",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--rejects", help="write rejected rows and reasons to this CSV file"
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        format = options["format"] or (
+            "ndjson" if path.endswith((".ndjson", ".jsonl")) else "csv"
+        )
+
+        with contextlib.ExitStack() as stack:
+            if path == "-":
+                stream = sys.stdin
+            else:
+                stream = stack.enter_context(open(path, newline=""))
+
+            if options["rejects"]:
+                writer = csv.writer(
+                    stack.enter_context(open(options["rejects"], "w", newline=""))
+                )
+                writer.writerow(["line", "reason", "row"])
+
+                def on_reject(reject):
+                    writer.writerow([reject.line, reject.reason, reject.row])
+
+            else:
+
+                def on_reject(reject):
+                    self.stderr.write(f"line {reject.line}: {reject.reason}")
+
+            result = import_bookings(
+                stream, format, options["batch_size"], on_reject=on_reject
+            )
+
+        self.stdout.write(
+            f"Imported {result.imported} bookings, rejected {result.rejected}"
+        )
@@ -0,0 +1,84 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from table_booker.allocation import (
+    apply_moves,
+    plan_day,
+    restaurant_ids_booked_on,
+    wasted_seats,
+)
+from table_booker.availability import booking_duration
+from table_booker.config import get_restaurant_config
+from table_booker.slots import refresh_slots
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-seat the bookings still to come on a day best-fit first, largest "
+        "party first, so fewer seats go to waste and large parties fit later."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date", help="YYYY-MM-DD, defaults to today in TIME_ZONE")
+        parser.add_argument(
+            "--restaurant", type=int, action="append", help="only these restaurants"
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true", help="report the moves, save nothing"
+        )
+
+    def handle(self, *args, **options):
+        if options["date"]:
+            try:
+                date = datetime.date.fromisoformat(options["date"])
+            except ValueError:
+                raise CommandError(f"Invalid date: {options['date']}")
+        else:
+            date = timezone.localdate()
+
+        restaurant_ids = options["restaurant"] or restaurant_ids_booked_on(date)
+        for restaurant_id in restaurant_ids:
+            config = get_restaurant_config(restaurant_id)
+            if config is None:
+                raise CommandError(f"No restaurant with id {restaurant_id}")
+
+            moves = plan_day(restaurant_id, date)
+            if moves is None:
+                self.stdout.write(f"{config.name}: cannot re-seat everyone, skipped")
+                continue
+            if not moves:
+                self.stdout.write(f"{config.name}: already seated best")
+                continue
+
+            for move in moves:
+                self.stdout.write(
+                    f"  {timezone.localtime(move.booking.date):%H:%M} "
+                    f"{move.booking.total_guests} guests: "
+                    f"{' + '.join(table.name for table in move.old_tables)} -> "
+                    f"{' + '.join(table.name for table in move.new_tables)}"
+                )
+            saved = sum(
+                wasted_seats(move.old_tables, move.booking.total_guests)
+                - wasted_seats(move.new_tables, move.booking.total_guests)
+                for move in moves
+            )
+            if options["dry_run"]:
+                outcome = "would move"
+            elif apply_moves(moves):
+                outcome = "moved"
+                # moves are saved in bulk, without the signals refreshing slots
+                dates = [move.booking.date for move in moves]
+                refresh_slots(
+                    restaurant_id,
+                    min(dates) - booking_duration(),
+                    max(dates) + booking_duration(),
+                )
+            else:
+                self.stdout.write(f"{config.name}: bookings changed meanwhile, skipped")
+                continue
+            self.stdout.write(
+                f"{config.name}: {outcome} {len(moves)} bookings, "
+                f"{saved} fewer seats wasted"
+            )
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from table_booker.profiling import HEADER, make_token
+
+
+class Command(BaseCommand):
+    help = (
+        "Print a signed token that makes ProfilingMiddleware profile the "
+        "requests sending it, for PROFILE_TOKEN_MAX_AGE seconds."
+    )
+
+    def handle(self, *args, **options):
+        token = make_token()
+        self.stdout.write(token)
+        self.stderr.write(
+            f"Valid for {settings.PROFILE_TOKEN_MAX_AGE}s, e.g. "
+            f"curl -H '{HEADER}: {token}' ..."
+        )
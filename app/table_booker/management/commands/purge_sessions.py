@@ -0,0 +1,44 @@
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired database sessions in small batches, so the purge never "
+        "holds long locks on django_session. A no-op for cookie or cache sessions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--sleep", type=float, default=0, help="seconds to pause between batches"
+        )
+
+    def handle(self, *args, **options):
+        engine = import_module(settings.SESSION_ENGINE)
+        if not hasattr(engine.SessionStore, "get_model_class"):
+            self.stdout.write(f"{settings.SESSION_ENGINE} stores no sessions to purge")
+            return
+
+        model = engine.SessionStore.get_model_class()
+        now = timezone.now()
+        total = 0
+        while True:
+            keys = list(
+                model.objects.filter(expire_date__lt=now).values_list(
+                    "session_key", flat=True
+                )[: options["batch_size"]]
+            )
+            if not keys:
+                break
+
+            deleted, _ = model.objects.filter(session_key__in=keys).delete()
+            total += deleted
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+
+        self.stdout.write(f"Deleted {total} expired sessions")
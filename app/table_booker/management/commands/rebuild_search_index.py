@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from table_booker.fulltext import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the full-text search index of every restaurant in batches, "
+        "each committed on its own. Triggers keep it current day to day; run it "
+        "after restoring data or changing how restaurants are indexed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+
+        def progress(done):
+            if options["verbosity"] > 1:
+                self.stdout.write(f"Indexed {done} restaurants")
+
+        done = rebuild_search_index(options["batch_size"], progress=progress)
+        self.stdout.write(
+            f"Indexed {done} restaurants in {time.perf_counter() - started:.1f}s"
+        )
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from table_booker.models import Restaurant
+from table_booker.slots import delete_past_slots, refresh_slots
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the free seats of every restaurant at every open slot of the "
+        "next SEARCH_DAYS days and one more, and drop the slots already gone. Run it daily "
+        "and after importing bookings in bulk."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--restaurant", type=int, action="append", help="only these restaurants"
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        deleted = delete_past_slots()
+
+        restaurant_ids = options["restaurant"] or list(
+            Restaurant.objects.order_by("id").values_list("id", flat=True)
+        )
+        for restaurant_id in restaurant_ids:
+            refresh_slots(restaurant_id)
+
+        self.stdout.write(
+            f"Refreshed the slots of {len(restaurant_ids)} restaurants and deleted {deleted} past "
+            f"slots in {time.perf_counter() - started:.1f}s"
+        )
@@ -0,0 +1,250 @@
+import datetime
+import random
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import router, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from table_booker.bulk import write_bookings
+from table_booker.factories import (
+    BusinessHourFactory,
+    RestaurantFactory,
+    SettingFactory,
+    TableFactory,
+)
+from table_booker.geo import geocode
+from table_booker.models import Booking, BusinessHour, Restaurant, Setting, Table
+from table_booker.postcodes import postcode_area, postcode_district
+
+NAMES = [
+    "Golden Star",
+    "Blue Lotus",
+    "Red Lion",
+    "Olive Tree",
+    "Silver Spoon",
+    "Green Door",
+    "Little Italy",
+    "Spice Route",
+    "Harbour",
+    "Old Mill",
+]
+KINDS = ["Restaurant", "Bistro", "Kitchen", "Grill", "Brasserie", "Diner"]
+STREETS = ["High Street", "Temple Road", "Church Lane", "Station Road", "Mill Lane"]
+TOWNS = ["London", "Manchester", "Leeds", "Bristol", "Glasgow", "Cardiff"]
+AREAS = ["E", "N", "SE", "SW", "W", "NW", "M", "LS", "BS", "G", "CF"]
+TABLE_NAMES = ["Window", "Corner", "Booth", "Patio", "Bar", "Centre"]
+CAPACITIES = [2, 2, 2, 4, 4, 4, 6, 8]
+# bookings start from noon, back to back for ten hours
+SERVICE_START = datetime.time(12)
+SERVICE_HOURS = 10
+
+
+def postcode(rng):
+    letters = "ABDEFGHJLNPQRSTUWXYZ"
+    return (
+        f"{rng.choice(AREAS)}{rng.randint(1, 20)} "
+        f"{rng.randint(1, 9)}{rng.choice(letters)}{rng.choice(letters)}"
+    )
+
+
+def bulk_insert(model, objects, batch_size):
+    """Insert ``objects`` and return the ids they were given, in order."""
+    last_id = model.objects.order_by("-id").values_list("id", flat=True).first() or 0
+    model.objects.bulk_create(objects, batch_size=batch_size)
+    return list(
+        model.objects.filter(id__gt=last_id).order_by("id").values_list("id", flat=True)
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with a deterministic, production sized dataset of "
+        "restaurants, tables, business hours, settings, users and bookings."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--restaurants", type=int, default=100)
+        parser.add_argument(
+            "--tables", type=int, default=10, help="average tables per restaurant"
+        )
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--bookings", type=int, default=10000)
+        parser.add_argument("--days", type=int, default=365, help="days of bookings")
+        parser.add_argument(
+            "--start",
+            type=parse_date,
+            help="first day of bookings, YYYY-MM-DD, defaults to --days/2 ago",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=10000)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        batch_size = options["batch_size"]
+        started = time.perf_counter()
+
+        with transaction.atomic():
+            restaurant_ids = self.create_restaurants(rng, options, batch_size)
+            tables = self.create_tables(rng, restaurant_ids, options, batch_size)
+            user_ids = self.create_users(options, batch_size)
+        self.stdout.write(
+            f"Created {len(restaurant_ids)} restaurants, {len(tables)} tables and "
+            f"{len(user_ids)} users"
+        )
+
+        count = self.create_bookings(rng, tables, user_ids, options, batch_size)
+        self.stdout.write(
+            f"Created {count} bookings in {time.perf_counter() - started:.1f}s"
+        )
+
+    def create_restaurants(self, rng, options, batch_size):
+        restaurants = [
+            RestaurantFactory.build(
+                name=f"{rng.choice(NAMES)} {rng.choice(KINDS)} {number}",
+                address1=f"{rng.randint(1, 300)} {rng.choice(STREETS)}",
+                address2=rng.choice(TOWNS),
+                postcode=postcode(rng),
+            )
+            for number in range(1, options["restaurants"] + 1)
+        ]
+        # bulk_create skips Restaurant.save()
+        for restaurant in restaurants:
+            restaurant.district = postcode_district(restaurant.postcode)
+            restaurant.area = postcode_area(restaurant.district)
+            restaurant.latitude, restaurant.longitude = geocode(
+                restaurant.postcode
+            ) or (None, None)
+        restaurant_ids = bulk_insert(Restaurant, restaurants, batch_size)
+
+        restaurant_settings, hours = [], []
+        for restaurant_id in restaurant_ids:
+            restaurant = Restaurant(id=restaurant_id)
+            restaurant_settings.append(
+                SettingFactory.build(restaurant=restaurant, min_guest=rng.randint(1, 2))
+            )
+            closed_day = rng.choice([None, 0, 1])
+            for day in range(7):
+                hours.append(
+                    BusinessHourFactory.build(
+                        restaurant=restaurant,
+                        day=day,
+                        start_time=datetime.time(rng.choice([11, 12])),
+                        finish_time=datetime.time(rng.choice([22, 23])),
+                        closed=day == closed_day,
+                    )
+                )
+        Setting.objects.bulk_create(restaurant_settings, batch_size)
+        BusinessHour.objects.bulk_create(hours, batch_size)
+        return restaurant_ids
+
+    def create_tables(self, rng, restaurant_ids, options, batch_size):
+        """Create tables, returning ``(id, restaurant_id, capacity, min_guest)``."""
+        average = options["tables"]
+        tables = [
+            TableFactory.build(
+                restaurant=Restaurant(id=restaurant_id),
+                name=f"{rng.choice(TABLE_NAMES)} {number}",
+                capacity=rng.choice(CAPACITIES),
+            )
+            for restaurant_id in restaurant_ids
+            for number in range(
+                1, rng.randint(max(1, average // 2), max(1, average * 3 // 2)) + 1
+            )
+        ]
+        table_ids = bulk_insert(Table, tables, batch_size)
+        min_guests = dict(
+            Setting.objects.filter(restaurant_id__in=restaurant_ids).values_list(
+                "restaurant_id", "min_guest"
+            )
+        )
+        return [
+            (
+                table_id,
+                table.restaurant_id,
+                table.capacity,
+                min_guests[table.restaurant_id],
+            )
+            for table_id, table in zip(table_ids, tables)
+        ]
+
+    def create_users(self, options, batch_size):
+        # UserFactory hashes every password and hashing is deliberately slow,
+        # so seeded users are built directly and share a single hash
+        password = make_password("top-secret")
+        first = User.objects.order_by("-id").values_list("id", flat=True).first() or 0
+        users = [
+            User(
+                username=f"seed{number}",
+                email=f"seed{number}@email.com",
+                password=password,
+            )
+            for number in range(first + 1, first + 1 + options["users"])
+        ]
+        return bulk_insert(User, users, batch_size)
+
+    def create_bookings(self, rng, tables, user_ids, options, batch_size):
+        """Spread bookings over every table's sittings without overlaps.
+
+        Each day is cut into back to back sittings one booking long, and the
+        bookings are a uniform sample of (table, day, sitting) cells drawn in
+        a single pass (Knuth's selection sampling), so memory stays constant
+        and the result only depends on the seed and the start day.
+        """
+        wanted = options["bookings"]
+        if not wanted:
+            return 0
+        if not tables or not user_ids:
+            raise CommandError("Bookings need at least one table and one user")
+
+        duration = datetime.timedelta(minutes=settings.BOOKING_DURATION_MINUTES)
+        per_day = SERVICE_HOURS * 60 // settings.BOOKING_DURATION_MINUTES
+        first_day = options["start"] or (
+            datetime.date.today() - datetime.timedelta(options["days"] // 2)
+        )
+        sittings = []
+        for day in range(options["days"]):
+            opening = timezone.make_aware(
+                datetime.datetime.combine(
+                    first_day + datetime.timedelta(day), SERVICE_START
+                )
+            )
+            sittings += [opening + duration * number for number in range(per_day)]
+
+        cells = len(tables) * len(sittings)
+        if wanted > cells:
+            raise CommandError(
+                f"Only {cells} sittings for {wanted} bookings, add restaurants, "
+                "tables or days"
+            )
+
+        using = router.db_for_write(Booking)
+        remaining, created, batch = cells, 0, []
+        for table_id, restaurant_id, capacity, min_guest in tables:
+            for date in sittings:
+                if rng.random() * remaining < wanted - created - len(batch):
+                    batch.append(
+                        {
+                            "user_id": rng.choice(user_ids),
+                            "restaurant_id": restaurant_id,
+                            "table_id": table_id,
+                            "date": date,
+                            "total_guests": rng.randint(
+                                min(min_guest, capacity), capacity
+                            ),
+                        }
+                    )
+                    if len(batch) == batch_size:
+                        with transaction.atomic(using=using):
+                            write_bookings(batch, using, batch_size)
+                        created += len(batch)
+                        batch = []
+                remaining -= 1
+
+        with transaction.atomic(using=using):
+            write_bookings(batch, using, batch_size)
+        return created + len(batch)
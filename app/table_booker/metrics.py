@@ -0,0 +1,325 @@
+"""Prometheus metrics shared by every worker process.
+
+Each process counts into a plain dict, which costs a lock and a dict update
+per observation. At most every ``METRICS_FLUSH_SECONDS`` the dict is written
+to ``METRICS_DIR/<pid>.json`` and the ``/metrics`` view sums the files of all
+processes, so gunicorn workers need no shared memory or extra service.
+Counters of workers that exited stay in the sum, their gauges are dropped.
+Without ``METRICS_DIR`` only the serving process is reported.
+"""
+import bisect
+import collections
+import glob
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Registry:
+    def __init__(self, directory=None, flush_interval=5):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.metrics = {}
+        self.collectors = []
+        self._samples = collections.defaultdict(float)
+        self._lock = threading.Lock()
+        self._flushed = time.monotonic()
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def collector(self, function):
+        """Register ``function() -> [(name, labels, value)]`` of gauge samples."""
+        self.collectors.append(function)
+        return function
+
+    def inc(self, name, labels, amount=1):
+        with self._lock:
+            self._samples[(name, labels)] += amount
+
+    def snapshot(self):
+        """This process's counter and gauge samples."""
+        with self._lock:
+            counters = list(self._samples.items())
+        gauges = [
+            ((name, labels), value)
+            for collect in self.collectors
+            for name, labels, value in collect()
+        ]
+        return counters, gauges
+
+    def flush(self):
+        if not self.directory:
+            return
+        counters, gauges = self.snapshot()
+        data = {
+            "counters": [[name, labels, value] for (name, labels), value in counters],
+            "gauges": [[name, labels, value] for (name, labels), value in gauges],
+        }
+        # write then rename, so readers never see a half written file
+        handle, path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(handle, "w") as output:
+            json.dump(data, output)
+        os.replace(path, os.path.join(self.directory, f"{os.getpid()}.json"))
+        self._flushed = time.monotonic()
+
+    def maybe_flush(self):
+        if self.directory and time.monotonic() - self._flushed > self.flush_interval:
+            self.flush()
+
+    def collect(self):
+        """Samples summed over every process, keyed by ``(name, labels)``."""
+        totals = collections.defaultdict(float)
+        counters, gauges = self.snapshot()
+        for key, value in counters + gauges:
+            totals[key] += value
+
+        if not self.directory:
+            return totals
+
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            pid = int(os.path.basename(path).split(".")[0])
+            if pid == os.getpid():
+                continue
+            try:
+                with open(path) as source:
+                    data = json.load(source)
+            except (OSError, ValueError):
+                continue
+            samples = data["counters"]
+            if pid_alive(pid):
+                samples += data["gauges"]
+            for name, labels, value in samples:
+                totals[(name, tuple(tuple(label) for label in labels))] += value
+        return totals
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        samples = self.collect()
+        by_name = collections.defaultdict(list)
+        for (name, labels), value in samples.items():
+            by_name[name].append((labels, value))
+
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples(by_name, samples):
+                lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n"))
+        for key, value in labels
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        registry.register(self)
+
+    def labels(self, labelvalues):
+        if len(labelvalues) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}")
+        return tuple(zip(self.labelnames, labelvalues))
+
+    def samples(self, by_name, samples):
+        return sorted(
+            (self.name, labels, value) for labels, value in by_name.get(self.name, [])
+        )
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, *labelvalues, amount=1):
+        self.registry.inc(self.name, self.labels(labelvalues), amount)
+
+
+class Gauge(Metric):
+    """Gauge whose samples come from a registered collector."""
+
+    type = "gauge"
+
+
+class Ratio(Metric):
+    """Gauge computed from the summed samples of other metrics."""
+
+    type = "gauge"
+
+    def __init__(self, registry, name, documentation, compute):
+        super().__init__(registry, name, documentation)
+        self.compute = compute
+
+    def samples(self, by_name, samples):
+        return [(self.name, (), self.compute(samples))]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self, registry, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS
+    ):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._bucket = f"{name}_bucket"
+        self._sum = f"{name}_sum"
+        self._count = f"{name}_count"
+
+    def observe(self, value, *labelvalues):
+        labels = self.labels(labelvalues)
+        # buckets are counted individually and made cumulative when rendered
+        bucket = self.buckets[bisect.bisect_left(self.buckets, value)]
+        self.registry.inc(self._bucket, labels + (("le", bucket),))
+        self.registry.inc(self._sum, labels, value)
+        self.registry.inc(self._count, labels)
+
+    def samples(self, by_name, samples):
+        rendered = []
+        for labels, count in sorted(by_name.get(self._count, [])):
+            total = 0
+            for bucket in self.buckets:
+                total += samples.get((self._bucket, labels + (("le", bucket),)), 0)
+                rendered.append(
+                    (self._bucket, labels + (("le", format_value(bucket)),), total)
+                )
+            rendered.append((self._sum, labels, samples[(self._sum, labels)]))
+            rendered.append((self._count, labels, count))
+        return rendered
+
+
+registry = Registry(settings.METRICS_DIR, settings.METRICS_FLUSH_SECONDS)
+
+request_duration = Histogram(
+    registry,
+    "table_booker_request_duration_seconds",
+    "Time to handle a request, by URL name.",
+    ["view", "method"],
+)
+requests = Counter(
+    registry,
+    "table_booker_requests_total",
+    "Requests handled, by URL name and status code.",
+    ["view", "method", "status"],
+)
+db_queries = Counter(
+    registry,
+    "table_booker_db_queries_total",
+    "Database queries run, by URL name.",
+    ["view"],
+)
+db_seconds = Counter(
+    registry,
+    "table_booker_db_seconds_total",
+    "Time spent in database queries, by URL name.",
+    ["view"],
+)
+bookings = Counter(
+    registry,
+    "table_booker_bookings_total",
+    "Bookings created, updated and deleted.",
+    ["action"],
+)
+booking_rejections = Counter(
+    registry,
+    "table_booker_booking_rejections_total",
+    "Booking form submissions rejected, by reason.",
+    ["reason"],
+)
+cache_events = Gauge(
+    registry,
+    "table_booker_cache_events",
+    "Tiered cache lookups by outcome since each worker started.",
+    ["event"],
+)
+db_pool_connections = Gauge(
+    registry,
+    "table_booker_db_pool_connections",
+    "Pooled database connections by state, with SQL_POOL=1.",
+    ["database", "state"],
+)
+
+
+def cache_hit_ratio(samples):
+    events = {
+        labels[0][1]: value
+        for (name, labels), value in samples.items()
+        if name == cache_events.name
+    }
+    hits = events.get("local_hits", 0) + events.get("shared_hits", 0)
+    total = hits + events.get("misses", 0)
+    return hits / total if total else 0.0
+
+
+Ratio(
+    registry,
+    "table_booker_cache_hit_ratio",
+    "Share of tiered cache lookups served without recomputing, all workers.",
+    cache_hit_ratio,
+)
+
+
+@registry.collector
+def collect_cache_events():
+    from .cache import tiered_cache
+
+    return [
+        (cache_events.name, (("event", event),), value)
+        for event, value in tiered_cache.stats.items()
+    ]
+
+
+@registry.collector
+def collect_db_pools():
+    backend = sys.modules.get("table_booker.backends.postgresql_pool.base")
+    if backend is None:
+        return []
+
+    samples = []
+    for key, (pool, _) in list(backend.DatabaseWrapper._pools.items()):
+        database = dict(key).get("database", "")
+        for state, connections in [("in_use", pool._used), ("idle", pool._pool)]:
+            samples.append(
+                (
+                    db_pool_connections.name,
+                    (("database", database), ("state", state)),
+                    len(connections),
+                )
+            )
+    return samples
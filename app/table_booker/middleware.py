@@ -0,0 +1,208 @@
+import asyncio
+import logging
+import random
+import time
+
+from django.conf import settings
+
+from . import metrics, profiling
+from .queries import QueryLog, current_view
+from .routers import pinned_to_primary, wrote_to_primary
+
+logger = logging.getLogger(__name__)
+
+PIN_COOKIE = "pin_primary"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS", "TRACE")
+
+
+class SyncAndAsyncMiddleware:
+    """Base for middleware running natively under both WSGI and ASGI.
+
+    Django runs sync only middleware on an ASGI server in the one thread it
+    shares for thread sensitive code, for the whole request, which serializes
+    requests. Subclasses implement ``process(request)`` as a generator
+    instead: code before its single ``yield`` runs on the way in, the
+    ``yield`` evaluates to the response, and the generator returns the
+    response to pass on.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # as MiddlewareMixin does, so Django knows __call__ is async
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        steps = self.process(request)
+        next(steps)
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            steps.close()
+            raise
+        return self.finish(steps, response)
+
+    async def __acall__(self, request):
+        steps = self.process(request)
+        next(steps)
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            steps.close()
+            raise
+        return self.finish(steps, response)
+
+    def finish(self, steps, response):
+        try:
+            steps.send(response)
+        except StopIteration as stop:
+            return stop.value
+        raise RuntimeError(f"{type(self).__name__}.process() yielded twice")
+
+    def process(self, request):
+        return (yield)
+
+
+class ReplicaPinningMiddleware(SyncAndAsyncMiddleware):
+    """Keep a user's reads on the primary right after they write.
+
+    Unsafe requests read from the primary throughout. A request that wrote
+    sets a short-lived cookie, so the user's next requests skip the replicas
+    for ``REPLICA_PIN_SECONDS`` and see their own changes despite replication
+    lag. A cookie rather than the session keeps pinning free of session writes.
+    """
+
+    def process(self, request):
+        pinned = request.method not in SAFE_METHODS or PIN_COOKIE in request.COOKIES
+        pinned_token = pinned_to_primary.set(pinned)
+        wrote_token = wrote_to_primary.set(False)
+        try:
+            response = yield
+            wrote = wrote_to_primary.get()
+        finally:
+            pinned_to_primary.reset(pinned_token)
+            wrote_to_primary.reset(wrote_token)
+
+        if wrote and settings.REPLICA_DATABASES:
+            response.set_cookie(
+                PIN_COOKIE,
+                "1",
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+
+class QueryInstrumentationMiddleware(SyncAndAsyncMiddleware):
+    """Record the queries of every request and check them against its budget.
+
+    The log is kept on ``request.query_log`` and the view's budget, declared
+    with ``queries.query_budget``, on ``request.query_budget``. Requests over
+    budget are logged with their duplicated queries. With ``SERVER_TIMING``
+    the query count and SQL time go out as a ``Server-Timing`` header, where
+    browser dev tools show them next to the request.
+    """
+
+    def process(self, request):
+        request.query_log = QueryLog()
+        request.query_budget = None
+        view_token = current_view.set("")
+        started = time.perf_counter()
+        try:
+            with request.query_log.record():
+                response = yield
+        finally:
+            current_view.reset(view_token)
+        elapsed = time.perf_counter() - started
+
+        log = request.query_log
+        if request.query_budget is not None and log.count > request.query_budget:
+            logger.warning(
+                "%s went over its budget of %d queries: %s",
+                request.path,
+                request.query_budget,
+                log.summary(),
+            )
+
+        if settings.SERVER_TIMING:
+            response["Server-Timing"] = (
+                f'db;dur={log.duration * 1000:.1f};desc="{log.count} queries", '
+                f"app;dur={elapsed * 1000:.1f}"
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = getattr(view_func, "query_budget", None)
+        if request.resolver_match is not None:
+            current_view.set(request.resolver_match.url_name or "")
+
+
+class MetricsMiddleware(SyncAndAsyncMiddleware):
+    """Count requests and their latency and SQL time per URL name.
+
+    Sits outside QueryInstrumentationMiddleware to read its query log.
+    """
+
+    def process(self, request):
+        started = time.perf_counter()
+        response = yield
+        elapsed = time.perf_counter() - started
+
+        match = request.resolver_match
+        if match is None:
+            view = "unmatched"
+        elif "admin" in match.namespaces:
+            view = "admin"
+        else:
+            view = match.url_name
+        metrics.request_duration.observe(elapsed, view, request.method)
+        metrics.requests.inc(view, request.method, str(response.status_code))
+
+        log = getattr(request, "query_log", None)
+        if log is not None:
+            metrics.db_queries.inc(view, amount=log.count)
+            metrics.db_seconds.inc(view, amount=log.duration)
+
+        metrics.registry.maybe_flush()
+        return response
+
+
+class ProfilingMiddleware(SyncAndAsyncMiddleware):
+    """Profile a sample of requests with profiling.StackSampler.
+
+    A ``PROFILE_SAMPLE_RATE`` share of requests is profiled at random, and
+    every request carrying a valid ``X-Profile-Token`` header, see the
+    profile_token command. Profiles are listed in the admin. Under ASGI the
+    sampled thread is the event loop's, which shows what blocks the loop
+    rather than the work of async views on the executor pool.
+    """
+
+    def process(self, request):
+        if not self.should_profile(request):
+            return (yield)
+
+        started = time.perf_counter()
+        with profiling.StackSampler(
+            interval=settings.PROFILE_INTERVAL_MS / 1000
+        ) as sampler:
+            response = yield
+        duration = time.perf_counter() - started
+
+        try:
+            profiling.save_profile(request, response, sampler, duration)
+        except Exception:
+            logger.exception("Could not save the profile of %s", request.path)
+        return response
+
+    def should_profile(self, request):
+        token = request.headers.get(profiling.HEADER)
+        if token is not None and profiling.valid_token(token):
+            return True
+        rate = settings.PROFILE_SAMPLE_RATE
+        return rate > 0 and random.random() < rate
@@ -0,0 +1,53 @@
+# Generated by Django 3.2.6 on 2026-10-18 05:56
+
+from django.db import migrations, models
+
+# Django compiles icontains/istartswith to UPPER(column) LIKE UPPER(pattern) on
+# Postgres, so the trigram indexes are built on the same expression.
+POSTGRES_INDEXES = {
+    "restaurant_name_trgm_idx": "(UPPER(name::text)) gin_trgm_ops",
+    "restaurant_postcode_trgm_idx": "(UPPER(postcode::text)) gin_trgm_ops",
+}
+
+# SQLite's LIKE is case-insensitive and can only use NOCASE indexes
+SQLITE_INDEXES = {
+    "restaurant_name_nocase_idx": "name COLLATE NOCASE",
+    "restaurant_postcode_nocase_idx": "postcode COLLATE NOCASE",
+}
+
+
+def create_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+
+    if vendor == "postgresql":
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for name, expression in POSTGRES_INDEXES.items():
+            schema_editor.execute(
+                f"CREATE INDEX {name} ON table_booker_restaurant USING gin ({expression})"
+            )
+
+    elif vendor == "sqlite":
+        for name, expression in SQLITE_INDEXES.items():
+            schema_editor.execute(
+                f"CREATE INDEX {name} ON table_booker_restaurant ({expression})"
+            )
+
+
+def drop_search_indexes(apps, schema_editor):
+    for name in [*POSTGRES_INDEXES, *SQLITE_INDEXES]:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('table_booker', '0006_booking_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='restaurant',
+            index=models.Index(fields=['name', 'id'], name='restaurant_name_id_idx'),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
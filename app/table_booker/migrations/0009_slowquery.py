@@ -0,0 +1,32 @@
+# Generated by Django 3.2.6 on 2026-10-18 06:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('table_booker', '0008_profile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('database', models.CharField(max_length=100)),
+                ('fingerprint', models.TextField()),
+                ('sql', models.TextField()),
+                ('params', models.TextField()),
+                ('duration_ms', models.FloatField()),
+                ('view', models.CharField(blank=True, max_length=150)),
+                ('call_site', models.CharField(blank=True, max_length=500)),
+                ('plan', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name_plural': 'slow queries',
+                'ordering': ['-id'],
+            },
+        ),
+    ]
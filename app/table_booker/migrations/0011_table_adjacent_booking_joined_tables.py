@@ -0,0 +1,23 @@
+# Generated by Django 3.2.6 on 2026-10-18 06:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('table_booker', '0010_holiday'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='joined_tables',
+            field=models.ManyToManyField(blank=True, related_name='joined_bookings', to='table_booker.Table'),
+        ),
+        migrations.AddField(
+            model_name='table',
+            name='adjacent',
+            field=models.ManyToManyField(blank=True, related_name='_table_booker_table_adjacent_+', to='table_booker.Table'),
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 3.2.6 on 2026-10-18 06:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from table_booker.postcodes import postcode_district
+
+
+def fill_districts(apps, schema_editor):
+    Restaurant = apps.get_model("table_booker", "Restaurant")
+    batch = []
+    for restaurant in Restaurant.objects.only("id", "postcode").iterator():
+        restaurant.district = postcode_district(restaurant.postcode)
+        batch.append(restaurant)
+        if len(batch) == 2000:
+            Restaurant.objects.bulk_update(batch, ["district"])
+            batch = []
+    Restaurant.objects.bulk_update(batch, ["district"])
+
+
+# Adding a column rebuilds the table on SQLite, which drops the indexes
+# migration 0007 created outside of Django's schema
+SQLITE_INDEXES = {
+    "restaurant_name_nocase_idx": "name COLLATE NOCASE",
+    "restaurant_postcode_nocase_idx": "postcode COLLATE NOCASE",
+}
+
+
+def restore_sqlite_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        for name, expression in SQLITE_INDEXES.items():
+            schema_editor.execute(
+                f"CREATE INDEX IF NOT EXISTS {name} "
+                f"ON table_booker_restaurant ({expression})"
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('table_booker', '0011_table_adjacent_booking_joined_tables'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotCapacity',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start', models.DateTimeField()),
+                ('free_seats', models.IntegerField()),
+                ('smallest_party', models.IntegerField()),
+                ('largest_party', models.IntegerField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='district',
+            field=models.CharField(blank=True, editable=False, max_length=4),
+        ),
+        migrations.RunPython(restore_sqlite_indexes, migrations.RunPython.noop),
+        migrations.RunPython(fill_districts, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='restaurant',
+            index=models.Index(fields=['district'], name='restaurant_district_idx'),
+        ),
+        migrations.AddField(
+            model_name='slotcapacity',
+            name='restaurant',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='slots', to='table_booker.restaurant'),
+        ),
+        migrations.AddIndex(
+            model_name='slotcapacity',
+            index=models.Index(fields=['start', 'largest_party'], name='slot_start_party_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='slotcapacity',
+            constraint=models.UniqueConstraint(fields=('restaurant', 'start'), name='slot_restaurant_start'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 3.2.6 on 2026-10-18 06:52
+
+from django.db import migrations, models
+
+
+# Adding a column rebuilds the table on SQLite, which drops the indexes
+# migration 0007 created outside of Django's schema, as in 0012
+SQLITE_INDEXES = {
+    "restaurant_name_nocase_idx": "name COLLATE NOCASE",
+    "restaurant_postcode_nocase_idx": "postcode COLLATE NOCASE",
+}
+
+
+def restore_sqlite_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        for name, expression in SQLITE_INDEXES.items():
+            schema_editor.execute(
+                f"CREATE INDEX IF NOT EXISTS {name} "
+                f"ON table_booker_restaurant ({expression})"
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('table_booker', '0012_slot_capacity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurant',
+            name='latitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='longitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(restore_sqlite_indexes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,113 @@
+# Generated by Django 3.2.6 on 2026-10-18 06:57
+
+from django.db import migrations
+
+# The search vector is kept by a trigger rather than save(), so bulk_create
+# and QuerySet.update() keep it current too. See table_booker.fulltext.
+POSTGRES_CREATE = [
+    "ALTER TABLE table_booker_restaurant ADD COLUMN search_vector tsvector",
+    """
+    CREATE FUNCTION restaurant_search_vector(text, text, text, text)
+    RETURNS tsvector AS $$
+        SELECT setweight(to_tsvector('simple', coalesce($1, '')), 'A')
+            || setweight(to_tsvector('simple', coalesce($2, '')), 'B')
+            || setweight(to_tsvector('simple', coalesce($3, '')), 'C')
+            || setweight(to_tsvector('simple', coalesce($4, '')), 'D')
+    $$ LANGUAGE sql IMMUTABLE
+    """,
+    """
+    CREATE FUNCTION restaurant_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := restaurant_search_vector(
+            NEW.name, NEW.address1, NEW.address2, NEW.postcode
+        );
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER restaurant_search_vector_update
+    BEFORE INSERT OR UPDATE OF name, address1, address2, postcode
+    ON table_booker_restaurant
+    FOR EACH ROW EXECUTE FUNCTION restaurant_search_vector_update()
+    """,
+    """
+    UPDATE table_booker_restaurant
+    SET search_vector = restaurant_search_vector(name, address1, address2, postcode)
+    """,
+    "CREATE INDEX restaurant_search_idx ON table_booker_restaurant "
+    "USING gin (search_vector)",
+]
+
+POSTGRES_DROP = [
+    "DROP TRIGGER IF EXISTS restaurant_search_vector_update "
+    "ON table_booker_restaurant",
+    "DROP FUNCTION IF EXISTS restaurant_search_vector_update()",
+    "DROP FUNCTION IF EXISTS restaurant_search_vector(text, text, text, text)",
+    "ALTER TABLE table_booker_restaurant DROP COLUMN IF EXISTS search_vector",
+]
+
+# Adding a column to the restaurant table rebuilds it on SQLite, which drops
+# these triggers along with the indexes of migration 0007; a migration doing
+# so must create them again and run rebuild_search_index.
+SQLITE_CREATE = [
+    "CREATE VIRTUAL TABLE restaurant_fts USING fts5("
+    "name, address1, address2, postcode, tokenize = 'unicode61 remove_diacritics 2')",
+    """
+    CREATE TRIGGER restaurant_fts_insert AFTER INSERT ON table_booker_restaurant
+    BEGIN
+        INSERT INTO restaurant_fts (rowid, name, address1, address2, postcode)
+        VALUES (new.id, new.name, new.address1, new.address2, new.postcode);
+    END
+    """,
+    """
+    CREATE TRIGGER restaurant_fts_update
+    AFTER UPDATE OF name, address1, address2, postcode ON table_booker_restaurant
+    BEGIN
+        UPDATE restaurant_fts
+        SET name = new.name, address1 = new.address1,
+            address2 = new.address2, postcode = new.postcode
+        WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER restaurant_fts_delete AFTER DELETE ON table_booker_restaurant
+    BEGIN
+        DELETE FROM restaurant_fts WHERE rowid = old.id;
+    END
+    """,
+    "INSERT INTO restaurant_fts (rowid, name, address1, address2, postcode) "
+    "SELECT id, name, address1, address2, postcode FROM table_booker_restaurant",
+]
+
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS restaurant_fts_insert",
+    "DROP TRIGGER IF EXISTS restaurant_fts_update",
+    "DROP TRIGGER IF EXISTS restaurant_fts_delete",
+    "DROP TABLE IF EXISTS restaurant_fts",
+]
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    statements = {"postgresql": POSTGRES_CREATE, "sqlite": SQLITE_CREATE}
+    for statement in statements.get(vendor, []):
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    statements = {"postgresql": POSTGRES_DROP, "sqlite": SQLITE_DROP}
+    for statement in statements.get(vendor, []):
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('table_booker', '0013_restaurant_location'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 3.2.6 on 2026-10-18 07:12
+
+import importlib
+
+from django.db import migrations, models
+
+from table_booker.postcodes import postcode_area
+
+restaurant_search = importlib.import_module(
+    "table_booker.migrations.0014_restaurant_search"
+)
+
+
+def fill_areas(apps, schema_editor):
+    Restaurant = apps.get_model("table_booker", "Restaurant")
+    batch = []
+    for restaurant in Restaurant.objects.only("id", "district").iterator():
+        restaurant.area = postcode_area(restaurant.district)
+        batch.append(restaurant)
+        if len(batch) == 2000:
+            Restaurant.objects.bulk_update(batch, ["area"])
+            batch = []
+    Restaurant.objects.bulk_update(batch, ["area"])
+
+
+# Adding a column rebuilds the table on SQLite, which drops the indexes
+# migration 0007 created outside of Django's schema, as in 0013, and the
+# full-text triggers of 0014. The rows keep their ids, so restaurant_fts is
+# still current.
+SQLITE_INDEXES = {
+    "restaurant_name_nocase_idx": "name COLLATE NOCASE",
+    "restaurant_postcode_nocase_idx": "postcode COLLATE NOCASE",
+}
+SQLITE_TRIGGERS = [
+    statement
+    for statement in restaurant_search.SQLITE_CREATE
+    if "CREATE TRIGGER" in statement
+]
+
+
+def restore_sqlite_schema(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        for name, expression in SQLITE_INDEXES.items():
+            schema_editor.execute(
+                f"CREATE INDEX IF NOT EXISTS {name} "
+                f"ON table_booker_restaurant ({expression})"
+            )
+        for statement in SQLITE_TRIGGERS:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('table_booker', '0014_restaurant_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurant',
+            name='area',
+            field=models.CharField(blank=True, editable=False, max_length=2),
+        ),
+        migrations.RunPython(fill_areas, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='restaurant',
+            index=models.Index(fields=['area', 'district'], name='restaurant_area_idx'),
+        ),
+        migrations.RunPython(restore_sqlite_schema, migrations.RunPython.noop),
+    ]
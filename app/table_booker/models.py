@@ -1,18 +1,43 @@
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from django.db import models
 
+from .geo import geocode
+from .postcodes import postcode_area, postcode_district
+
 
 class Restaurant(models.Model):
     name = models.CharField(max_length=150)
     address1 = models.CharField(max_length=250)
     address2 = models.CharField(max_length=250)
     postcode = models.CharField(max_length=12)
+    # outward code of the postcode, "E17" for "E17 8BL", kept by save()
+    district = models.CharField(max_length=4, blank=True, editable=False)
+    # its area, "E" for "E17", so an area is searched with an index
+    area = models.CharField(max_length=2, blank=True, editable=False)
+    # where the postcode is, kept by save() when the postcode index has it
+    latitude = models.FloatField(null=True, blank=True, editable=False)
+    longitude = models.FloatField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     modified_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # search indexes are backend specific, see migration 0007
+        indexes = [
+            models.Index(fields=["name", "id"], name="restaurant_name_id_idx"),
+            models.Index(fields=["district"], name="restaurant_district_idx"),
+            models.Index(fields=["area", "district"], name="restaurant_area_idx"),
+        ]
+
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.district = postcode_district(self.postcode)
+        self.area = postcode_area(self.district)
+        self.latitude, self.longitude = geocode(self.postcode) or (None, None)
+        super().save(*args, **kwargs)
+
 
 class Table(models.Model):
     restaurant = models.ForeignKey(
@@ -20,6 +45,8 @@ class Table(models.Model):
     )
     name = models.CharField(max_length=250)
     capacity = models.IntegerField()
+    # tables that can be pushed together with this one for a large party
+    adjacent = models.ManyToManyField("self", blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     modified_at = models.DateTimeField(auto_now=True)
 
@@ -28,14 +55,28 @@ class Table(models.Model):
 
 
 class Booking(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
-    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE)
-    table = models.ForeignKey(Table, on_delete=models.CASCADE)
+    # foreign keys are covered by the composite indexes below
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, db_index=False)
+    table = models.ForeignKey(Table, on_delete=models.CASCADE, db_index=False)
     date = models.DateTimeField()
     total_guests = models.IntegerField(null=True)
+    # tables pushed together with ``table`` to seat a large party
+    joined_tables = models.ManyToManyField(
+        Table, blank=True, related_name="joined_bookings"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     modified_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "date"], name="booking_user_date_idx"),
+            models.Index(fields=["table", "date"], name="booking_table_date_idx"),
+            models.Index(
+                fields=["restaurant", "date"], name="booking_restaurant_date_idx"
+            ),
+        ]
+
 
 DAYS_OF_WEEK = (
     (0, "Monday"),
@@ -58,6 +99,31 @@ class BusinessHour(models.Model):
     modified_at = models.DateTimeField(auto_now=True)
 
 
+class Holiday(models.Model):
+    """Hours replacing a restaurant's usual hours on one date."""
+
+    restaurant = models.ForeignKey(
+        Restaurant, on_delete=models.CASCADE, related_name="holidays"
+    )
+    date = models.DateField()
+    start_time = models.TimeField(null=True, blank=True)
+    finish_time = models.TimeField(null=True, blank=True)
+    closed = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    modified_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["restaurant", "date"], name="holiday_restaurant_date"
+            )
+        ]
+
+    def clean(self):
+        if not self.closed and (self.start_time is None or self.finish_time is None):
+            raise ValidationError("Give the opening hours or mark the date closed.")
+
+
 class Setting(models.Model):
     restaurant = models.OneToOneField(
         Restaurant, on_delete=models.CASCADE, related_name="setting"
@@ -65,3 +131,65 @@ class Setting(models.Model):
     min_guest = models.IntegerField()
     created_at = models.DateTimeField(auto_now_add=True)
     modified_at = models.DateTimeField(auto_now=True)
+
+
+class SlotCapacity(models.Model):
+    """Who a restaurant can still seat at one open slot, see table_booker.slots."""
+
+    restaurant = models.ForeignKey(
+        Restaurant, on_delete=models.CASCADE, db_index=False, related_name="slots"
+    )
+    start = models.DateTimeField()
+    free_seats = models.IntegerField()
+    smallest_party = models.IntegerField()
+    largest_party = models.IntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["start", "largest_party"], name="slot_start_party_idx")
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["restaurant", "start"], name="slot_restaurant_start"
+            )
+        ]
+
+
+class Profile(models.Model):
+    """A sampled profile of one request, its stacks are in a file on disk."""
+
+    view = models.CharField(max_length=150)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=2000)
+    status = models.IntegerField()
+    duration_ms = models.FloatField()
+    samples = models.IntegerField()
+    stacks_file = models.CharField(max_length=250)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-id"]
+
+    def __str__(self):
+        return f"{self.method} {self.path} {self.duration_ms:.0f}ms"
+
+
+class SlowQuery(models.Model):
+    """A statement that ran longer than SLOW_QUERY_MS, see table_booker.db."""
+
+    database = models.CharField(max_length=100)
+    fingerprint = models.TextField()
+    sql = models.TextField()
+    params = models.TextField()
+    duration_ms = models.FloatField()
+    view = models.CharField(max_length=150, blank=True)
+    call_site = models.CharField(max_length=500, blank=True)
+    plan = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-id"]
+        verbose_name_plural = "slow queries"
+
+    def __str__(self):
+        return f"{self.duration_ms:.0f}ms {self.fingerprint[:80]}"
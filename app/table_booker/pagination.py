@@ -0,0 +1,85 @@
+import base64
+import collections
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+KeysetPage = collections.namedtuple("KeysetPage", ["object_list", "next_cursor"])
+NumberedPage = collections.namedtuple("NumberedPage", ["object_list", "next_page"])
+
+
+def encode_cursor(values):
+    data = json.dumps([str(value) for value in values]).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def decode_cursor(model, fields, cursor):
+    """Cursor values converted back to ``fields``, or ``None`` if malformed."""
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(data)
+        if not isinstance(values, list) or len(values) != len(fields):
+            return None
+        return [
+            model._meta.get_field(field).to_python(value)
+            for field, value in zip(fields, values)
+        ]
+    except (TypeError, ValueError, ValidationError):
+        return None
+
+
+def seek_filter(ordering, values):
+    """Rows strictly after ``values`` in ``ordering``.
+
+    Expands the row comparison ``(a, b) > (x, y)`` into
+    ``a > x OR (a = x AND b > y)``, honouring descending fields.
+    """
+    condition = Q()
+    equal = {}
+    for name, value in zip(ordering, values):
+        field = name.lstrip("-")
+        lookup = "lt" if name.startswith("-") else "gt"
+        condition |= Q(**equal, **{f"{field}__{lookup}": value})
+        equal[field] = value
+    return condition
+
+
+def keyset_page(queryset, ordering, cursor=None, per_page=25):
+    """One page of ``queryset`` in ``ordering``, starting after ``cursor``.
+
+    Seeking past the last row of the previous page instead of using OFFSET
+    keeps every page as cheap as the first. ``ordering`` must be unique, so
+    it should end with the primary key.
+    """
+    fields = [name.lstrip("-") for name in ordering]
+    queryset = queryset.order_by(*ordering)
+
+    if cursor:
+        values = decode_cursor(queryset.model, fields, cursor)
+        if values is not None:
+            queryset = queryset.filter(seek_filter(ordering, values))
+
+    object_list = list(queryset[: per_page + 1])
+    next_cursor = None
+    if len(object_list) > per_page:
+        object_list = object_list[:per_page]
+        last = object_list[-1]
+        next_cursor = encode_cursor([getattr(last, field) for field in fields])
+
+    return KeysetPage(object_list, next_cursor)
+
+
+def numbered_page(fetch, page_number, per_page=25):
+    """Page ``page_number`` of what ``fetch(offset, limit)`` returns.
+
+    For orderings computed per request, like search rank or distance, which
+    leave no stored values to seek past. Deep pages cost more, so keep such
+    results short.
+    """
+    object_list = list(fetch((page_number - 1) * per_page, per_page + 1))
+    next_page = None
+    if len(object_list) > per_page:
+        object_list = object_list[:per_page]
+        next_page = page_number + 1
+    return NumberedPage(object_list, next_page)
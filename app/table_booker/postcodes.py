@@ -0,0 +1,23 @@
+"""UK postcodes, split into the parts restaurants are searched by.
+
+A postcode is an outward code, the district such as "E17" or "EC1A", and an
+inward code such as "8BL". The district is an area, its leading letters,
+followed by a number and at most one more character.
+"""
+import re
+
+POSTCODE = re.compile(r"^([A-Z]{1,2})([0-9][0-9A-Z]?) ?([0-9][A-Z]{2})?$")
+AREA = re.compile(r"[A-Z]*")
+
+
+def postcode_district(postcode):
+    """The district of ``postcode``, "E17" for "e17 8bl", or "" if unknown."""
+    match = POSTCODE.match(" ".join(postcode.upper().split()))
+    if match is None:
+        return ""
+    return match.group(1) + match.group(2)
+
+
+def postcode_area(district):
+    """The area of a district, "E" for "E17"."""
+    return AREA.match(district).group()
@@ -0,0 +1,133 @@
+"""Statistical profiling of live requests.
+
+A background thread snapshots the request thread's stack every few
+milliseconds with ``sys._current_frames()``. The request itself runs
+untouched, so its overhead is one extra thread waking up per interval, and
+only for the requests chosen for profiling.
+
+Stacks are written in the collapsed format, one ``frame;frame;frame count``
+line per distinct stack, which flamegraph.pl, speedscope and inferno read.
+"""
+import collections
+import os
+import sys
+import threading
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+
+from .models import Profile
+
+HEADER = "X-Profile-Token"
+TOKEN_SALT = "table_booker.profiling"
+
+
+class StackSampler:
+    """Count the distinct call stacks of ``thread_id`` while running."""
+
+    def __init__(self, thread_id=None, interval=0.005):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self._labels = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[self.collapse(frame)] += 1
+
+    def label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            filename = code.co_filename.rsplit("site-packages" + os.sep, 1)[-1]
+            filename = filename.replace(str(settings.BASE_DIR) + os.sep, "")
+            label = f"{code.co_name} ({filename}:{code.co_firstlineno})"
+            self._labels[code] = label
+        return label
+
+    def collapse(self, frame):
+        frames = []
+        while frame is not None:
+            frames.append(self.label(frame.f_code))
+            frame = frame.f_back
+        return ";".join(reversed(frames))
+
+    @property
+    def samples(self):
+        return sum(self.stacks.values())
+
+    def folded(self):
+        """The stacks in collapsed format, most frequent first."""
+        return "".join(
+            f"{stack} {count}\n" for stack, count in self.stacks.most_common()
+        )
+
+
+def make_token():
+    """A value for the profiling header, valid for PROFILE_TOKEN_MAX_AGE."""
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign("profile")
+
+
+def valid_token(token):
+    try:
+        signing.TimestampSigner(salt=TOKEN_SALT).unsign(
+            token, max_age=settings.PROFILE_TOKEN_MAX_AGE
+        )
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def save_profile(request, response, sampler, duration):
+    """Write the sampled stacks to PROFILE_DIR and record them in Profile.
+
+    Only the newest PROFILE_KEEP profiles are kept, older rows and their
+    files are deleted.
+    """
+    match = request.resolver_match
+    view = match.url_name if match is not None and match.url_name else "unmatched"
+    name = f"{timezone.now():%Y%m%d-%H%M%S}-{view}-{uuid.uuid4().hex[:8]}.folded"
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    with open(os.path.join(settings.PROFILE_DIR, name), "w") as output:
+        output.write(sampler.folded())
+
+    profile = Profile.objects.create(
+        view=view,
+        method=request.method,
+        path=request.get_full_path()[:2000],
+        status=response.status_code,
+        duration_ms=duration * 1000,
+        samples=sampler.samples,
+        stacks_file=name,
+    )
+
+    profiles = Profile.objects.order_by("-id").values_list("id", "stacks_file")
+    expired = list(profiles[settings.PROFILE_KEEP :])
+    for _, stacks_file in expired:
+        try:
+            os.remove(os.path.join(settings.PROFILE_DIR, stacks_file))
+        except FileNotFoundError:
+            pass
+    Profile.objects.filter(id__in=[profile_id for profile_id, _ in expired]).delete()
+    return profile
+
+
+def read_stacks(profile):
+    try:
+        with open(os.path.join(settings.PROFILE_DIR, profile.stacks_file)) as source:
+            return source.read()
+    except FileNotFoundError:
+        return ""
@@ -0,0 +1,104 @@
+import collections
+import contextlib
+import contextvars
+import re
+import time
+
+# URL name of the view handling the current request, for query logs
+current_view = contextvars.ContextVar("current_view", default="")
+
+# QueryLogs recording the queries of the current context
+_recording = contextvars.ContextVar("recording_queries", default=())
+
+_in_list = re.compile(r"\((?:%s, )+%s\)")
+_literals = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+def fingerprint(sql):
+    """``sql`` with literals and IN lists collapsed.
+
+    Queries that only differ by their parameters share a fingerprint, so a
+    fingerprint seen many times in one request points at an N+1 loop.
+    """
+    return _literals.sub("?", _in_list.sub("(...)", sql))
+
+
+class QueryLog:
+    """Count, time and fingerprint the queries run inside ``record()``.
+
+    The logs recording are kept in a context variable, which asgiref and
+    ``executor.run_blocking`` copy into the threads they run sync code on, so
+    a log also sees the queries of those threads' connections.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = collections.Counter()
+
+    def add(self, sql, duration):
+        self.duration += duration
+        self.count += 1
+        self.fingerprints[fingerprint(sql)] += 1
+
+    @contextlib.contextmanager
+    def record(self):
+        token = _recording.set(_recording.get() + (self,))
+        try:
+            yield self
+        finally:
+            _recording.reset(token)
+
+    def duplicates(self):
+        """Fingerprints run more than once, most frequent first."""
+        return [
+            (sql, count) for sql, count in self.fingerprints.most_common() if count > 1
+        ]
+
+    def summary(self):
+        lines = [f"{self.count} queries in {self.duration * 1000:.1f}ms"]
+        lines += [f"{count}x {sql}" for sql, count in self.duplicates()]
+        return "\n".join(lines)
+
+
+def log_queries(execute, sql, params, many, context):
+    """Execute wrapper adding each query to the QueryLogs recording."""
+    logs = _recording.get()
+    if not logs:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        for log in logs:
+            log.add(sql, duration)
+
+
+def install_query_log(sender, connection, **kwargs):
+    """Wrap every new connection with log_queries, on whichever thread.
+
+    Connected to ``connection_created``. Like db.install_slow_query_log the
+    wrapper goes first in the list, under any ``execute_wrapper()`` active.
+    """
+    if log_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, log_queries)
+
+
+def record_queries():
+    """Context manager yielding a QueryLog of the queries run inside it."""
+    return QueryLog().record()
+
+
+def query_budget(limit):
+    """Declare the most queries a view may run per request.
+
+    QueryInstrumentationMiddleware logs a warning when a view goes over, and
+    ``testing.QueryBudgetClient`` fails the test.
+    """
+
+    def decorator(view):
+        view.query_budget = limit
+        return view
+
+    return decorator
@@ -0,0 +1,95 @@
+import contextlib
+import math
+import threading
+
+from django.db import connections, router, transaction
+
+from . import metrics
+from .availability import AvailabilityIndex, booking_duration
+from .models import Booking
+
+# Backends without advisory locks fall back to striped in-process locks
+LOCAL_LOCK_STRIPES = 64
+_local_locks = [threading.Lock() for _ in range(LOCAL_LOCK_STRIPES)]
+
+
+def slot_keys(table_id, date):
+    """Lock keys for the slots a booking of ``table_id`` at ``date`` occupies.
+
+    Time is cut into buckets one booking duration wide and a booking locks
+    every bucket its ``[date, date + duration)`` interval touches, which is at
+    most two. Overlapping bookings share at least one instant, so they always
+    share a bucket and serialize, while bookings of other tables or other
+    times of day never wait on each other.
+    """
+    seconds = booking_duration().total_seconds()
+    start = date.timestamp()
+    first = math.floor(start / seconds)
+    last = math.ceil((start + seconds) / seconds) - 1
+    return [(table_id, bucket) for bucket in range(first, last + 1)]
+
+
+@contextlib.contextmanager
+def locked_slots(keys, using=None):
+    """Open a transaction holding the locks for ``keys`` until it ends."""
+    using = using or router.db_for_write(Booking)
+    keys = sorted(set(keys))
+    connection = connections[using]
+
+    if connection.vendor == "postgresql":
+        with transaction.atomic(using=using):
+            with connection.cursor() as cursor:
+                for table_id, bucket in keys:
+                    cursor.execute(
+                        "SELECT pg_advisory_xact_lock(%s, %s)", [table_id, bucket]
+                    )
+            yield
+        return
+
+    stripes = sorted({hash(key) % LOCAL_LOCK_STRIPES for key in keys})
+    with contextlib.ExitStack() as stack:
+        for stripe in stripes:
+            stack.enter_context(_local_locks[stripe])
+        with transaction.atomic(using=using):
+            yield
+
+
+def commit_booking(form, **attrs):
+    """Save a valid BookingForm without double booking its tables.
+
+    The slots are checked again on the primary while holding their locks, so
+    of two requests racing for the same table and time only the first
+    commits. The loser gets an error added to ``form`` and ``None`` is
+    returned.
+    """
+    booking = form.save(commit=False)
+    for name, value in attrs.items():
+        setattr(booking, name, value)
+    tables = [booking.table, *form.joined_tables]
+    adding = booking.pk is None
+
+    using = router.db_for_write(Booking)
+    keys = [key for table in tables for key in slot_keys(table.id, booking.date)]
+    with locked_slots(keys, using):
+        index = AvailabilityIndex.for_restaurant(
+            booking.restaurant_id, booking.date, tables=tables, using=using
+        )
+        for table in tables:
+            if not index.is_free(table.id, booking.date, exclude=booking.pk):
+                metrics.booking_rejections.inc("already_booked")
+                form.add_error("date", f"{table.name} is already booked at this time")
+                return None
+
+        booking.save(using=using)
+        through = Booking.joined_tables.through
+        if not adding:
+            through.objects.using(using).filter(booking_id=booking.pk).delete()
+        if form.joined_tables:
+            through.objects.using(using).bulk_create(
+                [
+                    through(booking_id=booking.pk, table_id=table.id)
+                    for table in form.joined_tables
+                ]
+            )
+
+    return booking
@@ -0,0 +1,58 @@
+import contextvars
+import random
+import re
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# True while the current request must read from the primary
+pinned_to_primary = contextvars.ContextVar("pinned_to_primary", default=False)
+# True once the current request has written to the primary
+wrote_to_primary = contextvars.ContextVar("wrote_to_primary", default=False)
+
+_write_statement = re.compile(r"\s*(INSERT|UPDATE|DELETE)\b", re.I)
+
+
+def note_writes(execute, sql, params, many, context):
+    """Execute wrapper setting ``wrote_to_primary`` after a write."""
+    result = execute(sql, params, many, context)
+    if _write_statement.match(sql):
+        wrote_to_primary.set(True)
+    return result
+
+
+def install_write_tracking(sender, connection, **kwargs):
+    """Wrap every new connection to the primary with note_writes.
+
+    Connected to ``connection_created``. Routing a model for writing does not
+    mean a row was written, forms and lookups ask for the write database too.
+    """
+    if connection.alias == DEFAULT_DB_ALIAS:
+        if note_writes not in connection.execute_wrappers:
+            connection.execute_wrappers.insert(0, note_writes)
+
+
+class PrimaryReplicaRouter:
+    """Send reads to a random replica and writes to the primary.
+
+    Reads stay on the primary while the request is pinned, see
+    ReplicaPinningMiddleware. Without replicas everything uses the primary.
+    """
+
+    def __init__(self, replicas=None):
+        self.replicas = settings.REPLICA_DATABASES if replicas is None else replicas
+
+    def db_for_read(self, model, **hints):
+        if not self.replicas or pinned_to_primary.get():
+            return DEFAULT_DB_ALIAS
+        return random.choice(self.replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,112 @@
+"""Opening hours compiled into bitmaps of booking slots.
+
+The week is cut into slots of ``BOOKING_SLOT_MINUTES``, 672 of them for 15
+minutes, and a restaurant's hours become a Python int with one bit per open
+slot. Checking a datetime is a shift and a mask, and listing the open slots
+of a date range works on a day of bits at a time rather than slot by slot.
+
+Hours are wall clock times in ``TIME_ZONE``. A span that finishes at or
+before its start runs past midnight into the next day. A holiday replaces
+the hours starting on its date, so a late night from the day before still
+spills into it. A restaurant without any hours is always open.
+"""
+import datetime
+
+from django.conf import settings
+from django.utils import timezone
+
+ONE_DAY = datetime.timedelta(days=1)
+
+
+class WeeklySchedule:
+    def __init__(self, hours, holidays=(), slot_minutes=None):
+        self.slot_minutes = slot_minutes or settings.BOOKING_SLOT_MINUTES
+        self.per_day = 24 * 60 // self.slot_minutes
+        self.always_open = not hours and not holidays
+
+        # the spans starting on each weekday, two days of bits each
+        if hours:
+            self.day_masks = [0] * 7
+            for hour in hours:
+                self.day_masks[hour.day] |= self.span(
+                    hour.start_time, hour.finish_time
+                )
+            # a day marked closed is closed whatever its other rows say
+            for hour in hours:
+                if hour.closed:
+                    self.day_masks[hour.day] = 0
+        else:
+            self.day_masks = [(1 << self.per_day) - 1] * 7
+
+        self.holidays = {
+            holiday.date: 0
+            if holiday.closed
+            else self.span(holiday.start_time, holiday.finish_time)
+            for holiday in holidays
+        }
+
+        # the whole week, spans past Sunday midnight wrapped round to Monday
+        size = 7 * self.per_day
+        week = 0
+        for day, mask in enumerate(self.day_masks):
+            week |= mask << (day * self.per_day)
+        self.week = (week | week >> size) & ((1 << size) - 1)
+
+    def span(self, start_time, finish_time):
+        """Bits of the slots from ``start_time`` until ``finish_time``."""
+        start = (start_time.hour * 60 + start_time.minute) // self.slot_minutes
+        finish = -(-(finish_time.hour * 60 + finish_time.minute) // self.slot_minutes)
+        if finish <= start:
+            finish += self.per_day
+        return ((1 << (finish - start)) - 1) << start
+
+    def day_mask(self, date):
+        mask = self.holidays.get(date)
+        return self.day_masks[date.weekday()] if mask is None else mask
+
+    def is_open(self, at):
+        """Whether a booking can start at ``at``, with no queries."""
+        if self.always_open:
+            return True
+
+        local = timezone.localtime(at)
+        date = local.date()
+        slot = (local.hour * 60 + local.minute) // self.slot_minutes
+        if date not in self.holidays and date - ONE_DAY not in self.holidays:
+            return bool(self.week >> (local.weekday() * self.per_day + slot) & 1)
+
+        today = self.day_mask(date) >> slot
+        yesterday = self.day_mask(date - ONE_DAY) >> (slot + self.per_day)
+        return bool((today | yesterday) & 1)
+
+    def open_slots(self, start, end):
+        """Yield the start of every open slot in ``[start, end]``, in order."""
+        first, last = timezone.localtime(start), timezone.localtime(end)
+        if first > last:
+            return
+
+        # one run of bits from the day before ``first``, whose spans can
+        # spill into it, until the day of ``last``
+        origin = first.date() - ONE_DAY
+        days = (last.date() - origin).days + 1
+        mask = 0
+        for offset in range(days):
+            mask |= self.day_mask(origin + offset * ONE_DAY) << (offset * self.per_day)
+
+        slot = self.slot_minutes * 60 * 10 ** 6
+        low = self.per_day - (-microseconds_since_midnight(first) // slot)
+        high = self.per_day * (days - 1) + microseconds_since_midnight(last) // slot
+        mask = mask >> low & ((1 << (high - low + 1)) - 1)
+
+        midnight = datetime.datetime.combine(first.date(), datetime.time())
+        step = datetime.timedelta(minutes=self.slot_minutes)
+        while mask:
+            bit = mask & -mask
+            index = low - self.per_day + bit.bit_length() - 1
+            yield timezone.make_aware(midnight + index * step, is_dst=False)
+            mask ^= bit
+
+
+def microseconds_since_midnight(value):
+    seconds = value.hour * 3600 + value.minute * 60 + value.second
+    return seconds * 10 ** 6 + value.microsecond
@@ -0,0 +1,117 @@
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import Case, IntegerField, Q, When
+
+from .cache import tiered_cache
+from .geo import GridIndex
+from .models import Restaurant, SlotCapacity
+from .postcodes import postcode_area, postcode_district
+
+GRID_NAMESPACE = "restaurant-grid"
+# most restaurants near a point looked up in the database at once
+NEAREST_CANDIDATES = 500
+
+
+def restaurant_filter(query):
+    """Restaurants whose name or postcode match ``query``.
+
+    Postcodes match by prefix. Names match anywhere on Postgres, where the
+    trigram indexes from migration 0007 serve substring searches, and by
+    prefix elsewhere, where only a plain NOCASE index is available.
+    """
+    connection = connections[router.db_for_read(Restaurant)]
+    if connection.vendor == "postgresql":
+        name = Q(name__icontains=query)
+    else:
+        name = Q(name__istartswith=query)
+    return name | Q(postcode__istartswith=query)
+
+
+def available_restaurants(at, guests, postcode=""):
+    """SlotCapacity rows of the restaurants that can seat ``guests`` at ``at``.
+
+    ``at`` must be the start of a slot. With a postcode only restaurants of
+    its area are searched, those in its district first. Then the restaurants
+    with the most free seats, so the least busy, come first.
+    """
+    slots = SlotCapacity.objects.filter(
+        start=at, smallest_party__lte=guests, largest_party__gte=guests
+    ).select_related("restaurant")
+    ordering = ["-free_seats", "restaurant__name", "restaurant_id"]
+
+    district = postcode_district(postcode)
+    if district:
+        slots = slots.filter(restaurant__area=postcode_area(district)).annotate(
+            nearness=Case(
+                When(restaurant__district=district, then=0),
+                default=1,
+                output_field=IntegerField(),
+            )
+        )
+        ordering.insert(0, "nearness")
+    return slots.order_by(*ordering)
+
+
+def load_restaurant_grid():
+    return GridIndex(
+        Restaurant.objects.filter(latitude__isnull=False).values_list(
+            "id", "latitude", "longitude"
+        )
+    )
+
+
+def restaurant_grid():
+    """GridIndex of every located restaurant, cached for all workers."""
+    return tiered_cache.get_or_set(GRID_NAMESPACE, "grid", load_restaurant_grid)
+
+
+def invalidate_restaurant_grid():
+    tiered_cache.invalidate(GRID_NAMESPACE)
+
+
+def nearest_restaurants(restaurants, point, limit, offset=0):
+    """``restaurants`` within SEARCH_RADIUS_KM of ``point``, nearest first.
+
+    Only the NEAREST_CANDIDATES closest restaurants are looked at, so a
+    filtered queryset may run out of results before the radius does. Each
+    restaurant gets its ``distance_km``.
+    """
+    nearest = restaurant_grid().nearest(
+        *point, NEAREST_CANDIDATES, max_km=settings.SEARCH_RADIUS_KM
+    )
+    distances = {restaurant_id: km for km, restaurant_id in nearest}
+    if restaurants.query.has_filters():
+        ids = set(restaurants.filter(id__in=distances).values_list("id", flat=True))
+        nearest = [
+            (km, restaurant_id) for km, restaurant_id in nearest if restaurant_id in ids
+        ]
+
+    page = [restaurant_id for _, restaurant_id in nearest[offset : offset + limit]]
+    found = Restaurant.objects.in_bulk(page)
+    for restaurant in found.values():
+        restaurant.distance_km = distances[restaurant.id]
+    return [found[restaurant_id] for restaurant_id in page if restaurant_id in found]
+
+
+def available_near(at, guests, point):
+    """SlotCapacity rows that can seat ``guests`` at ``at``, nearest first.
+
+    Like available_restaurants, but only the NEAREST_CANDIDATES restaurants
+    within SEARCH_RADIUS_KM of ``point`` are searched. Each row gets the
+    ``distance_km`` of its restaurant.
+    """
+    nearest = restaurant_grid().nearest(
+        *point, NEAREST_CANDIDATES, max_km=settings.SEARCH_RADIUS_KM
+    )
+    distances = {restaurant_id: km for km, restaurant_id in nearest}
+    slots = list(
+        SlotCapacity.objects.filter(
+            start=at,
+            smallest_party__lte=guests,
+            largest_party__gte=guests,
+            restaurant_id__in=distances,
+        ).select_related("restaurant")
+    )
+    for slot in slots:
+        slot.distance_km = distances[slot.restaurant_id]
+    return sorted(slots, key=lambda slot: (slot.distance_km, slot.restaurant_id))
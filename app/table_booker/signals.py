@@ -0,0 +1,95 @@
+import functools
+import logging
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from . import metrics
+from .conditional import invalidate_restaurants_state
+from .config import invalidate_restaurant_config
+from .models import Booking, BusinessHour, Holiday, Restaurant, Setting, Table
+from .search import invalidate_restaurant_grid
+from .slots import refresh_booking_slots, refresh_slots
+
+logger = logging.getLogger(__name__)
+
+
+def after_commit(function, *args, using=None, **kwargs):
+    """Run ``function`` once the transaction on ``using`` commits.
+
+    The change it follows is committed by then, so a failure is logged
+    rather than raised into the request that made the change.
+    """
+
+    def callback():
+        try:
+            function(*args, using=using, **kwargs)
+        except Exception:
+            logger.exception("%s failed after commit", function.__name__)
+
+    transaction.on_commit(callback, using)
+
+
+@receiver(post_save, sender=Restaurant)
+@receiver(post_delete, sender=Restaurant)
+def restaurant_changed(sender, instance, using, **kwargs):
+    # once committed, or a request could cache what the database holds until
+    # then under the new version, and serve it until the next change
+    transaction.on_commit(
+        functools.partial(invalidate_restaurant_config, instance.id), using
+    )
+    transaction.on_commit(invalidate_restaurant_grid, using)
+    transaction.on_commit(invalidate_restaurants_state, using)
+
+
+@receiver(post_save, sender=Table)
+@receiver(post_delete, sender=Table)
+@receiver(post_save, sender=Setting)
+@receiver(post_delete, sender=Setting)
+@receiver(post_save, sender=BusinessHour)
+@receiver(post_delete, sender=BusinessHour)
+@receiver(post_save, sender=Holiday)
+@receiver(post_delete, sender=Holiday)
+def restaurant_config_changed(sender, instance, using, **kwargs):
+    # callbacks run in order, so the refresh reads the new config
+    transaction.on_commit(
+        functools.partial(invalidate_restaurant_config, instance.restaurant_id), using
+    )
+    after_commit(refresh_slots, instance.restaurant_id, using=using)
+
+
+@receiver(m2m_changed, sender=Table.adjacent.through)
+def table_adjacency_changed(sender, instance, action, using, **kwargs):
+    if action.startswith("post_"):
+        restaurant_config_changed(sender, instance, using)
+
+
+@receiver(post_init, sender=Booking)
+def booking_loaded(sender, instance, **kwargs):
+    # where the booking was, so moving it frees its old slots; read from
+    # __dict__ so deferred fields are not loaded
+    instance._loaded_slot = (
+        instance.__dict__.get("restaurant_id"),
+        instance.__dict__.get("date"),
+    )
+
+
+def refresh_slots_on_commit(slots, using):
+    for restaurant_id, date in slots:
+        if restaurant_id is not None and date is not None:
+            after_commit(refresh_booking_slots, restaurant_id, date, using=using)
+
+
+@receiver(post_save, sender=Booking)
+def booking_saved(sender, instance, created, using, **kwargs):
+    metrics.bookings.inc("created" if created else "updated")
+    slot = (instance.restaurant_id, instance.date)
+    refresh_slots_on_commit({slot, instance._loaded_slot}, using)
+    instance._loaded_slot = slot
+
+
+@receiver(post_delete, sender=Booking)
+def booking_deleted(sender, instance, using, **kwargs):
+    metrics.bookings.inc("deleted")
+    refresh_slots_on_commit({(instance.restaurant_id, instance.date)}, using)
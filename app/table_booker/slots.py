@@ -0,0 +1,127 @@
+"""Who every restaurant can still seat at every open slot of the coming days.
+
+Searching all restaurants for a table at a time would mean loading every
+restaurant's bookings, so the answer is kept ready in SlotCapacity: one row
+per restaurant and open slot of the next ``SEARCH_DAYS`` days, holding its
+free seats and the smallest and largest party it can take. A search is then
+one indexed query on the slot's start time. Slots without a free table have
+no row, like closed ones. Rows are kept for a day more than can be searched,
+so the last searchable day is still there until the next daily refresh.
+
+Rows are refreshed after each booking, for the slots its table is busy, and
+after each change to a restaurant's tables or hours, for its whole horizon.
+Bookings written in bulk skip both, so run ``refresh_slots`` after imports,
+and daily to move the horizon on.
+"""
+import contextlib
+import datetime
+import threading
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from .allocation import largest_party
+from .availability import AvailabilityIndex, booking_duration
+from .config import get_restaurant_config
+from .models import SlotCapacity
+from .reservations import LOCAL_LOCK_STRIPES
+
+_local_locks = [threading.Lock() for _ in range(LOCAL_LOCK_STRIPES)]
+
+
+def slot_start(at):
+    """The start of the slot ``at`` falls in."""
+    seconds = settings.BOOKING_SLOT_MINUTES * 60
+    remainder = at.timestamp() % seconds
+    return (at - datetime.timedelta(seconds=remainder)).replace(microsecond=0)
+
+
+def horizon():
+    """``(start, end)`` of the slots kept in SlotCapacity."""
+    now = timezone.now()
+    # a day past what can be searched, which a daily refresh uses up
+    return slot_start(now), now + datetime.timedelta(days=settings.SEARCH_DAYS + 1)
+
+
+def slot_capacities(config, after, before, using=None):
+    """SlotCapacity rows of ``config``'s open slots in ``(after, before)``."""
+    index = AvailabilityIndex.for_restaurant(
+        config.id, after, before, tables=config.tables, using=using
+    )
+    smallest = config.min_guest or 1
+    slots = []
+    for at in config.schedule.open_slots(after, before):
+        if not after < at < before:
+            continue
+        free = index.free_tables(at, 1)
+        if not free:
+            continue
+        slots.append(
+            SlotCapacity(
+                restaurant_id=config.id,
+                start=at,
+                free_seats=sum(table.capacity for table in free),
+                smallest_party=smallest,
+                largest_party=largest_party(free),
+            )
+        )
+    return slots
+
+
+@contextlib.contextmanager
+def locked_restaurant(restaurant_id, using):
+    """Open a transaction holding the lock on a restaurant's slots.
+
+    On Postgres it is an advisory lock with a single key, a key space apart
+    from the table and time keys of reservations.locked_slots.
+    """
+    connection = connections[using]
+    if connection.vendor == "postgresql":
+        with transaction.atomic(using=using):
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_xact_lock(%s)", [restaurant_id])
+            yield
+        return
+
+    with _local_locks[restaurant_id % LOCAL_LOCK_STRIPES]:
+        with transaction.atomic(using=using):
+            yield
+
+
+def refresh_slots(restaurant_id, after=None, before=None, using=None):
+    """Recompute the slots of a restaurant in ``(after, before)``.
+
+    Both default to the ends of the horizon, and are clamped to it. Refreshes
+    of a restaurant take turns, and read its bookings only once it is their
+    turn, so the last refresh to write has seen every booking before it.
+    """
+    using = using or router.db_for_write(SlotCapacity)
+    first, last = horizon()
+    # the bounds are exclusive, so start just before the horizon's first slot
+    first -= datetime.timedelta(microseconds=1)
+    after = max(after or first, first)
+    before = min(before or last, last)
+
+    with locked_restaurant(restaurant_id, using):
+        config = get_restaurant_config(restaurant_id)
+        slots = []
+        if config is not None and after < before:
+            slots = slot_capacities(config, after, before, using)
+
+        SlotCapacity.objects.using(using).filter(
+            restaurant_id=restaurant_id, start__gt=after, start__lt=before
+        ).delete()
+        SlotCapacity.objects.using(using).bulk_create(slots)
+
+
+def refresh_booking_slots(restaurant_id, date, using=None):
+    """Recompute the slots a booking at ``date`` keeps its tables busy in."""
+    duration = booking_duration()
+    refresh_slots(restaurant_id, date - duration, date + duration, using)
+
+
+def delete_past_slots(using=None):
+    start, _ = horizon()
+    deleted, _ = SlotCapacity.objects.db_manager(using).filter(start__lt=start).delete()
+    return deleted
@@ -0,0 +1,43 @@
+from django.core.cache import caches
+from django.test import Client
+from django.test import TestCase as DjangoTestCase
+
+from .cache import tiered_cache
+
+
+class TestCase(DjangoTestCase):
+    """TestCase starting every test with empty caches.
+
+    Cached restaurant data is invalidated once its change commits, which
+    never happens inside a TestCase, and SQLite gives the rows of the next
+    test the ids of the last one's.
+    """
+
+    def _pre_setup(self):
+        super()._pre_setup()
+        for cache in caches.all():
+            cache.clear()
+        tiered_cache.local.clear()
+
+
+class QueryBudgetClient(Client):
+    """Test client that fails when a view runs more queries than its budget.
+
+    Relies on QueryInstrumentationMiddleware, see ``queries.query_budget``.
+    """
+
+    def request(self, **request):
+        response = super().request(**request)
+        wsgi_request = response.wsgi_request
+        budget = getattr(wsgi_request, "query_budget", None)
+        log = getattr(wsgi_request, "query_log", None)
+        if budget is not None and log is not None and log.count > budget:
+            raise AssertionError(
+                f"{wsgi_request.method} {wsgi_request.path} went over its budget "
+                f"of {budget} queries: {log.summary()}"
+            )
+        return response
+
+
+class QueryBudgetTestCase(TestCase):
+    client_class = QueryBudgetClient
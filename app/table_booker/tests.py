@@ -1,21 +1,91 @@
 # Create your tests here.
+import asyncio
+import contextlib
 import datetime
-
+import io
+import json
+import os
+import random
+import re
+import runpy
+import tempfile
+import threading
+import time
+from unittest import mock
+
+import psycopg2
+import psycopg2.pool
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth.forms import AuthenticationForm
-from django.test import TestCase
-
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, Error, connection, transaction
+from django.http import HttpResponse
+from django.test import (
+    AsyncRequestFactory,
+    RequestFactory,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import metrics, views
+from .availability import AvailabilityIndex, booking_duration
+from .backends.postgresql_pool import base as pool_backend
+from .bulk import export_csv, import_bookings
+from .cache import LRUCache, TieredCache
+from .config import (
+    HolidayConfig,
+    HourConfig,
+    get_restaurant_config,
+    invalidate_restaurant_config,
+    load_restaurant_config,
+)
+from .db import close_unusable_connections, install_slow_query_log, log_slow_queries
+from .executor import run_blocking
 from .factories import (
     BookingFactory,
+    BusinessHourFactory,
     RestaurantFactory,
     SettingFactory,
     TableFactory,
     UserFactory,
 )
 from .forms import BookingForm, UserForm
-from .models import Booking, Restaurant, Table
-
-
-class HomePageTests(TestCase):
+from .fulltext import full_text_search
+from .geo import GridIndex, distance_km, geocode, write_postcode_index
+from .fragments import booking_versions, render_rows
+from .middleware import (
+    PIN_COOKIE,
+    MetricsMiddleware,
+    QueryInstrumentationMiddleware,
+    ReplicaPinningMiddleware,
+)
+from .models import (
+    Booking,
+    Holiday,
+    Profile,
+    Restaurant,
+    SlotCapacity,
+    SlowQuery,
+    Table,
+)
+from .profiling import StackSampler, make_token
+from .queries import QueryLog, fingerprint, query_budget, record_queries
+from .reservations import commit_booking, slot_keys
+from .routers import PrimaryReplicaRouter, pinned_to_primary
+from .postcodes import postcode_area, postcode_district
+from .schedule import WeeklySchedule
+from .search import available_restaurants, nearest_restaurants, restaurant_filter
+from .slots import refresh_slots, slot_start
+from .testing import QueryBudgetClient, QueryBudgetTestCase, TestCase
+
+
+class HomePageTests(QueryBudgetTestCase):
     def setUp(self):
         self.user = UserFactory()
         self.restaurant = RestaurantFactory()
@@ -38,8 +108,81 @@ class HomePageTests(TestCase):
 
         self.assertEqual(list(context), list(Restaurant.objects.all()))
 
+    def test_search_by_name_prefix(self):
+        other = RestaurantFactory(name="Silver Moon", postcode="N1 9GU")
+        self.client.force_login(self.user)
+        response = self.client.get("/", {"q": "silver"})
+
+        self.assertEqual(response.context["restaurants"], [other])
+
+    def test_search_by_postcode_prefix(self):
+        RestaurantFactory(name="Silver Moon", postcode="N1 9GU")
+        self.client.force_login(self.user)
+        response = self.client.get("/", {"q": "e17"})
+
+        self.assertEqual(response.context["restaurants"], [self.restaurant])
+
+    def test_cursor_pagination(self):
+        Restaurant.objects.bulk_create(
+            RestaurantFactory.build(name=f"Restaurant {number:03}")
+            for number in range(120)
+        )
+        expected = list(Restaurant.objects.order_by("name", "id"))
+        self.client.force_login(self.user)
+
+        pages = []
+        cursor = ""
+        while cursor is not None:
+            response = self.client.get("/", {"cursor": cursor})
+            pages.append(response.context["restaurants"])
+            cursor = response.context["next_cursor"]
+
+        self.assertEqual([len(page) for page in pages], [50, 50, 21])
+        self.assertEqual([r for page in pages for r in page], expected)
+
+    def test_near_postcode(self):
+        use_postcode_index(self)
+        self.restaurant.save()
+        other = RestaurantFactory(name="Chingford", postcode="E4 7AA")
+        RestaurantFactory(name="Islington", postcode="N1 9GU")
+        self.client.force_login(self.user)
+        response = self.client.get("/", {"near": "e4 7aa"})
+
+        self.assertEqual(response.context["restaurants"], [other, self.restaurant])
+        self.assertContains(response, "4.8 km away")
+
+    def test_near_pagination(self):
+        use_postcode_index(self)
+        Restaurant.objects.bulk_create(
+            RestaurantFactory.build(latitude=51.59 + number / 10000, longitude=0)
+            for number in range(60)
+        )
+        self.client.force_login(self.user)
+
+        first = self.client.get("/", {"near": "E17 8BL"})
+        second = self.client.get("/", {"near": "E17 8BL", "page": 2})
+
+        self.assertEqual(len(first.context["restaurants"]), 50)
+        self.assertEqual(first.context["next_page"], 2)
+        self.assertEqual(len(second.context["restaurants"]), 10)
+        self.assertIsNone(second.context["next_page"])
+        distances = [
+            restaurant.distance_km
+            for response in [first, second]
+            for restaurant in response.context["restaurants"]
+        ]
+        self.assertEqual(distances, sorted(distances))
+
+    def test_unknown_postcode(self):
+        use_postcode_index(self)
+        self.client.force_login(self.user)
+        response = self.client.get("/", {"near": "SW1A 1AA"})
+
+        self.assertEqual(response.context["restaurants"], [self.restaurant])
+        self.assertContains(response, "Unknown postcode SW1A 1AA")
+
 
-class LoginPageTests(TestCase):
+class LoginPageTests(QueryBudgetTestCase):
     def setUp(self):
         self.user = UserFactory()
         self.url = "/login"
@@ -78,7 +221,7 @@ class LoginPageTests(TestCase):
         self.assertTrue("Invalid username or password." in message.message)
 
 
-class SignUpPageTests(TestCase):
+class SignUpPageTests(QueryBudgetTestCase):
     def setUp(self):
         self.url = "/signup"
         self.response = self.client.get(self.url)
@@ -124,7 +267,7 @@ class SignUpPageTests(TestCase):
         )
 
 
-class LogoutPageTests(TestCase):
+class LogoutPageTests(QueryBudgetTestCase):
     def setUp(self):
         self.url = "/logout"
         self.response = self.client.get(self.url, follow=True)
@@ -137,7 +280,7 @@ class LogoutPageTests(TestCase):
         self.assertRedirects(self.response, "/login", status_code=302)
 
 
-class BookingRestaurantTests(TestCase):
+class BookingRestaurantTests(QueryBudgetTestCase):
     def setUp(self):
         self.user = UserFactory()
         self.restaurant = RestaurantFactory()
@@ -203,7 +346,7 @@ class BookingRestaurantTests(TestCase):
         self.assertEqual(context_restaurant, self.restaurant)
 
 
-class MyBookingsTests(TestCase):
+class MyBookingsTests(QueryBudgetTestCase):
     def setUp(self):
         self.user1 = UserFactory(username="Jane")
         self.user2 = UserFactory(username="Bayo")
@@ -232,8 +375,61 @@ class MyBookingsTests(TestCase):
         context = response.context["bookings"]
         self.assertEqual(list(context), [self.booking2])
 
+    def test_past_bookings(self):
+        past_booking = BookingFactory(
+            user=self.user1, date=timezone.now() - datetime.timedelta(days=1)
+        )
+        self.client.force_login(self.user1)
+
+        upcoming = self.client.get(self.url).context["bookings"]
+        past = self.client.get(self.url, {"when": "past"}).context["bookings"]
+
+        self.assertEqual(upcoming, [self.booking1])
+        self.assertEqual(past, [past_booking])
+
+    def test_keyset_pagination(self):
+        restaurant = self.booking1.restaurant
+        table = self.booking1.table
+        for days in range(2, 32):
+            BookingFactory(
+                user=self.user1,
+                restaurant=restaurant,
+                table=table,
+                date=timezone.now() + datetime.timedelta(days=days),
+            )
+        expected = list(Booking.objects.filter(user=self.user1).order_by("date"))
+        self.client.force_login(self.user1)
+
+        first = self.client.get(self.url)
+        second = self.client.get(self.url, {"cursor": first.context["next_cursor"]})
+
+        self.assertEqual(first.context["bookings"], expected[:25])
+        self.assertEqual(second.context["bookings"], expected[25:])
+        self.assertIsNone(second.context["next_cursor"])
 
-class DeleteMyBookingsTests(TestCase):
+    def test_invalid_cursor(self):
+        self.client.force_login(self.user1)
+        response = self.client.get(self.url, {"cursor": "not-a-cursor"})
+
+        self.assertEqual(response.context["bookings"], [self.booking1])
+
+    def test_constant_query_count(self):
+        self.client.force_login(self.user1)
+        self.client.get(self.url)  # warm up the session and content types
+
+        with CaptureQueriesContext(connection) as one_booking:
+            self.client.get(self.url)
+        for days in range(2, 12):
+            BookingFactory(
+                user=self.user1, date=timezone.now() + datetime.timedelta(days=days)
+            )
+        with CaptureQueriesContext(connection) as many_bookings:
+            self.client.get(self.url)
+
+        self.assertEqual(len(one_booking), len(many_bookings))
+
+
+class DeleteMyBookingsTests(QueryBudgetTestCase):
     def setUp(self):
         self.user = UserFactory(username="james")
         self.booking = BookingFactory()
@@ -272,7 +468,7 @@ class DeleteMyBookingsTests(TestCase):
         self.assertRedirects(response, "/my-bookings", status_code=302)
 
 
-class UpdateMyBookingsTests(TestCase):
+class UpdateMyBookingsTests(QueryBudgetTestCase):
     def setUp(self):
         self.user = UserFactory(username="janet")
         self.restaurant = RestaurantFactory()
@@ -394,10 +590,2083 @@ class BookingFormTest(TestCase):
         self.assertEquals(form.errors["date"], ["Date cannot be in the past"])
         self.assertFalse(form.is_valid())
 
+    def test_table_already_booked(self):
+        BookingFactory(
+            restaurant=self.restaurant, table=self.table, date=parse_date(self.date)
+        )
+        self.data["total_guests"] = self.min_guest
+        form = BookingForm(self.restaurant, self.data)
 
-def book_date(days=3, hours=1, minutes=30, past=False):
-    today = datetime.datetime.today()
-    delta = datetime.timedelta(days, hours, minutes)
-    date = today - delta if past else today + delta
+        self.assertFalse(form.is_valid())
+        self.assertEqual(
+            form.errors["date"], [f"{self.table.name} is already booked at this time"]
+        )
 
-    return date.strftime("%Y-%m-%dT%H:%M")
+    def test_rebook_own_slot(self):
+        booking = BookingFactory(
+            restaurant=self.restaurant, table=self.table, date=parse_date(self.date)
+        )
+        self.data["total_guests"] = self.min_guest
+        form = BookingForm(self.restaurant, self.data, instance=booking)
+
+        self.assertTrue(form.is_valid())
+
+
+class AvailabilityIndexTests(TestCase):
+    def setUp(self):
+        self.restaurant = RestaurantFactory()
+        self.small = TableFactory(restaurant=self.restaurant, name="Small", capacity=2)
+        self.large = TableFactory(restaurant=self.restaurant, name="Large", capacity=6)
+        self.date = parse_date(book_date()).replace(minute=0)
+
+    def index(self):
+        return AvailabilityIndex.for_restaurant(
+            self.restaurant.id, self.date, self.date + datetime.timedelta(days=1)
+        )
+
+    def free_table_ids(self, guests):
+        return [table.id for table in self.index().free_tables(self.date, guests)]
+
+    def test_free_tables_best_fit_first(self):
+        self.assertEqual(self.free_table_ids(2), [self.small.id, self.large.id])
+
+    def test_free_tables_filters_capacity(self):
+        self.assertEqual(self.free_table_ids(3), [self.large.id])
+
+    def test_overlapping_booking(self):
+        BookingFactory(
+            restaurant=self.restaurant,
+            table=self.small,
+            date=self.date - datetime.timedelta(minutes=90),
+        )
+        self.assertEqual(self.free_table_ids(2), [self.large.id])
+
+    def test_booking_ends_before_slot(self):
+        BookingFactory(
+            restaurant=self.restaurant,
+            table=self.small,
+            date=self.date - datetime.timedelta(hours=2),
+        )
+        self.assertEqual(self.free_table_ids(2), [self.small.id, self.large.id])
+
+    def test_exclude_booking(self):
+        booking = BookingFactory(
+            restaurant=self.restaurant, table=self.small, date=self.date
+        )
+        index = self.index()
+
+        self.assertFalse(index.is_free(self.small.id, self.date))
+        self.assertTrue(index.is_free(self.small.id, self.date, exclude=booking.id))
+
+    def test_next_free_slots(self):
+        BookingFactory(restaurant=self.restaurant, table=self.large, date=self.date)
+        slots = self.index().next_free_slots(
+            3, self.date, self.date + datetime.timedelta(days=1), count=1
+        )
+
+        self.assertEqual(
+            [(date, [table.id for table in tables]) for date, tables in slots],
+            [(self.date + datetime.timedelta(hours=2), [self.large.id])],
+        )
+
+
+class AvailabilityPageTests(QueryBudgetTestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.restaurant = RestaurantFactory()
+        self.table = TableFactory(restaurant=self.restaurant)
+        self.url = f"/book-restaurant/{self.restaurant.id}/availability"
+
+    def test_authentication(self):
+        response = self.client.get(self.url)
+        self.assertRedirects(response, "/login", status_code=302)
+
+    def test_blank_form(self):
+        self.client.force_login(self.user)
+        response = self.client.get(self.url)
+
+        self.assertTemplateUsed(response, "availability.html")
+        self.assertNotIn("free_tables", response.context)
+
+    def test_free_tables_context(self):
+        self.client.force_login(self.user)
+        response = self.client.get(self.url, {"date": book_date(), "total_guests": 2})
+
+        self.assertEqual(
+            [table.id for table in response.context["free_tables"]], [self.table.id]
+        )
+        self.assertEqual(len(response.context["next_slots"]), 5)
+
+
+class ReservationTests(TestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.restaurant = RestaurantFactory()
+        self.setting = SettingFactory(restaurant=self.restaurant, min_guest=2)
+        self.table = TableFactory(restaurant=self.restaurant)
+        self.data = {"table": self.table.id, "date": book_date(), "total_guests": 2}
+
+    def test_overlapping_slots_share_a_key(self):
+        date = parse_date(book_date())
+
+        for minutes in range(-119, 120, 7):
+            other = date + datetime.timedelta(minutes=minutes)
+            self.assertTrue(
+                set(slot_keys(self.table.id, date))
+                & set(slot_keys(self.table.id, other))
+            )
+
+    def test_other_tables_never_share_a_key(self):
+        date = parse_date(book_date())
+        other_table = TableFactory(restaurant=self.restaurant)
+
+        self.assertFalse(
+            set(slot_keys(self.table.id, date)) & set(slot_keys(other_table.id, date))
+        )
+
+    def test_commit_booking(self):
+        form = BookingForm(self.restaurant, self.data)
+        self.assertTrue(form.is_valid())
+
+        booking = commit_booking(form, restaurant=self.restaurant, user=self.user)
+
+        self.assertEqual(list(Booking.objects.all()), [booking])
+
+    def test_commit_booking_lost_race(self):
+        form = BookingForm(self.restaurant, self.data)
+        self.assertTrue(form.is_valid())
+        # another request books the table after this form was validated
+        BookingFactory(
+            user=self.user,
+            restaurant=self.restaurant,
+            table=self.table,
+            date=parse_date(self.data["date"]),
+        )
+
+        booking = commit_booking(form, restaurant=self.restaurant, user=self.user)
+
+        self.assertIsNone(booking)
+        self.assertEqual(
+            form.errors["date"], [f"{self.table.name} is already booked at this time"]
+        )
+        self.assertEqual(Booking.objects.count(), 1)
+
+
+class AllocationTests(TestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.restaurant = RestaurantFactory()
+        self.a = TableFactory(restaurant=self.restaurant, name="A", capacity=4)
+        self.b = TableFactory(restaurant=self.restaurant, name="B", capacity=4)
+        self.c = TableFactory(restaurant=self.restaurant, name="C", capacity=2)
+        self.d = TableFactory(restaurant=self.restaurant, name="D", capacity=6)
+        # A - B - C pushed together in a row, D on its own
+        self.b.adjacent.add(self.a, self.c)
+        self.date = book_date()
+
+    def allocated(self, guests):
+        form = BookingForm(self.restaurant, {"date": self.date, "total_guests": guests})
+        if not form.is_valid():
+            return form.errors["date"]
+        return [form.cleaned_data["table"].name] + [
+            table.name for table in form.joined_tables
+        ]
+
+    def test_best_fit_table(self):
+        self.assertEqual(self.allocated(2), ["C"])
+        self.assertEqual(self.allocated(3), ["A"])
+        self.assertEqual(self.allocated(5), ["D"])
+
+    def test_joins_adjacent_tables(self):
+        self.assertEqual(self.allocated(7), ["A", "B"])
+        self.assertEqual(self.allocated(10), ["A", "B", "C"])
+
+    def test_never_joins_tables_apart(self):
+        self.assertEqual(
+            self.allocated(11), ["No table for 11 guests is free at this time"]
+        )
+
+    def test_skips_booked_tables(self):
+        BookingFactory(
+            restaurant=self.restaurant, table=self.b, date=parse_date(self.date)
+        )
+
+        self.assertEqual(self.allocated(4), ["A"])
+        self.assertEqual(
+            self.allocated(7), ["No table for 7 guests is free at this time"]
+        )
+
+    def test_joined_tables_are_booked(self):
+        form = BookingForm(self.restaurant, {"date": self.date, "total_guests": 8})
+        self.assertTrue(form.is_valid(), form.errors)
+
+        booking = commit_booking(form, restaurant=self.restaurant, user=self.user)
+        index = AvailabilityIndex.for_restaurant(
+            self.restaurant.id, parse_date(self.date)
+        )
+
+        self.assertEqual(booking.table, self.a)
+        self.assertEqual(list(booking.joined_tables.all()), [self.b])
+        self.assertFalse(index.is_free(self.b.id, parse_date(self.date)))
+        self.assertEqual(self.allocated(4), ["D"])
+
+    def test_invalidated_by_adjacency_changes(self):
+        get_restaurant_config(self.restaurant.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.c.adjacent.add(self.d)
+
+        self.assertEqual(
+            get_restaurant_config(self.restaurant.id).get_table(self.d.id).adjacent,
+            (self.c.id,),
+        )
+
+    def test_optimise_tables(self):
+        date = parse_date(self.date)
+        couple = BookingFactory(
+            restaurant=self.restaurant, table=self.d, date=date, total_guests=2
+        )
+        out = io.StringIO()
+
+        call_command(
+            "optimise_tables", f"--date={date.date()}", "--dry-run", stdout=out
+        )
+        couple.refresh_from_db()
+        self.assertEqual(couple.table, self.d)
+        self.assertIn("would move 1 bookings, 4 fewer seats wasted", out.getvalue())
+
+        call_command("optimise_tables", f"--date={date.date()}", stdout=io.StringIO())
+        couple.refresh_from_db()
+        self.assertEqual(couple.table, self.c)
+
+    def test_optimise_tables_seats_large_parties_first(self):
+        date = parse_date(self.date)
+        # the couple on B keeps a party of 8 from A and B
+        couple = BookingFactory(
+            restaurant=self.restaurant, table=self.b, date=date, total_guests=2
+        )
+        four = BookingFactory(
+            restaurant=self.restaurant, table=self.d, date=date, total_guests=4
+        )
+
+        call_command("optimise_tables", f"--date={date.date()}", stdout=io.StringIO())
+        couple.refresh_from_db()
+        four.refresh_from_db()
+
+        self.assertEqual((couple.table, four.table), (self.c, self.a))
+        self.assertEqual(self.allocated(6), ["D"])
+
+
+class PostcodeTests(TestCase):
+    def test_postcode_district(self):
+        for postcode, district in [
+            ("E17 8BL", "E17"),
+            ("e17 8bl", "E17"),
+            ("E178BL", "E17"),
+            ("E1 8BL", "E1"),
+            ("E18BL", "E1"),
+            ("EC1A 1BB", "EC1A"),
+            ("SW1A", "SW1A"),
+            ("N1", "N1"),
+            ("London", ""),
+            ("", ""),
+        ]:
+            with self.subTest(postcode=postcode):
+                self.assertEqual(postcode_district(postcode), district)
+
+    def test_postcode_area(self):
+        self.assertEqual(postcode_area("E17"), "E")
+        self.assertEqual(postcode_area("EC1A"), "EC")
+
+    def test_restaurant_district(self):
+        restaurant = RestaurantFactory(postcode="n1 9gu")
+
+        self.assertEqual(restaurant.district, "N1")
+        self.assertEqual(Restaurant.objects.filter(district="N1").get(), restaurant)
+
+
+class FullTextSearchTests(TestCase):
+    def setUp(self):
+        self.golden_star = RestaurantFactory()
+        self.temple = RestaurantFactory(
+            name="Temple Kitchen", address1="1 Star Street", postcode="N1 9GU"
+        )
+        self.other = RestaurantFactory(
+            name="Silver Moon", address1="3 High Road", address2="Leyton"
+        )
+
+    def search(self, text):
+        return list(
+            full_text_search(Restaurant.objects.all(), text).order_by("-rank", "id")
+        )
+
+    def test_every_word_across_fields(self):
+        self.assertEqual(self.search("golden star temple road"), [self.golden_star])
+        self.assertEqual(self.search("silver leyton"), [self.other])
+        self.assertEqual(self.search("golden moon"), [])
+
+    def test_word_prefixes(self):
+        self.assertEqual(self.search("Gold Sta"), [self.golden_star])
+        self.assertCountEqual(self.search("e17"), [self.golden_star, self.other])
+
+    def test_falls_back_to_restaurant_filter(self):
+        # "old" starts no word, only Postgres matches names anywhere
+        substrings = connection.vendor == "postgresql"
+        self.assertEqual(self.search("old"), [self.golden_star] if substrings else [])
+
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute(
+                    "UPDATE table_booker_restaurant SET search_vector = NULL"
+                )
+            else:
+                cursor.execute("DELETE FROM restaurant_fts")
+        # restaurants missing from the index are still found
+        self.assertEqual(self.search("silver"), [self.other])
+        self.assertEqual(self.search("n1 9"), [self.temple])
+
+    def test_name_ranks_above_address(self):
+        self.assertEqual(self.search("temple"), [self.temple, self.golden_star])
+        self.assertEqual(self.search("star"), [self.golden_star, self.temple])
+
+    def test_punctuation_ignored(self):
+        self.assertEqual(self.search('"golden" (star) * OR'), [])
+        self.assertEqual(self.search("golden-star!"), [self.golden_star])
+        self.assertEqual(self.search("  "), [])
+
+    def test_index_follows_changes(self):
+        self.other.name = "Golden Moon"
+        self.other.save()
+        Restaurant.objects.filter(id=self.temple.id).update(name="Golden Temple")
+        self.golden_star.delete()
+
+        self.assertEqual(self.search("golden"), [self.temple, self.other])
+        self.assertEqual(self.search("silver"), [])
+
+    def test_rebuild_search_index(self):
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute(
+                    "UPDATE table_booker_restaurant SET search_vector = NULL"
+                )
+            else:
+                cursor.execute("DELETE FROM restaurant_fts")
+                # left behind by a restaurant deleted without the trigger
+                cursor.execute(
+                    "INSERT INTO restaurant_fts (rowid, name) VALUES (%s, 'stale')",
+                    [self.other.id + 100],
+                )
+        self.assertEqual(self.search("kitchen star"), [])
+        output = io.StringIO()
+
+        call_command("rebuild_search_index", batch_size=2, verbosity=2, stdout=output)
+
+        self.assertIn("Indexed 2 restaurants\n", output.getvalue())
+        self.assertIn("Indexed 3 restaurants in", output.getvalue())
+        self.assertEqual(self.search("kitchen star"), [self.temple])
+        self.assertEqual(self.search("stale"), [])
+
+    def test_home_page_ranked_and_paginated(self):
+        Restaurant.objects.bulk_create(
+            RestaurantFactory.build(name=f"Star {number}") for number in range(55)
+        )
+        self.client.force_login(UserFactory())
+
+        first = self.client.get("/", {"q": "star"})
+        second = self.client.get("/", {"q": "star", "page": 2})
+
+        self.assertEqual(first.context["next_page"], 2)
+        self.assertIsNone(second.context["next_page"])
+        restaurants = first.context["restaurants"] + second.context["restaurants"]
+        self.assertEqual(len(restaurants), 57)
+        # a name of two words ranks its match above the Golden Star's three
+        self.assertEqual(restaurants[-1], self.temple)
+        self.assertContains(first, 'href="?q=star&near=&page=2"')
+
+
+class GeoTests(TestCase):
+    def setUp(self):
+        self.path = use_postcode_index(self)
+
+    def test_geocode(self):
+        self.assertEqual(geocode("E17 8BL"), (51.590331, -0.017721))
+        self.assertEqual(geocode("e178bl"), (51.590331, -0.017721))
+        self.assertIsNone(geocode("SW1A 1AA"))
+        self.assertIsNone(geocode("London"))
+
+    def test_unknown_postcode_falls_back_to_district(self):
+        latitude, longitude = geocode("E17 9ZZ")
+
+        self.assertAlmostEqual(latitude, (51.590331 + 51.583145) / 2, places=5)
+        self.assertAlmostEqual(longitude, (-0.017721 - 0.031232) / 2, places=5)
+        self.assertEqual(geocode("E17"), (latitude, longitude))
+
+    def test_no_index(self):
+        with self.settings(POSTCODE_INDEX=self.path + ".missing"):
+            restaurant = RestaurantFactory(postcode="E17 8BL")
+
+        self.assertIsNone(restaurant.latitude)
+        self.assertIsNone(restaurant.longitude)
+
+    def test_restaurant_location(self):
+        restaurant = RestaurantFactory(postcode="N1 9GU")
+
+        self.assertEqual((restaurant.latitude, restaurant.longitude), geocode("N1 9GU"))
+
+    def test_distance(self):
+        self.assertAlmostEqual(
+            distance_km(*geocode("E17 8BL"), *geocode("E4 7AA")), 4.8, places=1
+        )
+
+    def test_grid_matches_brute_force(self):
+        rng = random.Random(0)
+        points = [
+            (point_id, rng.uniform(51.2, 51.8), rng.uniform(-0.6, 0.4))
+            for point_id in range(2000)
+        ]
+        grid = GridIndex(points)
+
+        for _ in range(20):
+            latitude, longitude = rng.uniform(51.1, 51.9), rng.uniform(-0.7, 0.5)
+            expected = sorted(
+                (distance_km(latitude, longitude, *point[1:]), point[0])
+                for point in points
+            )
+            self.assertEqual(grid.nearest(latitude, longitude, 10), expected[:10])
+            self.assertEqual(
+                grid.within(latitude, longitude, 3),
+                [pair for pair in expected if pair[0] <= 3],
+            )
+            self.assertEqual(
+                grid.nearest(
+                    latitude, longitude, 5, accept=lambda point_id: point_id % 2
+                ),
+                [pair for pair in expected if pair[1] % 2][:5],
+            )
+
+    def test_empty_grid(self):
+        self.assertEqual(GridIndex([]).nearest(51.5, 0, 5), [])
+
+    def test_nearest_restaurants(self):
+        walthamstow = RestaurantFactory(name="Walthamstow", postcode="E17 4AA")
+        islington = RestaurantFactory(name="Islington", postcode="N1 9GU")
+        RestaurantFactory(name="Nowhere", postcode="SW1A 1AA")
+        point = geocode("E17 8BL")
+
+        nearest = nearest_restaurants(Restaurant.objects.all(), point, 10)
+        self.assertEqual(nearest, [walthamstow, islington])
+        self.assertAlmostEqual(nearest[0].distance_km, 1.2, places=1)
+
+        filtered = Restaurant.objects.filter(name="Islington")
+        self.assertEqual(nearest_restaurants(filtered, point, 10), [islington])
+        with self.settings(SEARCH_RADIUS_KM=5):
+            self.assertEqual(
+                nearest_restaurants(Restaurant.objects.all(), point, 10), [walthamstow]
+            )
+
+    def test_build_postcode_index(self):
+        restaurant = RestaurantFactory(postcode="E4 7AA")
+        Restaurant.objects.update(latitude=None, longitude=None)
+        path = os.path.join(os.path.dirname(self.path), "onspd.csv")
+        with open(path, "w") as file:
+            file.write("pcds,lat,long\n")
+            file.write("E4 7AA,51.6,-0.01\n")
+            file.write("E4 9ZZ,99.999999,0.000000\n")
+        output = io.StringIO()
+
+        call_command("build_postcode_index", path, stdout=output)
+
+        self.assertIn(
+            "Indexed 1 postcodes and located 1 restaurants", output.getvalue()
+        )
+        restaurant.refresh_from_db()
+        self.assertEqual((restaurant.latitude, restaurant.longitude), (51.6, -0.01))
+
+    def test_build_postcode_index_missing_columns(self):
+        path = os.path.join(os.path.dirname(self.path), "postcodes.csv")
+        with open(path, "w") as file:
+            file.write("postcode,lat,lon\n")
+
+        with self.assertRaisesMessage(CommandError, "Missing columns: pcds, long"):
+            call_command("build_postcode_index", path)
+
+
+class SlotCapacityTests(TestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.restaurant = RestaurantFactory()
+        self.small = TableFactory(restaurant=self.restaurant, capacity=2)
+        self.large = TableFactory(restaurant=self.restaurant, capacity=6)
+        refresh_slots(self.restaurant.id)
+        self.date = slot_start(parse_date(book_date()))
+
+    def slot(self, date=None):
+        return SlotCapacity.objects.filter(
+            restaurant=self.restaurant, start=date or self.date
+        ).first()
+
+    def test_refresh_slots(self):
+        slot = self.slot()
+
+        self.assertEqual((slot.free_seats, slot.largest_party), (8, 6))
+        self.assertEqual(slot.smallest_party, 1)
+        # every slot of the horizon, a day past SEARCH_DAYS, is open without
+        # business hours, from the one under way
+        self.assertAlmostEqual(
+            SlotCapacity.objects.count(),
+            (settings.SEARCH_DAYS + 1) * 24 * 60 // settings.BOOKING_SLOT_MINUTES,
+            delta=1,
+        )
+
+    def test_bookings_read_under_the_restaurant_lock(self):
+        held = []
+
+        @contextlib.contextmanager
+        def locked_restaurant(restaurant_id, using):
+            held.append(restaurant_id)
+            yield
+            held.remove(restaurant_id)
+
+        def get_restaurant_config(restaurant_id):
+            self.assertEqual(held, [restaurant_id])
+            return load_restaurant_config(restaurant_id)
+
+        with mock.patch("table_booker.slots.locked_restaurant", locked_restaurant):
+            with mock.patch(
+                "table_booker.slots.get_restaurant_config", get_restaurant_config
+            ):
+                refresh_slots(self.restaurant.id)
+
+        self.assertEqual(self.slot().free_seats, 8)
+
+    def test_failed_refresh_does_not_fail_the_booking(self):
+        with mock.patch(
+            "table_booker.slots.get_restaurant_config",
+            side_effect=DatabaseError("deadlock detected"),
+        ):
+            with self.assertLogs("table_booker.signals", "ERROR") as logs:
+                with self.captureOnCommitCallbacks(execute=True):
+                    BookingFactory(
+                        user=self.user,
+                        restaurant=self.restaurant,
+                        table=self.large,
+                        date=self.date,
+                    )
+
+        self.assertIn("refresh_booking_slots failed after commit", logs.output[0])
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_refreshed_after_booking_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            booking = BookingFactory(
+                user=self.user,
+                restaurant=self.restaurant,
+                table=self.large,
+                date=self.date,
+            )
+        self.assertEqual((self.slot().free_seats, self.slot().largest_party), (2, 2))
+
+        later = self.date + datetime.timedelta(days=1)
+        booking = Booking.objects.get(pk=booking.pk)
+        booking.date = later
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.save()
+        self.assertEqual(self.slot().largest_party, 6)
+        self.assertEqual(self.slot(later).largest_party, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.delete()
+        self.assertEqual(self.slot(later).largest_party, 6)
+
+    def test_fully_booked_slots_have_no_row(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for table in [self.small, self.large]:
+                BookingFactory(
+                    user=self.user,
+                    restaurant=self.restaurant,
+                    table=table,
+                    date=self.date,
+                )
+
+        self.assertIsNone(self.slot())
+        self.assertIsNotNone(self.slot(self.date + booking_duration()))
+
+    def test_refreshed_after_table_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            TableFactory(restaurant=self.restaurant, capacity=4)
+
+        self.assertEqual(self.slot().free_seats, 12)
+
+    def test_refresh_slots_command(self):
+        SlotCapacity.objects.all().delete()
+        out = io.StringIO()
+
+        call_command("refresh_slots", stdout=out)
+
+        self.assertIn("Refreshed the slots of 1 restaurants", out.getvalue())
+        self.assertEqual(self.slot().free_seats, 8)
+
+
+class SearchPageTests(QueryBudgetTestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.walthamstow = RestaurantFactory(name="Walthamstow", postcode="E17 8BL")
+        self.chingford = RestaurantFactory(name="Chingford", postcode="E4 7AA")
+        self.islington = RestaurantFactory(name="Islington", postcode="N1 9GU")
+        for restaurant, capacities in [
+            (self.walthamstow, [4]),
+            (self.chingford, [4, 4]),
+            (self.islington, [6]),
+        ]:
+            tables = [
+                TableFactory(restaurant=restaurant, capacity=capacity)
+                for capacity in capacities
+            ]
+            tables[0].adjacent.add(*tables[1:])
+            refresh_slots(restaurant.id)
+        self.date = book_date()
+        self.url = "/search"
+
+    def search(self, **params):
+        self.client.force_login(self.user)
+        response = self.client.get(
+            self.url, {"date": self.date, "total_guests": 4, **params}
+        )
+        return [slot.restaurant.name for slot in response.context["results"]]
+
+    def test_authentication(self):
+        response = self.client.get(self.url)
+        self.assertRedirects(response, "/login", status_code=302)
+
+    def test_blank_form(self):
+        self.client.force_login(self.user)
+        response = self.client.get(self.url)
+
+        self.assertTemplateUsed(response, "search.html")
+        self.assertNotIn("results", response.context)
+
+    def test_ranked_by_free_seats(self):
+        self.assertEqual(self.search(), ["Chingford", "Islington", "Walthamstow"])
+
+    def test_district_first_then_area(self):
+        self.assertEqual(self.search(postcode="e17"), ["Walthamstow", "Chingford"])
+
+    def test_party_size(self):
+        # Chingford's two tables can be pushed together
+        self.assertEqual(self.search(total_guests=6), ["Chingford", "Islington"])
+        self.assertEqual(self.search(total_guests=8, postcode="E4 7AA"), ["Chingford"])
+        self.assertEqual(self.search(total_guests=9), [])
+
+    def test_last_searchable_day_before_the_daily_refresh(self):
+        SlotCapacity.objects.all().delete()
+        day_ago = timezone.now() - datetime.timedelta(hours=23)
+        with mock.patch("table_booker.slots.timezone.now", return_value=day_ago):
+            for restaurant in [self.walthamstow, self.chingford, self.islington]:
+                refresh_slots(restaurant.id)
+        last_hour = datetime.datetime.today() + datetime.timedelta(
+            days=settings.SEARCH_DAYS, hours=-1
+        )
+
+        self.assertEqual(
+            self.search(date=last_hour.strftime("%Y-%m-%dT%H:%M"), postcode="E17"),
+            ["Walthamstow", "Chingford"],
+        )
+
+    def test_booked_restaurants_left_out(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            BookingFactory(
+                user=self.user,
+                restaurant=self.walthamstow,
+                table=self.walthamstow.tables.get(),
+                date=parse_date(self.date),
+            )
+
+        self.assertEqual(self.search(postcode="E17"), ["Chingford"])
+
+    def test_nearest_first(self):
+        use_postcode_index(self)
+        for restaurant in [self.walthamstow, self.chingford, self.islington]:
+            restaurant.save()
+
+        # Chingford is over SEARCH_RADIUS_KM from Islington
+        self.assertEqual(self.search(postcode="N1 9GU"), ["Islington", "Walthamstow"])
+        with self.settings(SEARCH_RADIUS_KM=20):
+            self.assertEqual(
+                self.search(postcode="E4 7AA"),
+                ["Chingford", "Walthamstow", "Islington"],
+            )
+
+    def test_invalid_postcode(self):
+        self.client.force_login(self.user)
+        response = self.client.get(
+            self.url, {"date": self.date, "total_guests": 4, "postcode": "London"}
+        )
+
+        self.assertEqual(
+            response.context["search_form"].errors["postcode"],
+            ["Enter a postcode or district, such as E17"],
+        )
+
+
+class RestaurantConfigTests(TestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.restaurant = RestaurantFactory()
+        self.setting = SettingFactory(restaurant=self.restaurant, min_guest=2)
+        self.table = TableFactory(restaurant=self.restaurant)
+
+    def test_config_snapshot(self):
+        config = get_restaurant_config(self.restaurant.id)
+
+        self.assertEqual(config.name, self.restaurant.name)
+        self.assertEqual(config.min_guest, 2)
+        self.assertEqual(
+            config.tables, ((self.table.id, self.table.name, self.table.capacity, ()),),
+        )
+        self.assertEqual(config.as_restaurant(), self.restaurant)
+
+    def test_missing_restaurant(self):
+        self.assertIsNone(get_restaurant_config(99999))
+
+    def test_warm_config_runs_no_queries(self):
+        get_restaurant_config(self.restaurant.id)
+
+        with self.assertNumQueries(0):
+            get_restaurant_config(self.restaurant.id)
+
+    def test_invalidated_by_table_changes(self):
+        get_restaurant_config(self.restaurant.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            table = TableFactory(restaurant=self.restaurant, name="Window Table")
+        self.assertEqual(len(get_restaurant_config(self.restaurant.id).tables), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            table.delete()
+        self.assertEqual(len(get_restaurant_config(self.restaurant.id).tables), 1)
+
+    def test_invalidated_by_setting_changes(self):
+        get_restaurant_config(self.restaurant.id)
+        self.setting.min_guest = 4
+        with self.captureOnCommitCallbacks(execute=True):
+            self.setting.save()
+
+        self.assertEqual(get_restaurant_config(self.restaurant.id).min_guest, 4)
+
+    def test_invalidated_once_committed(self):
+        get_restaurant_config(self.restaurant.id)
+        self.setting.min_guest = 4
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.setting.save()
+            # another request could cache the old config again until then
+            self.assertEqual(get_restaurant_config(self.restaurant.id).min_guest, 2)
+
+        callbacks[0]()
+        self.assertEqual(get_restaurant_config(self.restaurant.id).min_guest, 4)
+
+    def test_invalidated_by_business_hour_changes(self):
+        get_restaurant_config(self.restaurant.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            BusinessHourFactory(restaurant=self.restaurant)
+
+        self.assertEqual(len(get_restaurant_config(self.restaurant.id).hours), 1)
+
+    def test_invalidated_by_restaurant_delete(self):
+        get_restaurant_config(self.restaurant.id)
+        self.restaurant.delete()
+
+        self.assertIsNone(get_restaurant_config(self.restaurant.id))
+
+    def test_warm_booking_page_runs_no_config_queries(self):
+        self.client.force_login(self.user)
+        url = f"/book-restaurant/{self.restaurant.id}"
+        self.client.get(url)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+
+        config_tables = ("table_booker_restaurant", "table_booker_table", "setting")
+        self.assertFalse(
+            [
+                query["sql"]
+                for query in queries
+                if any(table in query["sql"] for table in config_tables)
+            ]
+        )
+
+
+def at(day, hour, minute=0):
+    """An aware datetime in the week of Monday 7 January 2030."""
+    return timezone.make_aware(datetime.datetime(2030, 1, 7 + day, hour, minute))
+
+
+class WeeklyScheduleTests(TestCase):
+    def setUp(self):
+        self.hours = [
+            HourConfig(0, datetime.time(9, 30), datetime.time(17), False),
+            # Friday runs past midnight
+            HourConfig(4, datetime.time(18), datetime.time(2), False),
+            HourConfig(5, datetime.time(12), datetime.time(22), True),
+            # and so does Sunday, into Monday
+            HourConfig(6, datetime.time(20), datetime.time(1), False),
+        ]
+        self.schedule = WeeklySchedule(self.hours, slot_minutes=15)
+
+    def test_is_open(self):
+        for when, expected in [
+            (at(0, 9, 29), False),
+            (at(0, 9, 30), True),
+            (at(0, 16, 59), True),
+            (at(0, 17), False),
+            (at(1, 12), False),
+            (at(4, 23), True),
+            (at(5, 1, 45), True),
+            (at(5, 2), False),
+            # Saturday is marked closed
+            (at(5, 13), False),
+            (at(6, 23), True),
+            (at(7, 0, 30), True),
+            (at(7, 1), False),
+        ]:
+            with self.subTest(when=when):
+                self.assertEqual(self.schedule.is_open(when), expected)
+
+    def test_holidays(self):
+        schedule = WeeklySchedule(
+            self.hours,
+            [
+                HolidayConfig(datetime.date(2030, 1, 7), None, None, True),
+                HolidayConfig(
+                    datetime.date(2030, 1, 12),
+                    datetime.time(8),
+                    datetime.time(10),
+                    False,
+                ),
+            ],
+            slot_minutes=15,
+        )
+
+        self.assertFalse(schedule.is_open(at(0, 12)))
+        # Friday night still spills into the Saturday holiday
+        self.assertTrue(schedule.is_open(at(5, 1)))
+        self.assertTrue(schedule.is_open(at(5, 9)))
+        self.assertFalse(schedule.is_open(at(5, 11)))
+        # and the holiday does not touch the following week
+        self.assertTrue(schedule.is_open(at(7, 12)))
+
+    def test_open_slots_match_is_open(self):
+        schedule = WeeklySchedule(
+            self.hours,
+            [HolidayConfig(datetime.date(2030, 1, 11), None, None, True)],
+            slot_minutes=15,
+        )
+        start, end = at(0, 10, 5), at(14, 3)
+
+        expected = []
+        when = at(0, 10, 15)
+        while when <= end:
+            if schedule.is_open(when):
+                expected.append(when)
+            when += datetime.timedelta(minutes=15)
+
+        self.assertEqual(list(schedule.open_slots(start, end)), expected)
+
+    def test_no_hours_is_always_open(self):
+        schedule = WeeklySchedule([])
+
+        self.assertTrue(schedule.is_open(at(2, 3)))
+        self.assertEqual(len(list(schedule.open_slots(at(0, 0), at(0, 23, 59)))), 96)
+
+    def test_booking_when_closed_is_rejected(self):
+        restaurant = RestaurantFactory()
+        table = TableFactory(restaurant=restaurant)
+        SettingFactory(restaurant=restaurant, min_guest=1)
+        for day in range(7):
+            BusinessHourFactory(
+                restaurant=restaurant,
+                day=day,
+                start_time=datetime.time(12),
+                finish_time=datetime.time(22),
+            )
+        date = timezone.localtime() + datetime.timedelta(days=3)
+        data = {"table": table.id, "total_guests": 2}
+
+        closed = BookingForm(
+            restaurant,
+            data={**data, "date": date.replace(hour=8).strftime("%Y-%m-%dT%H:%M")},
+        )
+        opened = BookingForm(
+            restaurant,
+            data={**data, "date": date.replace(hour=19).strftime("%Y-%m-%dT%H:%M")},
+        )
+
+        self.assertEqual(
+            closed.errors["date"], ["The restaurant is closed at this time"]
+        )
+        self.assertTrue(opened.is_valid(), opened.errors)
+
+    def test_holiday_changes_invalidate_config(self):
+        restaurant = RestaurantFactory()
+        date = timezone.localdate() + datetime.timedelta(days=2)
+        when = timezone.make_aware(datetime.datetime.combine(date, datetime.time(12)))
+        self.assertTrue(get_restaurant_config(restaurant.id).schedule.is_open(when))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Holiday.objects.create(restaurant=restaurant, date=date)
+
+        self.assertFalse(get_restaurant_config(restaurant.id).schedule.is_open(when))
+
+
+class LRUCacheTests(TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+
+    def test_expires_after_ttl(self):
+        cache = LRUCache(ttl=-1)
+        cache.set("a", 1)
+
+        self.assertIsNone(cache.get("a"))
+
+    def test_get_or_set_caches_none(self):
+        cache = LRUCache()
+        calls = []
+        cache.get_or_set("a", lambda: calls.append(1))
+        cache.get_or_set("a", lambda: calls.append(1))
+
+        self.assertEqual(calls, [1])
+
+
+class TieredCacheTests(TestCase):
+    def setUp(self):
+        # two workers sharing the default cache
+        self.worker1 = TieredCache()
+        self.worker2 = TieredCache()
+        self.namespace = f"test:{self.id()}"
+
+    def test_shared_between_workers(self):
+        self.worker1.get_or_set(self.namespace, "key", lambda: "value")
+        value = self.worker2.get_or_set(self.namespace, "key", lambda: "other")
+
+        self.assertEqual(value, "value")
+        self.assertEqual(self.worker2.stats["shared_hits"], 1)
+
+    def test_local_hits(self):
+        self.worker1.get_or_set(self.namespace, "key", lambda: "value")
+        self.worker1.get_or_set(self.namespace, "key", lambda: "other")
+
+        self.assertEqual(self.worker1.stats["misses"], 1)
+        self.assertEqual(self.worker1.stats["local_hits"], 1)
+        self.assertEqual(self.worker1.hit_ratio(), 0.5)
+
+    def test_warns_when_workers_do_not_share_the_cache(self):
+        with self.settings(WEB_CONCURRENCY=4):
+            with self.assertLogs("table_booker.cache", "WARNING") as logs:
+                cache = TieredCache()
+
+            self.assertFalse(cache.shared_by_workers())
+            self.assertIn("4 workers", logs.output[0])
+            filebased = "django.core.cache.backends.filebased.FileBasedCache"
+            with self.settings(CACHES={"default": {"BACKEND": filebased}}):
+                self.assertTrue(cache.shared_by_workers())
+
+    def test_invalidate_across_workers(self):
+        self.worker1.get_or_set(self.namespace, "key", lambda: "old")
+        self.worker2.invalidate(self.namespace)
+        self.worker1.local.clear()  # the local tier expired
+
+        value = self.worker1.get_or_set(self.namespace, "key", lambda: "new")
+        self.assertEqual(value, "new")
+
+    def test_single_flight_within_process(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.05)
+            return "value"
+
+        threads = [
+            threading.Thread(
+                target=self.worker1.get_or_set, args=(self.namespace, "key", compute)
+            )
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+
+    def test_single_flight_across_workers(self):
+        full_key = self.worker1.make_key(self.namespace, "key")
+        self.worker1.shared.add(f"lock:{full_key}", 1)
+        # worker1 finishes computing while worker2 waits
+        threading.Timer(
+            0.05, self.worker1.shared.set, args=(full_key, "computed")
+        ).start()
+
+        value = self.worker2.get_or_set(self.namespace, "key", lambda: "recomputed")
+
+        self.assertEqual(value, "computed")
+        self.assertEqual(self.worker2.stats["waits"], 1)
+
+
+class BulkBookingTests(TestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.restaurant = RestaurantFactory()
+        SettingFactory(restaurant=self.restaurant, min_guest=2)
+        self.table = TableFactory(restaurant=self.restaurant, capacity=4)
+        self.date = timezone.now().replace(microsecond=0) + datetime.timedelta(days=1)
+
+    def csv_input(self, *rows):
+        lines = ["user_id,restaurant_id,table_id,date,total_guests"]
+        lines += [",".join(str(value) for value in row) for row in rows]
+        return io.StringIO("\n".join(lines) + "\n")
+
+    def test_import_csv_reports_rejected_rows(self):
+        rejects = []
+        stream = self.csv_input(
+            [self.user.id, self.restaurant.id, self.table.id, self.date.isoformat(), 2],
+            [self.user.id, "", self.table.id, self.date.isoformat(), 5],
+            [self.user.id, "", self.table.id, self.date.isoformat(), 1],
+            [self.user.id, "", 99999, self.date.isoformat(), 2],
+            [99999, "", self.table.id, self.date.isoformat(), 2],
+            [self.user.id, "", self.table.id, "tomorrow", 2],
+        )
+
+        result = import_bookings(stream, batch_size=2, on_reject=rejects.append)
+
+        self.assertEqual(result, (1, 5))
+        self.assertEqual(
+            [(reject.line, reject.reason) for reject in rejects],
+            [
+                (3, "Maximum table capacity is 4"),
+                (4, "Minimum guest bookable is: 2"),
+                (5, "Unknown table 99999"),
+                (6, "Unknown user 99999"),
+                (7, "Invalid date tomorrow"),
+            ],
+        )
+        booking = Booking.objects.get()
+        self.assertEqual(booking.restaurant, self.restaurant)
+        self.assertEqual(booking.date, self.date)
+
+    def test_import_ndjson(self):
+        row = {"user_id": self.user.id, "table_id": self.table.id, "total_guests": 3}
+        stream = io.StringIO(
+            json.dumps(dict(row, date=self.date.isoformat()))
+            + "\nnot json\n"
+            + json.dumps(
+                dict(row, date=(self.date + datetime.timedelta(1)).isoformat())
+            )
+            + "\n"
+        )
+        rejects = []
+
+        result = import_bookings(stream, "ndjson", on_reject=rejects.append)
+
+        self.assertEqual(result, (2, 1))
+        self.assertEqual(rejects[0].reason, "Not a JSON object")
+        self.assertEqual(Booking.objects.filter(restaurant=self.restaurant).count(), 2)
+
+    def test_export_round_trips_through_import(self):
+        BookingFactory.create_batch(
+            3, user=self.user, restaurant=self.restaurant, table=self.table
+        )
+        output = io.StringIO()
+        call_command("export_bookings", stdout=output)
+        Booking.objects.all().delete()
+
+        result = import_bookings(io.StringIO(output.getvalue()))
+
+        self.assertEqual(result, (3, 0))
+        self.assertEqual(len(output.getvalue().splitlines()), 4)
+
+    def test_export_streams_in_chunks(self):
+        BookingFactory.create_batch(
+            3, user=self.user, restaurant=self.restaurant, table=self.table
+        )
+        lines = export_csv(Booking.objects.all())
+
+        with CaptureQueriesContext(connection) as queries:
+            header = next(lines)
+        self.assertTrue(header.startswith("id,user_id"))
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(len(list(lines)), 3)
+
+    def test_admin_export_action(self):
+        admin = User.objects.create_superuser("admin", "admin@example.com", "secret")
+        BookingFactory(user=self.user, restaurant=self.restaurant, table=self.table)
+        self.client.force_login(admin)
+
+        response = self.client.post(
+            "/admin/table_booker/booking/",
+            {
+                "action": "export_csv",
+                "_selected_action": Booking.objects.values_list("id", flat=True),
+            },
+        )
+
+        self.assertEqual(response["Content-Type"], "text/csv")
+        content = b"".join(response.streaming_content).decode()
+        self.assertEqual(len(content.splitlines()), 2)
+
+
+class SeedDataTests(TestCase):
+    def seed(self):
+        call_command(
+            "seed_data",
+            "--start=2021-09-01",
+            restaurants=3,
+            tables=2,
+            users=5,
+            bookings=40,
+            days=7,
+            stdout=io.StringIO(),
+        )
+        return list(
+            Booking.objects.order_by(
+                "date", "table__name", "restaurant__name"
+            ).values_list("restaurant__name", "table__name", "date", "total_guests")
+        )
+
+    def test_seed_data(self):
+        bookings = self.seed()
+
+        self.assertEqual(Restaurant.objects.count(), 3)
+        self.assertEqual(User.objects.count(), 5)
+        self.assertEqual(len(bookings), 40)
+        for booking in Booking.objects.select_related("table", "restaurant__setting"):
+            self.assertEqual(booking.table.restaurant_id, booking.restaurant_id)
+            self.assertLessEqual(booking.total_guests, booking.table.capacity)
+        index = AvailabilityIndex(
+            Table.objects.all(), Booking.objects.values_list("table_id", "date", "id")
+        )
+        for table_id, date, booking_id in Booking.objects.values_list(
+            "table_id", "date", "id"
+        ):
+            self.assertTrue(index.is_free(table_id, date, exclude=booking_id))
+
+    def test_seed_data_is_deterministic(self):
+        first = self.seed()
+        for model in (Booking, Restaurant, User):
+            model.objects.all().delete()
+
+        self.assertEqual(self.seed(), first)
+
+    def test_seeded_restaurants_are_found_by_postcode(self):
+        self.seed()
+        for restaurant_id in Restaurant.objects.values_list("id", flat=True):
+            refresh_slots(restaurant_id)
+        slot = SlotCapacity.objects.select_related("restaurant").first()
+
+        self.assertFalse(Restaurant.objects.filter(area="").exists())
+        self.assertIn(
+            slot,
+            available_restaurants(
+                slot.start, slot.smallest_party, slot.restaurant.postcode
+            ),
+        )
+
+    def test_too_many_bookings(self):
+        with self.assertRaises(CommandError):
+            call_command(
+                "seed_data",
+                restaurants=1,
+                tables=1,
+                users=1,
+                bookings=100,
+                days=1,
+                stdout=io.StringIO(),
+            )
+
+
+class QueryInstrumentationTests(TestCase):
+    def setUp(self):
+        self.restaurant = RestaurantFactory()
+        TableFactory.create_batch(3, restaurant=self.restaurant)
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'x'"),
+            "SELECT * FROM t WHERE id IN (...) AND name = ?",
+        )
+
+    def test_record_queries_finds_duplicates(self):
+        with record_queries() as log:
+            for table in Table.objects.all():
+                table.restaurant.name
+
+        self.assertEqual(log.count, 4)
+        self.assertGreater(log.duration, 0)
+        self.assertEqual(log.duplicates()[0][1], 3)
+
+    def test_over_budget_is_logged(self):
+        @query_budget(1)
+        def view(request):
+            for table in Table.objects.all():
+                table.restaurant.name
+            return HttpResponse()
+
+        middleware = QueryInstrumentationMiddleware(view)
+        request = RequestFactory().get("/")
+
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            return view(request)
+
+        middleware.get_response = get_response
+        with self.assertLogs("table_booker.middleware", "WARNING") as logs:
+            response = middleware(request)
+
+        self.assertIn("budget of 1 queries: 4 queries", logs.output[0])
+        self.assertIn('desc="4 queries"', response["Server-Timing"])
+
+    def test_server_timing_header(self):
+        response = self.client.get("/login")
+
+        self.assertRegex(
+            response["Server-Timing"], r'^db;dur=[\d.]+;desc="\d+ queries", app;dur='
+        )
+
+    def test_client_fails_over_budget(self):
+        user = UserFactory()
+        client = QueryBudgetClient()
+        client.force_login(user)
+
+        with mock.patch.object(views.my_bookings, "query_budget", 0):
+            with self.assertRaisesMessage(AssertionError, "budget of 0 queries"):
+                with self.assertLogs("table_booker.middleware", "WARNING"):
+                    client.get("/my-bookings")
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.registry = metrics.Registry(self.directory.name)
+        self.counter = metrics.Counter(
+            self.registry, "test_total", "Test counter.", ["kind"]
+        )
+        self.histogram = metrics.Histogram(
+            self.registry, "test_seconds", "Test histogram.", buckets=[0.1, 1]
+        )
+
+    def write_worker(self, pid, counters, gauges=()):
+        with open(os.path.join(self.directory.name, f"{pid}.json"), "w") as output:
+            json.dump({"counters": counters, "gauges": list(gauges)}, output)
+
+    def test_render(self):
+        self.counter.inc("a")
+        self.counter.inc("a", amount=2)
+        self.histogram.observe(0.05)
+        self.histogram.observe(0.5)
+
+        self.assertEqual(
+            self.registry.render().splitlines(),
+            [
+                "# HELP test_total Test counter.",
+                "# TYPE test_total counter",
+                'test_total{kind="a"} 3',
+                "# HELP test_seconds Test histogram.",
+                "# TYPE test_seconds histogram",
+                'test_seconds_bucket{le="0.1"} 1',
+                'test_seconds_bucket{le="1"} 2',
+                'test_seconds_bucket{le="+Inf"} 2',
+                "test_seconds_sum 0.55",
+                "test_seconds_count 2",
+            ],
+        )
+
+    def test_sums_every_worker(self):
+        metrics.Gauge(self.registry, "test_gauge", "Test gauge.")
+        self.counter.inc("a")
+        # a live worker, the parent process, and one that exited
+        self.write_worker(os.getppid(), [["test_total", [["kind", "a"]], 2]])
+        self.write_worker(
+            2 ** 22 + 1, [["test_total", [["kind", "b"]], 5]], [["test_gauge", [], 7]],
+        )
+
+        output = self.registry.render()
+
+        self.assertIn('test_total{kind="a"} 3', output)
+        self.assertIn('test_total{kind="b"} 5', output)
+        self.assertNotIn("test_gauge 7", output)
+
+    def test_flush_round_trips(self):
+        self.histogram.observe(0.5)
+        self.registry.flush()
+        other = metrics.Registry(self.directory.name)
+        other.metrics = self.registry.metrics
+
+        with mock.patch("os.getpid", return_value=os.getppid()):
+            output = other.render()
+
+        self.assertIn('test_seconds_bucket{le="+Inf"} 1', output)
+
+    def test_metrics_page(self):
+        user = UserFactory()
+        table = TableFactory()
+        self.client.force_login(user)
+        self.client.post(
+            f"/book-restaurant/{table.restaurant_id}",
+            {"table": table.id, "date": book_date(), "total_guests": 2},
+        )
+        self.client.post(
+            f"/book-restaurant/{table.restaurant_id}",
+            {"table": table.id, "date": book_date(), "total_guests": 99},
+        )
+
+        response = self.client.get("/metrics")
+        output = response.content.decode()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(output, r'table_booker_bookings_total{action="created"} \d')
+        self.assertIn('booking_rejections_total{reason="over_capacity"}', output)
+        self.assertIn(
+            'request_duration_seconds_count{view="book-restaurant",method="POST"}',
+            output,
+        )
+        self.assertIn('db_queries_total{view="book-restaurant"}', output)
+        self.assertIn("table_booker_cache_hit_ratio ", output)
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        profile_dir = override_settings(PROFILE_DIR=self.directory)
+        profile_dir.enable()
+        self.addCleanup(profile_dir.disable)
+
+    def test_sampler_counts_stacks(self):
+        def spin():
+            deadline = time.perf_counter() + 0.05
+            while time.perf_counter() < deadline:
+                pass
+
+        with StackSampler(interval=0.001) as sampler:
+            spin()
+
+        self.assertGreater(sampler.samples, 5)
+        stack, count = sampler.folded().splitlines()[0].rsplit(" ", 1)
+        self.assertIn("test_sampler_counts_stacks (table_booker/tests.py", stack)
+        self.assertTrue(stack.split(";")[-1].startswith("spin ("))
+
+    def test_token_profiles_request(self):
+        self.client.get("/login", HTTP_X_PROFILE_TOKEN=make_token())
+
+        profile = Profile.objects.get()
+        self.assertEqual(
+            (profile.view, profile.method, profile.status), ("login", "GET", 200)
+        )
+        self.assertTrue(
+            os.path.exists(os.path.join(self.directory, profile.stacks_file))
+        )
+
+    def test_invalid_token_is_ignored(self):
+        self.client.get("/login", HTTP_X_PROFILE_TOKEN="profile:forged")
+
+        self.assertFalse(Profile.objects.exists())
+
+    def test_sample_rate_and_retention(self):
+        with self.settings(PROFILE_SAMPLE_RATE=1, PROFILE_KEEP=2):
+            for _ in range(3):
+                self.client.get("/login")
+
+        self.assertEqual(Profile.objects.count(), 2)
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+
+    def test_admin_lists_profiles(self):
+        with open(os.path.join(self.directory, "login.folded"), "w") as output:
+            output.write("login_page (table_booker/views.py:171) 3\n")
+        profile = Profile.objects.create(
+            view="login",
+            method="GET",
+            path="/login",
+            status=200,
+            duration_ms=12.5,
+            samples=3,
+            stacks_file="login.folded",
+        )
+        admin = User.objects.create_superuser("admin", "admin@example.com", "secret")
+        self.client.force_login(admin)
+
+        changelist = self.client.get("/admin/table_booker/profile/")
+        detail = self.client.get(f"/admin/table_booker/profile/{profile.id}/change/")
+
+        self.assertContains(changelist, "/login")
+        self.assertContains(detail, "login_page (table_booker/views.py")
+
+
+class ConditionalGetTests(QueryBudgetTestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.restaurant = RestaurantFactory()
+        self.booking = BookingFactory(user=self.user, restaurant=self.restaurant)
+
+    def revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+
+    def test_unchanged_home_page_is_not_modified(self):
+        self.client.force_login(self.user)
+        response = self.client.get("/")
+
+        with record_queries() as log:
+            revalidated = self.revalidate("/", response)
+
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated.content, b"")
+        # the session and the user, the validators come from the cache
+        self.assertEqual(log.count, 2)
+        self.assertIn("Last-Modified", response)
+        self.assertIn("private", response["Cache-Control"])
+        self.assertIn("no-cache", response["Cache-Control"])
+
+    def test_changes_invalidate_home_page(self):
+        self.client.force_login(self.user)
+        response = self.client.get("/")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            restaurant = RestaurantFactory()
+        response = self.revalidate("/", response)
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self.revalidate("/", response).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            restaurant.delete()
+        self.assertEqual(self.revalidate("/", response).status_code, 200)
+
+    @override_settings(WEB_CONCURRENCY=4)
+    def test_home_page_without_a_shared_cache(self):
+        # the other workers would never see the version change
+        self.client.force_login(self.user)
+        response = self.client.get("/")
+
+        Restaurant.objects.filter(id=self.restaurant.id).delete()
+        self.assertEqual(self.revalidate("/", response).status_code, 200)
+
+    def test_search_has_its_own_etag(self):
+        self.client.force_login(self.user)
+        response = self.client.get("/")
+
+        self.assertEqual(self.revalidate("/?q=x", response).status_code, 200)
+
+    def test_etag_is_per_user(self):
+        self.client.force_login(self.user)
+        response = self.client.get("/my-bookings")
+
+        self.client.force_login(UserFactory())
+        self.assertEqual(self.revalidate("/my-bookings", response).status_code, 200)
+
+    def test_deleted_booking_invalidates_my_bookings(self):
+        BookingFactory(user=self.user)
+        self.client.force_login(self.user)
+        response = self.client.get("/my-bookings")
+        self.assertEqual(self.revalidate("/my-bookings", response).status_code, 304)
+
+        self.booking.delete()
+        self.assertEqual(self.revalidate("/my-bookings", response).status_code, 200)
+
+    def test_renamed_restaurant_invalidates_my_bookings(self):
+        self.client.force_login(self.user)
+        response = self.client.get("/my-bookings")
+
+        self.restaurant.name = "Renamed"
+        self.restaurant.save()
+        self.assertEqual(self.revalidate("/my-bookings", response).status_code, 200)
+
+    def test_pending_messages_are_rendered(self):
+        self.client.force_login(self.user)
+        response = self.client.get("/")
+        self.client.cookies["messages"] = "pending"
+
+        self.assertEqual(self.revalidate("/", response).status_code, 200)
+
+    def test_anonymous_pages_have_no_etag(self):
+        response = self.client.get("/login")
+
+        self.assertNotIn("ETag", response)
+
+
+class AsyncMiddlewareTests(TestCase):
+    async def test_middleware_runs_async(self):
+        response = await self.async_client.get("/login")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Server-Timing", response)
+
+    async def test_sync_view_queries_are_logged(self):
+        # the sync view runs on a thread other than the event loop's, with
+        # connections of its own
+        user = await sync_to_async(UserFactory)()
+        await sync_to_async(self.client.force_login)(user)
+        self.async_client.cookies = self.client.cookies
+
+        response = await self.async_client.get("/my-bookings")
+
+        self.assertEqual(response.status_code, 200)
+        queries = re.search(r'desc="(\d+) queries"', response["Server-Timing"])
+        self.assertGreater(int(queries.group(1)), 0)
+
+    def test_middleware_is_async_capable(self):
+        async def get_response(request):
+            return HttpResponse()
+
+        self.assertTrue(asyncio.iscoroutinefunction(MetricsMiddleware(get_response)))
+        self.assertFalse(
+            asyncio.iscoroutinefunction(MetricsMiddleware(lambda request: None))
+        )
+
+
+class AsyncViewTests(TransactionTestCase):
+    # the async views query from pool threads, whose connections would not see
+    # the uncommitted transaction of a TestCase
+
+    def setUp(self):
+        self.user = UserFactory()
+        self.restaurant = RestaurantFactory(name="Golden Star")
+        self.booking = BookingFactory(user=self.user, restaurant=self.restaurant)
+        # refreshing the booking's slots cached the config, drop it so the
+        # availability view has queries to log
+        invalidate_restaurant_config(self.restaurant.id)
+
+    async def get(self, view, path, *args):
+        request = AsyncRequestFactory().get(path)
+        request.user = self.user
+        request.query_log = QueryLog()
+        with request.query_log.record():
+            return request, await view(request, *args)
+
+    async def test_views_run_on_the_pool(self):
+        for view, path, args in [
+            (views.home_page_async, "/", ()),
+            (views.my_bookings_async, "/my-bookings", ()),
+            (
+                views.availability_async,
+                f"/book-restaurant/{self.restaurant.id}/availability",
+                (self.restaurant.id,),
+            ),
+        ]:
+            with self.subTest(path=path):
+                request, response = await self.get(view, path, *args)
+
+                self.assertContains(response, "Golden Star")
+                # queries were logged from the pool thread
+                self.assertGreater(request.query_log.count, 0)
+
+    async def test_pool_runs_blocking_calls_concurrently(self):
+        started = time.perf_counter()
+        await asyncio.gather(*(run_blocking(time.sleep, 0.1) for _ in range(5)))
+
+        self.assertLess(time.perf_counter() - started, 0.3)
+
+
+class FragmentCacheTests(TestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.restaurant = RestaurantFactory(name="Golden Star")
+        self.bookings = [
+            BookingFactory(user=self.user, restaurant=self.restaurant) for _ in range(3)
+        ]
+
+    def test_rows_render_once(self):
+        first = render_rows(
+            "includes/booking_row.html", self.bookings, "booking", booking_versions
+        )
+        with mock.patch("table_booker.fragments.get_template") as get_template:
+            second = render_rows(
+                "includes/booking_row.html", self.bookings, "booking", booking_versions
+            )
+
+        get_template.assert_not_called()
+        self.assertEqual(first, second)
+        self.assertIn("Golden Star", first[0][1])
+        self.assertIn(f"/update-booking/{self.bookings[0].id}", first[0][1])
+
+    def test_related_change_renders_row_again(self):
+        self.client.force_login(self.user)
+        self.client.get("/my-bookings")
+
+        self.restaurant.name = "Silver Spoon"
+        self.restaurant.save()
+        response = self.client.get("/my-bookings")
+
+        self.assertContains(response, "Silver Spoon", count=3)
+        self.assertNotContains(response, "Golden Star")
+
+
+@override_settings(SLOW_QUERY_MS=0, SLOW_QUERY_EXPLAIN_RATE=1)
+class SlowQueryLogTests(TestCase):
+    @contextlib.contextmanager
+    def slow_query_log(self):
+        # the test connection exists already, so install the wrapper by hand,
+        # and with SLOW_QUERY_MS=0 every query counts as slow
+        install_slow_query_log(None, connection)
+        try:
+            yield
+        finally:
+            connection.execute_wrappers.remove(log_slow_queries)
+
+    def test_records_query_with_plan_and_call_site(self):
+        restaurant = RestaurantFactory(name="Slow Restaurant")
+        with self.slow_query_log():
+            list(Restaurant.objects.filter(name=restaurant.name))
+
+        slow_query = SlowQuery.objects.get()
+        self.assertEqual(slow_query.database, "default")
+        self.assertIn("Slow Restaurant", slow_query.params)
+        self.assertEqual(
+            slow_query.fingerprint, fingerprint(slow_query.sql), slow_query.sql
+        )
+        self.assertIn("table_booker_restaurant", slow_query.plan)
+        self.assertRegex(
+            slow_query.call_site,
+            r"^table_booker/tests\.py:\d+ in "
+            r"test_records_query_with_plan_and_call_site$",
+        )
+
+    def test_records_view(self):
+        RestaurantFactory()
+        self.client.force_login(UserFactory())
+        with self.slow_query_log():
+            self.client.get("/")
+
+        self.assertTrue(SlowQuery.objects.filter(view="home").exists())
+        self.assertFalse(SlowQuery.objects.exclude(view="home").exists())
+
+    def test_writes_are_logged_without_plan(self):
+        with self.slow_query_log():
+            RestaurantFactory()
+
+        slow_query = SlowQuery.objects.get()
+        self.assertTrue(slow_query.sql.startswith("INSERT"))
+        self.assertEqual(slow_query.plan, "")
+
+    def test_keeps_newest(self):
+        with self.settings(SLOW_QUERY_KEEP=3), self.slow_query_log():
+            for _ in range(5):
+                Restaurant.objects.exists()
+
+        self.assertEqual(SlowQuery.objects.count(), 3)
+
+    def test_not_counted_by_query_logs(self):
+        with self.slow_query_log(), record_queries() as log:
+            Restaurant.objects.exists()
+
+        self.assertEqual(log.count, 1)
+        self.assertEqual(SlowQuery.objects.count(), 1)
+
+    def test_failure_leaves_transaction_usable(self):
+        def fail():
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT * FROM missing_table")
+
+        with mock.patch("table_booker.db.call_site", side_effect=fail):
+            with transaction.atomic(), self.slow_query_log():
+                with self.assertLogs("table_booker.db", "ERROR"):
+                    Restaurant.objects.exists()
+                RestaurantFactory()
+
+        self.assertEqual(Restaurant.objects.count(), 1)
+        self.assertFalse(SlowQuery.objects.exists())
+
+    def test_fast_queries_are_skipped(self):
+        with self.settings(SLOW_QUERY_MS=60000), self.slow_query_log():
+            Restaurant.objects.exists()
+
+        self.assertFalse(SlowQuery.objects.exists())
+
+
+class SessionStorageTests(TestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.restaurant = RestaurantFactory()
+        self.setting = SettingFactory(restaurant=self.restaurant, min_guest=2)
+        self.table = TableFactory(restaurant=self.restaurant)
+
+    def test_booking_does_not_write_the_session(self):
+        self.client.force_login(self.user)
+        data = {"table": self.table.id, "total_guests": 2, "date": book_date()}
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                f"/book-restaurant/{self.restaurant.id}", data, follow=True
+            )
+
+        message = list(response.context.get("messages"))[0]
+        self.assertTrue(f"You successfully booked {self.restaurant}" in message.message)
+        self.assertFalse(
+            [
+                query["sql"]
+                for query in queries
+                if "django_session" in query["sql"]
+                and not query["sql"].startswith("SELECT")
+            ]
+        )
+
+    def test_cached_db_sessions_need_a_shared_cache(self):
+        path = os.path.join(settings.BASE_DIR, "project", "settings.py")
+        environ = {
+            "SESSION_BACKEND": "cached_db",
+            "CACHE_BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+        with mock.patch.dict(os.environ, environ):
+            with self.assertRaises(ImproperlyConfigured):
+                runpy.run_path(path)
+
+        environ["CACHE_BACKEND"] = "django.core.cache.backends.filebased.FileBasedCache"
+        with mock.patch.dict(os.environ, environ):
+            self.assertEqual(
+                runpy.run_path(path)["SESSION_ENGINE"],
+                "django.contrib.sessions.backends.cached_db",
+            )
+
+    def test_purge_sessions(self):
+        now = timezone.now()
+        for number in range(5):
+            Session.objects.create(
+                session_key=f"expired{number}",
+                session_data="",
+                expire_date=now - datetime.timedelta(days=1),
+            )
+        Session.objects.create(
+            session_key="live",
+            session_data="",
+            expire_date=now + datetime.timedelta(days=1),
+        )
+
+        call_command("purge_sessions", batch_size=2, stdout=io.StringIO())
+
+        self.assertEqual(
+            list(Session.objects.values_list("session_key", flat=True)), ["live"]
+        )
+
+
+class ConnectionHealthCheckTests(TestCase):
+    def fake_connection(self, usable, health_checks=True):
+        return mock.Mock(
+            connection=object(),
+            settings_dict={"CONN_HEALTH_CHECKS": health_checks},
+            in_atomic_block=False,
+            is_usable=mock.Mock(return_value=usable),
+        )
+
+    def test_closes_unusable_connections(self):
+        broken = self.fake_connection(usable=False)
+        healthy = self.fake_connection(usable=True)
+
+        with mock.patch("table_booker.db.connections") as connections:
+            connections.all.return_value = [broken, healthy]
+            close_unusable_connections()
+
+        broken.close.assert_called_once_with()
+        healthy.close.assert_not_called()
+
+    def test_health_checks_disabled(self):
+        broken = self.fake_connection(usable=False, health_checks=False)
+
+        with mock.patch("table_booker.db.connections") as connections:
+            connections.all.return_value = [broken]
+            close_unusable_connections()
+
+        broken.is_usable.assert_not_called()
+        broken.close.assert_not_called()
+
+
+class FakeConnectionPool:
+    """Stands in for psycopg2's ThreadedConnectionPool."""
+
+    def __init__(self, min_size, max_size, **conn_params):
+        self.idle = []
+        self.discarded = []
+        self.error = None
+
+    def getconn(self):
+        if self.error is not None:
+            raise self.error
+        if self.idle:
+            return self.idle.pop()
+        return mock.Mock(isolation_level=1, closed=0)
+
+    def putconn(self, conn, close=False):
+        if self.error is not None:
+            raise self.error
+        (self.discarded if close else self.idle).append(conn)
+
+
+class ConnectionPoolTests(TestCase):
+    def setUp(self):
+        for patcher in [
+            mock.patch.object(pool_backend.DatabaseWrapper, "_pools", {}),
+            mock.patch("psycopg2.pool.ThreadedConnectionPool", FakeConnectionPool),
+            mock.patch("psycopg2.extras.register_default_jsonb"),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def wrapper(self, max_size=2, timeout=0):
+        settings_dict = {
+            "NAME": "table_booker",
+            "OPTIONS": {},
+            "POOL": {"MIN_SIZE": 1, "MAX_SIZE": max_size, "TIMEOUT": timeout},
+        }
+        return pool_backend.DatabaseWrapper(settings_dict, "default")
+
+    def connect(self, wrapper):
+        wrapper.connection = wrapper.get_new_connection({"dbname": "table_booker"})
+        return wrapper.connection
+
+    def test_closing_returns_the_connection(self):
+        first = self.wrapper()
+        conn = self.connect(first)
+        first._close()
+
+        pool, _ = first._pool
+        self.assertEqual(pool.idle, [conn])
+        # both threads share the one pool
+        self.assertIs(self.connect(self.wrapper()), conn)
+
+    def test_broken_connections_are_discarded(self):
+        wrapper = self.wrapper()
+        conn = self.connect(wrapper)
+        conn.closed = 2
+        wrapper._close()
+
+        pool, _ = wrapper._pool
+        self.assertEqual((pool.idle, pool.discarded), ([], [conn]))
+
+    def test_waits_for_a_free_connection(self):
+        first = self.wrapper(max_size=1)
+        self.connect(first)
+
+        with self.assertRaisesMessage(psycopg2.OperationalError, "within 0 seconds"):
+            self.connect(self.wrapper(max_size=1))
+
+        closer = threading.Timer(0.05, first._close)
+        closer.start()
+        self.addCleanup(closer.join)
+        self.connect(self.wrapper(max_size=1, timeout=5))
+
+    def test_slot_is_freed_when_connecting_fails(self):
+        wrapper = self.wrapper(max_size=1)
+        pool, _ = wrapper.get_pool({"dbname": "table_booker"})
+        pool.error = psycopg2.pool.PoolError("connection pool exhausted")
+
+        with self.assertRaises(psycopg2.pool.PoolError):
+            self.connect(wrapper)
+
+        pool.error = None
+        self.connect(wrapper)
+
+    def test_slot_is_freed_when_returning_fails(self):
+        wrapper = self.wrapper(max_size=1)
+        self.connect(wrapper)
+        pool, _ = wrapper._pool
+        pool.error = psycopg2.pool.PoolError("trying to put unkeyed connection")
+
+        with self.assertRaises(Error):
+            wrapper._close()
+
+        pool.error = None
+        self.connect(self.wrapper(max_size=1))
+
+
+class QueryPlanTests(TestCase):
+    """The Booking hot paths must be served by the composite indexes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        users = User.objects.bulk_create(
+            User(username=f"planner{number}") for number in range(20)
+        )
+        restaurants = Restaurant.objects.bulk_create(
+            RestaurantFactory.build(name=f"Restaurant {number}")
+            for number in range(500)
+        )
+        if connection.vendor != "postgresql":
+            users = list(User.objects.filter(username__startswith="planner"))
+            restaurants = list(Restaurant.objects.order_by("id"))
+        for restaurant in restaurants[:5]:
+            Table.objects.bulk_create(
+                TableFactory.build(restaurant=restaurant) for _ in range(10)
+            )
+
+        tables = list(Table.objects.all())
+        now = timezone.now()
+        Booking.objects.bulk_create(
+            Booking(
+                user=users[number % len(users)],
+                restaurant_id=tables[number % len(tables)].restaurant_id,
+                table=tables[number % len(tables)],
+                date=now + datetime.timedelta(hours=number - 1000),
+                total_guests=2,
+            )
+            for number in range(2000)
+        )
+
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+        cls.user = users[0]
+        cls.restaurant = restaurants[0]
+        cls.tables = tables[:10]
+        cls.now = now
+
+    def setUp(self):
+        if connection.vendor == "postgresql":
+            # the seeded dataset is small enough for a sequential scan to win
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+
+    def test_my_bookings_plan(self):
+        queryset = Booking.objects.filter(user=self.user, date__gte=self.now).order_by(
+            "date"
+        )
+        self.assertUsesIndex(queryset, "booking_user_date_idx")
+
+    def test_availability_plan(self):
+        duration = datetime.timedelta(hours=2)
+        queryset = Booking.objects.filter(
+            table_id__in=[table.id for table in self.tables],
+            date__gt=self.now - duration,
+            date__lt=self.now + duration,
+        )
+        self.assertUsesIndex(queryset, "booking_table_date_idx")
+
+    def test_restaurant_search_plan(self):
+        index_name = (
+            "restaurant_name_trgm_idx"
+            if connection.vendor == "postgresql"
+            else "restaurant_name_nocase_idx"
+        )
+        queryset = Restaurant.objects.filter(restaurant_filter("restaurant 1"))
+        self.assertUsesIndex(queryset, index_name)
+
+    def test_restaurant_bookings_plan(self):
+        queryset = Booking.objects.filter(
+            restaurant=self.restaurant, date__gte=self.now
+        ).order_by("date")
+        self.assertUsesIndex(queryset, "booking_restaurant_date_idx")
+
+
+@override_settings(REPLICA_DATABASES=["replica1"])
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter(replicas=["replica1"])
+
+    def route_request(self, request, write=True):
+        routes = []
+
+        def view(request):
+            routes.append(self.router.db_for_read(Booking))
+            if request.method == "POST":
+                routes.append(self.router.db_for_write(Booking))
+                if write:
+                    UserFactory()
+            return HttpResponse()
+
+        response = ReplicaPinningMiddleware(view)(request)
+        return routes, response
+
+    def test_reads_go_to_replica_and_writes_to_primary(self):
+        self.assertEqual(self.router.db_for_read(Booking), "replica1")
+        self.assertEqual(self.router.db_for_write(Booking), "default")
+
+    def test_pinned_reads_go_to_primary(self):
+        token = pinned_to_primary.set(True)
+        try:
+            self.assertEqual(self.router.db_for_read(Booking), "default")
+        finally:
+            pinned_to_primary.reset(token)
+
+    def test_without_replicas_everything_uses_primary(self):
+        router = PrimaryReplicaRouter(replicas=[])
+        self.assertEqual(router.db_for_read(Booking), "default")
+
+    def test_get_reads_from_replica_without_pinning(self):
+        routes, response = self.route_request(RequestFactory().get("/"))
+
+        self.assertEqual(routes, ["replica1"])
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_write_pins_reads_to_primary(self):
+        routes, response = self.route_request(RequestFactory().post("/"))
+
+        self.assertEqual(routes, ["default", "default"])
+        self.assertEqual(response.cookies[PIN_COOKIE]["max-age"], 5)
+
+    def test_post_without_writes_does_not_pin(self):
+        routes, response = self.route_request(RequestFactory().post("/"), write=False)
+
+        self.assertEqual(routes, ["default", "default"])
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_pin_cookie_keeps_next_reads_on_primary(self):
+        request = RequestFactory().get("/")
+        request.COOKIES[PIN_COOKIE] = "1"
+
+        routes, response = self.route_request(request)
+
+        self.assertEqual(routes, ["default"])
+        self.assertFalse(pinned_to_primary.get())
+
+    def test_booking_pins_user_to_primary(self):
+        user = UserFactory()
+        table = TableFactory()
+        self.client.force_login(user)
+
+        response = self.client.post(
+            f"/book-restaurant/{table.restaurant_id}",
+            {"table": table.id, "date": book_date(), "total_guests": 2},
+        )
+
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+
+def book_date(days=3, hours=1, minutes=30, past=False):
+    today = datetime.datetime.today()
+    delta = datetime.timedelta(days, hours, minutes)
+    date = today - delta if past else today + delta
+
+    return date.strftime("%Y-%m-%dT%H:%M")
+
+
+def parse_date(value):
+    date = datetime.datetime.strptime(value, "%Y-%m-%dT%H:%M")
+    return timezone.make_aware(date)
+
+
+POSTCODES = [
+    ("E17 8BL", 51.590331, -0.017721),
+    ("E17 4AA", 51.583145, -0.031232),
+    ("E4 7AA", 51.632541, -0.005021),
+    ("N1 9GU", 51.532073, -0.123298),
+]
+
+
+def use_postcode_index(test, postcodes=POSTCODES):
+    """Point POSTCODE_INDEX of ``test`` at an index of ``postcodes``."""
+    directory = tempfile.TemporaryDirectory()
+    test.addCleanup(directory.cleanup)
+    path = os.path.join(directory.name, "postcodes.bin")
+    write_postcode_index(postcodes, path)
+    postcode_index = override_settings(POSTCODE_INDEX=path)
+    postcode_index.enable()
+    test.addCleanup(postcode_index.disable)
+    return path
@@ -1,11 +1,23 @@
+from django.conf import settings
 from django.urls import path
 
 from . import views
 
 app_name = "table_booker"
 
+if settings.ASYNC_VIEWS:
+    home_page = views.home_page_async
+    availability = views.availability_async
+    my_bookings = views.my_bookings_async
+    search = views.search_async
+else:
+    home_page = views.home_page
+    availability = views.availability
+    my_bookings = views.my_bookings
+    search = views.search
+
 urlpatterns = [
-    path("", views.home_page, name="home"),
+    path("", home_page, name="home"),
     path("login", views.login_page, name="login"),
     path("logout", views.logout_page, name="logout"),
     path("signup", views.signup_page, name="signup"),
@@ -14,11 +26,18 @@ urlpatterns = [
         views.book_restaurant,
         name="book-restaurant",
     ),
-    path("my-bookings", views.my_bookings, name="my-bookings"),
+    path(
+        "book-restaurant/<int:restaurant_id>/availability",
+        availability,
+        name="availability",
+    ),
+    path("search", search, name="search"),
+    path("my-bookings", my_bookings, name="my-bookings"),
     path(
         "delete-booking/<int:booking_id>", views.delete_booking, name="delete-booking"
     ),
     path(
         "update-booking/<int:booking_id>", views.update_booking, name="update-booking"
     ),
+    path("metrics", views.metrics_page, name="metrics"),
 ]
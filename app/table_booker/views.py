@@ -1,42 +1,109 @@
 # Create your views here.
+import datetime
+
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.forms import AuthenticationForm
+from django.http import Http404, HttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
-
-from .forms import BookingForm, UserForm
+from django.utils import timezone
+
+from . import metrics
+from .availability import AvailabilityIndex
+from .conditional import bookings_state, conditional_page, restaurants_state
+from .config import get_restaurant_config
+from .fragments import booking_versions, render_rows, restaurant_versions
+from .executor import async_view
+from .forms import AvailabilityForm, BookingForm, SearchForm, UserForm
+from .fulltext import full_text_search
+from .geo import geocode
 from .models import Booking, Restaurant
+from .pagination import keyset_page, numbered_page
+from .queries import query_budget
+from .reservations import commit_booking
+from .search import available_near, available_restaurants, nearest_restaurants
+from .slots import slot_start
 
+BOOKINGS_PER_PAGE = 25
+RESTAURANTS_PER_PAGE = 50
+NEXT_SLOTS_DAYS = 7
+SEARCH_RESULTS = 20
 
+
+def page_number_of(request):
+    try:
+        return max(1, int(request.GET.get("page", 1)))
+    except ValueError:
+        return 1
+
+
+@query_budget(5)
+@conditional_page(restaurants_state)
 def home_page(request):
     if not request.user.is_authenticated:
         return redirect("table_booker:login")
 
-    context = {"restaurants": Restaurant.objects.all()}
+    query = request.GET.get("q", "").strip()
+    near = request.GET.get("near", "").strip()
+    restaurants = Restaurant.objects.all()
+    if query:
+        restaurants = full_text_search(restaurants, query)
+
+    point = geocode(near) if near else None
+    context = {"query": query, "near": near, "unknown_postcode": near and not point}
+    if point:
+        page = numbered_page(
+            lambda offset, limit: nearest_restaurants(
+                restaurants, point, limit, offset
+            ),
+            page_number_of(request),
+            RESTAURANTS_PER_PAGE,
+        )
+        context["next_page"] = page.next_page
+    elif query:
+        ranked = restaurants.order_by("-rank", "id")
+        page = numbered_page(
+            lambda offset, limit: ranked[offset : offset + limit],
+            page_number_of(request),
+            RESTAURANTS_PER_PAGE,
+        )
+        context["next_page"] = page.next_page
+    else:
+        page = keyset_page(
+            restaurants,
+            ("name", "id"),
+            request.GET.get("cursor"),
+            RESTAURANTS_PER_PAGE,
+        )
+        context["next_cursor"] = page.next_cursor
+    object_list = page.object_list
+
+    context["restaurants"] = object_list
+    context["restaurant_rows"] = render_rows(
+        "includes/restaurant_row.html", object_list, "restaurant", restaurant_versions,
+    )
     return render(request, "home.html", context=context)
 
 
+@query_budget(15)
 def book_restaurant(request, restaurant_id):
     if not request.user.is_authenticated:
         return redirect("table_booker:login")
 
-    try:
-        restaurant = Restaurant.objects.get(id=restaurant_id)
-    except Restaurant.DoesNotExist:
-        restaurant = None
+    config = get_restaurant_config(restaurant_id)
 
-    if restaurant is None:
+    if config is None:
         messages.error(request, "Invalid restaurant supplied")
         return redirect("table_booker:home")
 
+    restaurant = config.as_restaurant()
+
     if request.method == "POST":
         form = BookingForm(restaurant, request.POST)
 
-        if form.is_valid():
-            booking = form.save(commit=False)
-            booking.restaurant = restaurant
-            booking.user = request.user
-            booking.save()
+        if form.is_valid() and commit_booking(
+            form, restaurant=restaurant, user=request.user
+        ):
             messages.info(request, f"You successfully booked {restaurant}")
             return redirect("table_booker:home")
 
@@ -50,6 +117,74 @@ def book_restaurant(request, restaurant_id):
     )
 
 
+@query_budget(7)
+def availability(request, restaurant_id):
+    if not request.user.is_authenticated:
+        return redirect("table_booker:login")
+
+    config = get_restaurant_config(restaurant_id)
+    if config is None:
+        raise Http404("No Restaurant matches the given query.")
+
+    restaurant = config.as_restaurant()
+    context = {"restaurant": restaurant}
+
+    if "date" in request.GET:
+        form = AvailabilityForm(request.GET)
+
+        if form.is_valid():
+            date = form.cleaned_data["date"]
+            guests = form.cleaned_data["total_guests"]
+            until = date + datetime.timedelta(days=NEXT_SLOTS_DAYS)
+            index = AvailabilityIndex.for_restaurant(
+                restaurant.id, date, until, tables=config.tables
+            )
+
+            if config.schedule.is_open(date):
+                context["free_tables"] = index.free_tables(date, guests)
+            else:
+                context["free_tables"] = []
+                context["closed"] = True
+            context["next_slots"] = index.next_free_slots(
+                guests, date, until, schedule=config.schedule
+            )
+
+    else:
+        form = AvailabilityForm()
+
+    context["availability_form"] = form
+    return render(request, "availability.html", context=context)
+
+
+@query_budget(4)
+def search(request):
+    if not request.user.is_authenticated:
+        return redirect("table_booker:login")
+
+    context = {}
+    if "date" in request.GET:
+        form = SearchForm(request.GET)
+
+        if form.is_valid():
+            slot = slot_start(form.cleaned_data["date"])
+            guests = form.cleaned_data["total_guests"]
+            postcode = form.cleaned_data["postcode"]
+            point = geocode(postcode) if postcode else None
+            context["slot"] = slot
+            if point:
+                results = available_near(slot, guests, point)
+            else:
+                results = available_restaurants(slot, guests, postcode)
+            context["results"] = results[:SEARCH_RESULTS]
+
+    else:
+        form = SearchForm()
+
+    context["search_form"] = form
+    return render(request, "search.html", context=context)
+
+
+@query_budget(8)
 def delete_booking(request, booking_id):
     if not request.user.is_authenticated:
         return redirect("table_booker:login")
@@ -63,35 +198,61 @@ def delete_booking(request, booking_id):
     return render(request, "delete_booking.html", context={"booking": booking})
 
 
+@query_budget(16)
 def update_booking(request, booking_id):
     if not request.user.is_authenticated:
         return redirect("table_booker:login")
 
-    booking = get_object_or_404(Booking, pk=booking_id)
-
-    booking_form = {"booking_form": BookingForm(booking.restaurant, instance=booking)}
+    booking = get_object_or_404(
+        Booking.objects.select_related("restaurant"), pk=booking_id
+    )
 
     if request.method == "POST":
         form = BookingForm(booking.restaurant, request.POST, instance=booking)
 
-        if form.is_valid():
-            form.save()
+        if form.is_valid() and commit_booking(form):
             messages.info(
                 request, f"You successfully updated {booking.restaurant.name} booking"
             )
             return redirect("table_booker:my-bookings")
 
-    return render(request, "update_booking.html", context=booking_form)
+    else:
+        form = BookingForm(booking.restaurant, instance=booking)
+
+    return render(request, "update_booking.html", context={"booking_form": form})
 
 
+@query_budget(5)
+@conditional_page(bookings_state)
 def my_bookings(request):
     if not request.user.is_authenticated:
         return redirect("table_booker:login")
 
-    context = {"bookings": Booking.objects.filter(user=request.user)}
+    when = "past" if request.GET.get("when") == "past" else "upcoming"
+    bookings = Booking.objects.filter(user=request.user).select_related(
+        "restaurant", "table"
+    )
+
+    if when == "past":
+        bookings = bookings.filter(date__lt=timezone.now())
+        ordering = ("-date", "-id")
+    else:
+        bookings = bookings.filter(date__gte=timezone.now())
+        ordering = ("date", "id")
+
+    page = keyset_page(bookings, ordering, request.GET.get("cursor"), BOOKINGS_PER_PAGE)
+    context = {
+        "bookings": page.object_list,
+        "booking_rows": render_rows(
+            "includes/booking_row.html", page.object_list, "booking", booking_versions
+        ),
+        "next_cursor": page.next_cursor,
+        "when": when,
+    }
     return render(request, "my_bookings.html", context=context)
 
 
+@query_budget(12)
 def login_page(request):
     if request.method == "POST":
         form = AuthenticationForm(request, data=request.POST)
@@ -111,6 +272,7 @@ def login_page(request):
     )
 
 
+@query_budget(12)
 def signup_page(request):
     if request.method == "POST":
         form = UserForm(request.POST)
@@ -126,7 +288,22 @@ def signup_page(request):
     )
 
 
+@query_budget(4)
 def logout_page(request):
     logout(request)
     messages.info(request, "You have successfully logged out.")
     return redirect("table_booker:login")
+
+
+@query_budget(0)
+def metrics_page(request):
+    return HttpResponse(
+        metrics.registry.render(), content_type="text/plain; version=0.0.4"
+    )
+
+
+# async versions of the read heavy views, routed with ASYNC_VIEWS
+home_page_async = async_view(home_page)
+availability_async = async_view(availability)
+search_async = async_view(search)
+my_bookings_async = async_view(my_bookings)